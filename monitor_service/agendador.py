@@ -0,0 +1,148 @@
+"""
+AGENDADOR DE CICLOS - SEM DERIVA
+Os ciclos sao marcados em fronteiras do relogio (ex: a cada minuto cheio)
+e as esperas usam o relogio monotonico, entao o periodo real nao soma o
+tempo de leitura/gravacao. Atrasos (ciclo que passou do proximo horario)
+e horarios perdidos sao contados e registrados no log.
+"""
+
+import math
+import time
+import logging
+from datetime import datetime
+
+logger = logging.getLogger('SeedLossMonitor')
+
+MAX_SLOTS_RECUPERAR = 10  # Acima disso os horarios perdidos sao pulados mesmo com recuperacao
+TOLERANCIA_AJUSTE_RELOGIO = 1.0  # Segundos; ajuste maior que isso (NTP, manual) realinha os ciclos
+
+
+class AgendadorCiclos:
+    """
+    Uso:
+        agendador = AgendadorCiclos(60)
+        while True:
+            data_slot = agendador.aguardar_proximo()
+            ...  # leitura do ciclo com DataHora = data_slot
+
+    Com 'alinhar' os horarios sao multiplos de 'intervalo' no relogio (60 s ->
+    hh:mm:00); sem ele a grade comeca no primeiro ciclo. Com 'recuperar', os
+    horarios perdidos por atraso (ate MAX_SLOTS_RECUPERAR) sao executados
+    imediatamente, um atras do outro; sem ele sao pulados.
+
+    Para esperar em outro lugar (ex: aguardar_varios), proximo_prazo() da o
+    prazo monotonico e confirmar() marca o horario como executado.
+    """
+
+    def __init__(self, intervalo, alinhar=True, recuperar=False, max_recuperar=MAX_SLOTS_RECUPERAR):
+        self.intervalo = float(intervalo)
+        self.alinhar = alinhar
+        self.recuperar = recuperar
+        self.max_recuperar = max_recuperar
+        self._ancorar()
+        self._base = 0.0 if alinhar else time.time()
+        self._proximo = None
+        self._n = None  # Horario ja escolhido, aguardando execucao
+
+        # Contadores para log/diagnostico
+        self.ciclos = 0
+        self.atrasos = 0
+        self.slots_perdidos = 0
+        self.slots_recuperados = 0
+        self.jitter_max = 0.0
+        self._jitter_soma = 0.0
+        self._jitter_n = 0
+
+    def _ancorar(self):
+        # Diferenca entre o relogio do sistema e o monotonico
+        self._offset = time.time() - time.monotonic()
+
+    def _monotonico_do_slot(self, n):
+        return self._base + n * self.intervalo - self._offset
+
+    def proximo_prazo(self):
+        """
+        Escolhe o proximo horario (contando atrasos/pulos) e retorna o prazo
+        monotonico. Chamadas seguidas retornam o mesmo prazo ate confirmar().
+        """
+        if self._n is not None:
+            return self._monotonico_do_slot(self._n)
+
+        desvio = (time.time() - time.monotonic()) - self._offset
+        if abs(desvio) > TOLERANCIA_AJUSTE_RELOGIO:
+            logger.warning(f"Relogio do sistema ajustado em {desvio:+.1f}s, realinhando os ciclos")
+            self._ancorar()
+            self._proximo = None
+
+        agora = time.monotonic()
+        if self._proximo is None:
+            n = math.ceil((agora + self._offset - self._base) / self.intervalo)
+        else:
+            n = self._proximo
+            atraso = agora - self._monotonico_do_slot(n)
+            if atraso > 0:
+                self.atrasos += 1
+                perdidos = int(atraso // self.intervalo)
+                if perdidos and self.recuperar and perdidos <= self.max_recuperar:
+                    self.slots_recuperados += 1
+                elif perdidos:
+                    self.slots_perdidos += perdidos
+                    n += perdidos
+                    logger.warning(f"Ciclo atrasado {atraso:.1f}s: {perdidos} horario(s) pulado(s)")
+        self._n = n
+        return self._monotonico_do_slot(n)
+
+    def confirmar(self):
+        """Marca o horario de proximo_prazo() como executado e retorna seu datetime nominal."""
+        n, self._n = self._n, None
+        jitter = max(0.0, time.monotonic() - self._monotonico_do_slot(n))
+        self.jitter_max = max(self.jitter_max, jitter)
+        self._jitter_soma += jitter
+        self._jitter_n += 1
+        self._proximo = n + 1
+        self.ciclos += 1
+        return datetime.fromtimestamp(self._base + n * self.intervalo)
+
+    def aguardar_proximo(self):
+        """Dorme ate o proximo horario e retorna esse horario (datetime nominal do ciclo)."""
+        restante = self.proximo_prazo() - time.monotonic()
+        if restante > 0:
+            time.sleep(restante)
+        return self.confirmar()
+
+    def reavaliar(self):
+        """
+        Horario ja escolhido e nao executado (espera interrompida, ex: sessao
+        OPC caiu): se passou mais de um intervalo, e escolhido de novo
+        contando os horarios pulados; senao e executado assim que possivel.
+        """
+        if self._n is not None and time.monotonic() - self._monotonico_do_slot(self._n) >= self.intervalo:
+            self._proximo = self._n
+            self._n = None
+
+    def resumo(self):
+        media = self._jitter_soma / self._jitter_n if self._jitter_n else 0.0
+        return (
+            f"Agendador: {self.ciclos} ciclos, {self.atrasos} atraso(s), "
+            f"{self.slots_perdidos} horario(s) pulado(s), {self.slots_recuperados} recuperado(s), "
+            f"jitter medio {media * 1000:.1f} ms, maximo {self.jitter_max * 1000:.1f} ms"
+        )
+
+
+def aguardar_varios(agendadores, interromper=None):
+    """
+    Espera o primeiro horario entre varios agendadores (um por classe de
+    varredura) na mesma thread. Retorna [(indice, data_slot)] de todos os
+    agendadores com horario vencido, do menor indice ao maior.
+    Com 'interromper' (threading.Event) setado durante a espera, retorna []
+    e os horarios escolhidos continuam pendentes (ver reavaliar()).
+    """
+    prazos = [a.proximo_prazo() for a in agendadores]
+    restante = min(prazos) - time.monotonic()
+    if restante > 0:
+        if interromper is None:
+            time.sleep(restante)
+        elif interromper.wait(restante):
+            return []
+    agora = time.monotonic()
+    return [(i, a.confirmar()) for i, (a, prazo) in enumerate(zip(agendadores, prazos)) if prazo <= agora]
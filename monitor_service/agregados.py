@@ -0,0 +1,260 @@
+"""
+AGREGADOS INCREMENTAIS (HORA / TURNO)
+O coletor mantem em memoria, por linha e coluna, minimo/maximo/soma/
+contagem/ultimo valor e o incremento dos contadores de cada hora e de cada
+turno. Cada amostra custa O(1); uma thread grava periodicamente apenas o
+que mudou desde a ultima gravacao com MERGE (upsert) nas tabelas
+<tabela>_hora e <tabela>_turno, somando com o que ja estava gravado.
+Assim os paineis leem poucas linhas prontas em vez de varrer seed_loss.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+from contadores import calcular_incremento
+
+logger = logging.getLogger('SeedLossMonitor')
+
+SUFIXO_HORA = "_hora"
+SUFIXO_TURNO = "_turno"
+TURNOS_PADRAO = ["06:00", "14:00", "22:00"]
+INTERVALO_GRAVACAO_SEGUNDOS = 60
+
+# Posicoes do acumulado [minimo, maximo, soma, contagem, ultimo, ultima_data, delta]
+MINIMO, MAXIMO, SOMA, CONTAGEM, ULTIMO, ULTIMA_DATA, DELTA = range(7)
+
+
+def _numerico(valor):
+    return isinstance(valor, (int, float))
+
+
+def interpretar_turnos(turnos):
+    """['06:00', '14:00', '22:00'] -> inicios em minutos do dia, ordenados."""
+    minutos = []
+    for turno in turnos:
+        horas, _, mins = str(turno).strip().partition(':')
+        minutos.append(int(horas) * 60 + int(mins or 0))
+    return sorted(minutos)
+
+
+def inicio_hora(data_hora):
+    return data_hora.replace(minute=0, second=0, microsecond=0)
+
+
+def inicio_turno(data_hora, inicios_minutos):
+    """Inicio do turno que contem 'data_hora' (pode ser no dia anterior)."""
+    dia = data_hora.replace(hour=0, minute=0, second=0, microsecond=0)
+    agora = data_hora.hour * 60 + data_hora.minute
+    anteriores = [m for m in inicios_minutos if m <= agora]
+    if anteriores:
+        return dia + timedelta(minutes=anteriores[-1])
+    return dia - timedelta(days=1) + timedelta(minutes=inicios_minutos[-1])
+
+
+def sql_criar_tabela(tabela):
+    return f"""
+IF OBJECT_ID('{tabela}', 'U') IS NULL
+CREATE TABLE {tabela} (
+    [linha] NVARCHAR(10) NOT NULL,
+    [inicio] DATETIME NOT NULL,
+    [coluna] NVARCHAR(128) NOT NULL,
+    [minimo] FLOAT NULL,
+    [maximo] FLOAT NULL,
+    [soma] FLOAT NULL,
+    [contagem] INT NOT NULL,
+    [media] AS ([soma] / NULLIF([contagem], 0)),
+    [ultimo] FLOAT NULL,
+    [ultima_data] DATETIME NULL,
+    [delta] FLOAT NULL,
+    PRIMARY KEY ([linha], [inicio], [coluna])
+)"""
+
+
+def sql_merge(tabela):
+    """Upsert que combina o acumulado novo com o que ja esta na tabela."""
+    return f"""
+MERGE {tabela} WITH (HOLDLOCK) AS t
+USING (SELECT ? AS linha, ? AS inicio, ? AS coluna, ? AS minimo, ? AS maximo, ? AS soma,
+              ? AS contagem, ? AS ultimo, ? AS ultima_data, ? AS delta) AS s
+ON t.[linha] = s.linha AND t.[inicio] = s.inicio AND t.[coluna] = s.coluna
+WHEN MATCHED THEN UPDATE SET
+    [minimo] = CASE WHEN t.[minimo] IS NULL OR s.minimo < t.[minimo] THEN s.minimo ELSE t.[minimo] END,
+    [maximo] = CASE WHEN t.[maximo] IS NULL OR s.maximo > t.[maximo] THEN s.maximo ELSE t.[maximo] END,
+    [soma] = ISNULL(t.[soma], 0) + s.soma,
+    [contagem] = t.[contagem] + s.contagem,
+    [ultimo] = CASE WHEN t.[ultima_data] IS NULL OR s.ultima_data >= t.[ultima_data] THEN s.ultimo ELSE t.[ultimo] END,
+    [ultima_data] = CASE WHEN t.[ultima_data] IS NULL OR s.ultima_data >= t.[ultima_data] THEN s.ultima_data ELSE t.[ultima_data] END,
+    [delta] = CASE WHEN s.delta IS NULL THEN t.[delta] ELSE ISNULL(t.[delta], 0) + s.delta END
+WHEN NOT MATCHED THEN
+    INSERT ([linha], [inicio], [coluna], [minimo], [maximo], [soma], [contagem], [ultimo], [ultima_data], [delta])
+    VALUES (s.linha, s.inicio, s.coluna, s.minimo, s.maximo, s.soma, s.contagem, s.ultimo, s.ultima_data, s.delta);
+"""
+
+
+def _combinar(destino, origem):
+    """Junta dois acumulados da mesma chave (origem mais antiga que destino)."""
+    destino[MINIMO] = min(destino[MINIMO], origem[MINIMO])
+    destino[MAXIMO] = max(destino[MAXIMO], origem[MAXIMO])
+    destino[SOMA] += origem[SOMA]
+    destino[CONTAGEM] += origem[CONTAGEM]
+    if origem[ULTIMA_DATA] > destino[ULTIMA_DATA]:
+        destino[ULTIMO], destino[ULTIMA_DATA] = origem[ULTIMO], origem[ULTIMA_DATA]
+    if origem[DELTA] is not None:
+        destino[DELTA] = (destino[DELTA] or 0) + origem[DELTA]
+
+
+class AgregadorPeriodos:
+    """
+    Acumulados por (tabela, linha, inicio do periodo, coluna) ainda nao gravados.
+
+    'eh_contador(coluna)' e 'faixa' (ex: da CalculadoraContadores) ativam o
+    incremento dos contadores; sem eles a coluna delta fica NULL.
+    """
+
+    def __init__(self, tabela_base, turnos=TURNOS_PADRAO, eh_contador=None, faixa=2 ** 32):
+        self.tabela_hora = tabela_base + SUFIXO_HORA
+        self.tabela_turno = tabela_base + SUFIXO_TURNO
+        self.turnos = interpretar_turnos(turnos)
+        self.eh_contador = eh_contador
+        self.faixa = faixa
+        self._lock = threading.Lock()
+        self._pendentes = {}  # (tabela, linha, inicio, coluna) -> acumulado
+        self._anteriores = {}  # (linha, coluna) -> ultimo valor do contador
+        self._contadores = {}  # coluna -> bool
+
+    def _contador(self, coluna):
+        eh = self._contadores.get(coluna)
+        if eh is None:
+            eh = self._contadores[coluna] = bool(self.eh_contador and self.eh_contador(coluna))
+        return eh
+
+    def adicionar(self, registros):
+        """Acumula as amostras [(linha, data_hora, valores_dict)] na hora e no turno."""
+        with self._lock:
+            for linha, data_hora, valores in registros:
+                periodos = (
+                    (self.tabela_hora, inicio_hora(data_hora)),
+                    (self.tabela_turno, inicio_turno(data_hora, self.turnos)),
+                )
+                for coluna, valor in valores.items():
+                    if not _numerico(valor):
+                        continue
+                    valor = float(valor)
+
+                    delta = None
+                    if self._contador(coluna):
+                        anterior = self._anteriores.get((linha, coluna))
+                        if anterior is not None:
+                            delta = calcular_incremento(anterior, valor, self.faixa)[0]
+                        self._anteriores[(linha, coluna)] = valor
+
+                    for tabela, inicio in periodos:
+                        chave = (tabela, linha, inicio, coluna)
+                        acumulado = self._pendentes.get(chave)
+                        if acumulado is None:
+                            self._pendentes[chave] = [valor, valor, valor, 1, valor, data_hora, delta]
+                            continue
+                        if valor < acumulado[MINIMO]:
+                            acumulado[MINIMO] = valor
+                        if valor > acumulado[MAXIMO]:
+                            acumulado[MAXIMO] = valor
+                        acumulado[SOMA] += valor
+                        acumulado[CONTAGEM] += 1
+                        acumulado[ULTIMO] = valor
+                        acumulado[ULTIMA_DATA] = data_hora
+                        if delta is not None:
+                            acumulado[DELTA] = (acumulado[DELTA] or 0) + delta
+
+    def retirar_pendentes(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, {}
+        return pendentes
+
+    def devolver_pendentes(self, pendentes):
+        """Recoloca acumulados que nao foram gravados (combinando com os novos)."""
+        with self._lock:
+            for chave, acumulado in pendentes.items():
+                atual = self._pendentes.get(chave)
+                if atual is None:
+                    self._pendentes[chave] = acumulado
+                else:
+                    _combinar(atual, acumulado)
+
+    def __len__(self):
+        return len(self._pendentes)
+
+
+def garantir_tabelas_agregados(conn, agregador):
+    """Cria as tabelas de agregados que nao existem. Retorna True se deu certo."""
+    cursor = conn.cursor()
+    try:
+        for tabela in (agregador.tabela_hora, agregador.tabela_turno):
+            cursor.execute(sql_criar_tabela(tabela))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao criar tabelas de agregados: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False
+    finally:
+        cursor.close()
+
+
+def gravar_agregados(agregador, pool_sql):
+    """Upsert dos acumulados pendentes em uma transacao. Retorna o numero de linhas gravadas."""
+    pendentes = agregador.retirar_pendentes()
+    if not pendentes:
+        return 0
+
+    conn = pool_sql.obter()
+    if conn is None:
+        agregador.devolver_pendentes(pendentes)
+        return 0
+
+    por_tabela = {}
+    for (tabela, linha, inicio, coluna), a in pendentes.items():
+        por_tabela.setdefault(tabela, []).append(
+            [linha, inicio, coluna, a[MINIMO], a[MAXIMO], a[SOMA], a[CONTAGEM], a[ULTIMO], a[ULTIMA_DATA], a[DELTA]]
+        )
+
+    try:
+        cursor = conn.cursor()
+        for tabela, linhas in por_tabela.items():
+            cursor.executemany(sql_merge(tabela), linhas)
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        logger.error(f"Erro ao gravar agregados ({len(pendentes)} linhas): {e}")
+        agregador.devolver_pendentes(pendentes)
+        pool_sql.devolver(conn, com_erro=True)
+        return 0
+
+    pool_sql.devolver(conn)
+    return len(pendentes)
+
+
+class GravadorAgregados(threading.Thread):
+    """Thread que grava os agregados pendentes a cada 'intervalo_segundos'."""
+
+    def __init__(self, agregador, pool_sql, intervalo_segundos=INTERVALO_GRAVACAO_SEGUNDOS):
+        super().__init__(name="GravadorAgregados", daemon=True)
+        self.agregador = agregador
+        self.pool_sql = pool_sql
+        self.intervalo = intervalo_segundos
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                gravar_agregados(self.agregador, self.pool_sql)
+            except Exception as e:
+                logger.error(f"Erro no gravador de agregados: {e}")
+
+    def parar(self):
+        """Encerra a thread e grava o que estiver pendente."""
+        self._parar.set()
+        self.join(self.intervalo)
+        gravar_agregados(self.agregador, self.pool_sql)
@@ -3,6 +3,7 @@ import csv
 import os
 from datetime import datetime
 from opcua import Client, ua
+from opc_leitura import obter_max_nodes_por_leitura, ler_valores_em_lote
 
 # ================= CONFIGURAÇÕES =================
 IP = "10.130.106.61"
@@ -13,6 +14,7 @@ NAMESPACE_INDEX = 2  # ns=2 conforme seu exemplo
 ARQUIVO_CONFIG = "tags_config.csv"
 ARQUIVO_SAIDA = "monitoramento_log.csv"
 INTERVALO_SEGUNDOS = 60  # 1 minuto
+TAMANHO_LOTE_LEITURA = 500  # Max. tags por Read (limitado pelo MaxNodesPerRead do servidor)
 # =================================================
 
 def carregar_tags_do_csv():
@@ -67,29 +69,32 @@ def main():
         print(f"🔌 Conectando ao servidor {URL}...")
         client.connect()
         print("✅ Conectado com sucesso!")
+
+        # Node IDs montados uma vez: ns=2;s=Caminho.Da.Tag
+        node_ids = [f"ns={NAMESPACE_INDEX};s={tag_path}" for tag_path in tags_paths]
+        tamanho_lote = obter_max_nodes_por_leitura(client, TAMANHO_LOTE_LEITURA)
         
         while True:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             valores_linha = [timestamp]
             print(f"\n⏱️  Leitura: {timestamp}")
 
-            # 4. Ler cada tag
-            for tag_path in tags_paths:
-                try:
-                    # Monta o Node ID: ns=2;s=Caminho.Da.Tag
-                    node_id = f"ns={NAMESPACE_INDEX};s={tag_path}"
-                    node = client.get_node(node_id)
-                    
-                    # Lê o valor
-                    valor = node.get_value()
+            # 4. Ler todas as tags em lote (um Read por ciclo)
+            try:
+                valores, status = ler_valores_em_lote(client, node_ids, tamanho_lote)
+            except Exception as e:
+                print(f"   ❌ Erro na leitura em lote: {e}")
+                valores, status = [None] * len(node_ids), [None] * len(node_ids)
+
+            for tag_path, valor, st in zip(tags_paths, valores, status):
+                nome_curto = tag_path.split('.')[-1]
+                if st is not None and st.is_good():
                     valores_linha.append(valor)
-                    
                     # Print simples para debug no terminal
-                    nome_curto = tag_path.split('.')[-1]
                     print(f"   ✔️ {nome_curto}: {valor}")
-
-                except Exception as e:
-                    print(f"   ❌ Erro na tag {tag_path}: {e}")
+                else:
+                    motivo = st.name if st is not None else "sem resposta"
+                    print(f"   ❌ Erro na tag {tag_path}: {motivo}")
                     valores_linha.append("ERRO")
 
             # 5. Salvar no CSV
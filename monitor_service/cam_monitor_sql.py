@@ -5,6 +5,11 @@ import os
 import sys
 from datetime import datetime
 from opcua import Client
+from opc_leitura import obter_max_nodes_por_leitura, RegistroTags
+from conversores import converter_valores
+from sql_conexao import PoolConexoesSQL
+from sql_escrita import gravar_registros, CACHE_INSTRUCOES
+from classificador_linhas import ClassificadorLinhas
 # Tenta importar pyodbc
 try:
     import pyodbc
@@ -27,6 +32,7 @@ DB_TABLE = "seed_loss"
 ARQUIVO_CONFIG = "tags_config.csv"
 ARQUIVO_BACKUP = "backup_seed_loss.csv"
 INTERVALO_SEGUNDOS = 60
+TAMANHO_LOTE_LEITURA = 500  # Max. tags por Read (limitado pelo MaxNodesPerRead do servidor)
 # Mapeamento SRT -> Linha
 MAPA_LINHA = {
     "SRT1": "A",
@@ -49,6 +55,8 @@ def carregar_tags_do_csv():
         print(f"❌ Arquivo {ARQUIVO_CONFIG} não encontrado!")
         return {}
     
+    # Chaves do MAPA_LINHA casam com segmentos inteiros do caminho, nao com substrings
+    classificador = ClassificadorLinhas(MAPA_LINHA)
     with open(ARQUIVO_CONFIG, 'r', newline='', encoding='utf-8') as f:
         reader = csv.reader(f)
         next(reader, None)  # Pula cabeçalho
@@ -60,11 +68,7 @@ def carregar_tags_do_csv():
             tag_path = row[0].strip()
             
             # Identificar qual SRT (linha) esta tag pertence
-            linha = None
-            for srt_key, linha_nome in MAPA_LINHA.items():
-                if srt_key in tag_path:
-                    linha = linha_nome
-                    break
+            linha = classificador.classificar(tag_path)
             
             if not linha:
                 print(f"⚠️  Tag ignorada (SRT não identificado): {tag_path}")
@@ -81,6 +85,7 @@ def carregar_tags_do_csv():
             # Mapear: coluna -> tag_path completo
             tags_por_linha[linha][coluna] = tag_path
     
+    classificador.relatorio()
     return tags_por_linha
 def conectar_sql():
     """Cria e retorna uma conexão com o SQL Server."""
@@ -97,12 +102,13 @@ def conectar_sql():
     except Exception as e:
         print(f"⚠️  Falha ao conectar no SQL Server: {e}")
         return None
-def salvar_csv_backup(linha, valores_dict):
+def salvar_csv_backup(linha, valores_dict, data_hora=None):
     """Salva em CSV local caso o SQL falhe."""
     arquivo_existe = os.path.exists(ARQUIVO_BACKUP)
+    data_hora = data_hora or datetime.now()
     
     header = ['DataHora', 'linha'] + list(valores_dict.keys())
-    row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), linha] + list(valores_dict.values())
+    row = [data_hora.strftime("%Y-%m-%d %H:%M:%S"), linha] + list(valores_dict.values())
     
     try:
         with open(ARQUIVO_BACKUP, 'a', newline='', encoding='utf-8') as f:
@@ -113,26 +119,12 @@ def salvar_csv_backup(linha, valores_dict):
         print(f"   💾 Backup local salvo para linha {linha}")
     except Exception as e:
         print(f"   ❌ Erro ao salvar backup: {e}")
-def inserir_no_sql(conn, linha, valores_dict):
-    """Insere um registro no SQL para uma linha específica."""
-    try:
-        cursor = conn.cursor()
-        
-        # Adiciona a coluna 'linha' aos dados
-        colunas = ['linha'] + list(valores_dict.keys())
-        valores = [linha] + list(valores_dict.values())
-        
-        cols_str = ", ".join([f"[{c}]" for c in colunas])
-        params_str = ", ".join(["?"] * len(colunas))
-        
-        sql = f"INSERT INTO {DB_TABLE} ({cols_str}) VALUES ({params_str})"
-        
-        cursor.execute(sql, valores)
-        conn.commit()
-        return True
-    except Exception as e:
-        print(f"   ❌ Erro SQL linha {linha}: {e}")
-        return False
+def inserir_no_sql(conn, registros):
+    """
+    Insere em lote os registros (linha, data_hora, valores_dict) do ciclo em
+    uma unica transacao. Retorna a lista de registros que nao foram gravados.
+    """
+    return gravar_registros(conn, DB_TABLE, registros)
 def main():
     print("=" * 60)
     print("🌽 SEED LOSS MONITOR - ITU")
@@ -155,72 +147,65 @@ def main():
         print(f"   └─ Tags instantâneas: {tags_inst}")
     print("-" * 60)
     client = Client(OPC_URL)
+    pool_sql = PoolConexoesSQL(conectar_sql, tamanho=1, ao_fechar=CACHE_INSTRUCOES.esquecer)
     try:
         print(f"\n🔌 Conectando ao OPC UA ({OPC_URL})...")
         client.connect()
         print("✅ Conectado ao OPC UA!")
         
+        tamanho_lote = obter_max_nodes_por_leitura(client, TAMANHO_LOTE_LEITURA)
+        # NodeIds resolvidos uma vez; ordem das colunas fixa por linha
+        registro = RegistroTags(tags_por_linha, NAMESPACE_INDEX)
+        registro.compilar(client, tamanho_lote)
+        print(f"📦 Leitura em lote: até {tamanho_lote} tags por Read")
+        
         while True:
             timestamp = datetime.now()
             print(f"\n{'='*60}")
             print(f"⏱️  Ciclo: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
             print(f"{'='*60}")
             
-            # Conectar ao SQL uma vez por ciclo
-            conn = conectar_sql()
+            # Leitura em lote: todas as tags de todas as linhas no mesmo Read
+            valores, status = registro.ler(client)
+            
+            registros = []
             
             # Processar cada linha (A, B, C...)
-            for linha, tags in tags_por_linha.items():
+            for linha, colunas, inicio, fim in registro.linhas:
                 print(f"\n📍 Processando Linha {linha}...")
                 
                 valores_lidos = {}
                 erros = 0
                 
-                # Ler todas as tags desta linha
-                for coluna, tag_path in tags.items():
-                    try:
-                        node_id = f"ns={NAMESPACE_INDEX};s={tag_path}"
-                        node = client.get_node(node_id)
-                        val = node.get_value()
-                        
-                        # Converter tipos OPC para tipos SQL
-                        if isinstance(val, (int, float)):
-                            valores_lidos[coluna] = val
-                        elif isinstance(val, bool):
-                            valores_lidos[coluna] = 1 if val else 0
-                        elif isinstance(val, str):
-                            valores_lidos[coluna] = val
-                        else:
-                            try:
-                                valores_lidos[coluna] = float(val) if val is not None else None
-                            except:
-                                valores_lidos[coluna] = str(val) if val is not None else None
-                                
-                    except Exception as e:
+                # Valores desta linha (ja lidos no lote), com o conversor do DataType de cada tag
+                convertidos = converter_valores(registro.conversores[inicio:fim], valores[inicio:fim])
+                for coluna, val, st in zip(colunas, convertidos, status[inicio:fim]):
+                    if not st.is_good():
                         erros += 1
                         valores_lidos[coluna] = None
                         if erros <= 3:  # Limita mensagens de erro
-                            print(f"   ⚠️  Erro {coluna}: {e}")
-                
-                print(f"   ✔️  {len(valores_lidos) - erros}/{len(tags)} tags lidas com sucesso")
+                            print(f"   ⚠️  Erro {coluna}: {st.name}")
+                        continue
+                    valores_lidos[coluna] = val
                 
-                # Inserir no SQL
-                sucesso = False
-                if conn:
-                    sucesso = inserir_no_sql(conn, linha, valores_lidos)
-                    if sucesso:
-                        print(f"   🗄️  Registro inserido no SQL (Linha {linha})")
+                print(f"   ✔️  {len(valores_lidos) - erros}/{len(colunas)} tags lidas com sucesso")
                 
-                # Backup se SQL falhou
-                if not sucesso:
-                    salvar_csv_backup(linha, valores_lidos)
+                registros.append((linha, timestamp, valores_lidos))
             
-            # Fechar conexão SQL do ciclo
+            # Inserir no SQL (todas as linhas em uma transacao)
+            falhas = registros
+            conn = pool_sql.obter()
             if conn:
-                try:
-                    conn.close()
-                except:
-                    pass
+                falhas = inserir_no_sql(conn, registros)
+                # Devolver conexão SQL ao pool (não fecha)
+                pool_sql.devolver(conn, com_erro=bool(falhas))
+                gravadas = [r[0] for r in registros if r not in falhas]
+                if gravadas:
+                    print(f"\n   🗄️  Registros inseridos no SQL (Linhas {', '.join(gravadas)})")
+            
+            # Backup se SQL falhou
+            for linha, data_hora, valores_lidos in falhas:
+                salvar_csv_backup(linha, valores_lidos, data_hora)
             
             print(f"\n⏳ Aguardando {INTERVALO_SEGUNDOS} segundos...")
             time.sleep(INTERVALO_SEGUNDOS)
@@ -232,5 +217,6 @@ def main():
             print("🔌 Desconectado do OPC UA.")
         except:
             pass
+        pool_sql.fechar_todas()
 if __name__ == "__main__":
     main()
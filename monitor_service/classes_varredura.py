@@ -0,0 +1,71 @@
+"""
+CLASSES DE VARREDURA (MULTI-TAXA)
+Cada classe tem seu proprio intervalo e reune as colunas que casam com
+seus padroes (ex: 1 s para dInst*, 10 min para nomes de hibridos). Tags
+que nao casam com nenhuma classe ficam na classe padrao, com o intervalo
+global. Cada classe e lida e gravada em lotes proprios.
+"""
+
+import logging
+from fnmatch import fnmatchcase
+
+logger = logging.getLogger('SeedLossMonitor')
+
+CLASSE_PADRAO = "padrao"
+
+
+def interpretar_classe(texto):
+    """
+    Converte a linha do config.ini 'intervalo: padrao1, padrao2' em
+    (intervalo_segundos, [padroes]). Ex: '1: dInst*, rInst*'.
+    """
+    intervalo, _, padroes = texto.partition(':')
+    return float(intervalo), [p.strip() for p in padroes.split(',') if p.strip()]
+
+
+def classe_da_coluna(coluna, classes):
+    """Nome da primeira classe cujos padroes casam com a coluna (ou None)."""
+    for nome, (_, padroes) in classes.items():
+        if any(fnmatchcase(coluna, p) for p in padroes):
+            return nome
+    return None
+
+
+def dividir_por_classe(tags_por_linha, classes, intervalo_padrao):
+    """
+    Divide {linha: {coluna: tag_path}} entre as classes.
+
+    'classes' e {nome: (intervalo_segundos, [padroes de coluna])}, na ordem
+    de prioridade. Retorna [(nome, intervalo, tags_por_linha_da_classe)],
+    apenas para classes com alguma tag.
+    """
+    divisao = {nome: {} for nome in classes}
+    divisao[CLASSE_PADRAO] = {}
+    for linha, tags in tags_por_linha.items():
+        for coluna, tag_path in tags.items():
+            nome = classe_da_coluna(coluna, classes) or CLASSE_PADRAO
+            divisao[nome].setdefault(linha, {})[coluna] = tag_path
+
+    resultado = []
+    for nome, tags in divisao.items():
+        if not tags:
+            continue
+        intervalo = intervalo_padrao if nome == CLASSE_PADRAO else classes[nome][0]
+        resultado.append((nome, intervalo, tags))
+    return resultado
+
+
+class ClasseVarredura:
+    """Tags de uma classe: registro compilado, agendador e fila de gravacao proprios."""
+
+    def __init__(self, nome, intervalo, registro, agendador, fila=None, persistencia=None, quarentena=None):
+        self.nome = nome
+        self.intervalo = intervalo
+        self.registro = registro
+        self.agendador = agendador
+        self.fila = fila
+        self.persistencia = persistencia
+        self.quarentena = quarentena
+
+    def __repr__(self):
+        return f"ClasseVarredura({self.nome}, {self.intervalo}s, {len(self.registro)} tags)"
@@ -0,0 +1,82 @@
+"""
+CLASSIFICACAO DE TAGS POR LINHA DE PRODUCAO
+Compila o MAPA_LINHA ({chave: linha}) em uma arvore de segmentos do caminho
+da tag (separados por '.'). A chave casa com segmentos inteiros, nunca com
+parte de um segmento: 'A' casa com 'SRO1.SRT.A.bER', mas nao com
+'SRO1.SRT.B.dTotAlarm'. Chaves com varios segmentos ('SRT.A') tambem
+sao aceitas. O ultimo segmento (nome da tag / coluna) nao e considerado.
+
+A comparacao ignora maiusculas/minusculas (o configparser ja entrega as
+chaves do config.ini em minusculas). Quando mais de uma linha casa com o
+mesmo caminho, vence a chave que vem primeiro no mapa e o caso entra no
+relatorio de ambiguidades.
+"""
+
+import logging
+
+logger = logging.getLogger('SeedLossMonitor')
+
+SEPARADOR = "."
+_FIM = None  # Chave do no que marca o fim de uma chave do mapa: (prioridade, linha)
+
+
+class ClassificadorLinhas:
+    """
+    classificar(tag_path) retorna a linha da tag (ou None). O resultado e
+    guardado por prefixo (caminho sem o nome da tag): em listas grandes as
+    tags de um mesmo grupo custam uma consulta a um dict.
+    """
+
+    def __init__(self, mapa):
+        self._raiz = {}
+        self._cache = {}  # prefixo -> linha
+        self.ambiguos = {}  # prefixo -> [linhas que casaram, vencedora primeiro]
+        self.profundidade = 0
+        for prioridade, (chave, linha) in enumerate(mapa.items()):
+            segmentos = str(chave).strip().lower().split(SEPARADOR)
+            if not all(segmentos):
+                logger.warning(f"Chave de linha invalida ignorada: '{chave}'")
+                continue
+            no = self._raiz
+            for segmento in segmentos:
+                no = no.setdefault(segmento, {})
+            no.setdefault(_FIM, (prioridade, linha))
+            self.profundidade = max(self.profundidade, len(segmentos))
+
+    def _casamentos(self, segmentos):
+        """{linha: prioridade} de todas as chaves que casam com os segmentos."""
+        achados = {}
+        for inicio in range(len(segmentos)):
+            no = self._raiz
+            for segmento in segmentos[inicio:inicio + self.profundidade]:
+                no = no.get(segmento)
+                if no is None:
+                    break
+                fim = no.get(_FIM)
+                if fim is not None and fim[0] < achados.get(fim[1], fim[0] + 1):
+                    achados[fim[1]] = fim[0]
+        return achados
+
+    def classificar(self, tag_path):
+        prefixo = tag_path.rpartition(SEPARADOR)[0]
+        try:
+            return self._cache[prefixo]
+        except KeyError:
+            pass
+        achados = self._casamentos(prefixo.lower().split(SEPARADOR)) if prefixo else {}
+        linhas = sorted(achados, key=achados.get)
+        linha = linhas[0] if linhas else None
+        if len(linhas) > 1:
+            self.ambiguos[prefixo] = linhas
+        self._cache[prefixo] = linha
+        return linha
+
+    def relatorio(self, limite=10):
+        """Registra no log os caminhos ambiguos (no maximo 'limite' exemplos)."""
+        if not self.ambiguos:
+            return
+        logger.warning(
+            f"{len(self.ambiguos)} grupo(s) de tags casam com mais de uma linha; usada a primeira chave do mapa"
+        )
+        for prefixo, linhas in list(self.ambiguos.items())[:limite]:
+            logger.warning(f"  {prefixo}.*: linhas {linhas} -> {linhas[0]}")
@@ -0,0 +1,981 @@
+"""
+LOOP DO COLETOR
+Aquisicao OPC, conversao, compressao e gravacao no SQL compartilhadas pelos
+dois scripts de servico: cam_monitor_service.py (parametros em constantes no
+proprio script) e seed_loss_monitor.py (parametros no config.ini). Cada
+script monta um ConfigColetor, configura o log e chama main(); uma correcao
+no ciclo vale para os dois.
+"""
+
+import time
+import csv
+import os
+import sys
+import gc
+import logging
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from opcua import Client
+from opc_leitura import obter_max_nodes_por_leitura, RegistroTags, STATUS_QUARENTENA
+from opc_assinatura import TabelaUltimosValores, iniciar_assinatura
+from opc_paralelo import LeitorParalelo
+from conversores import converter_valores
+from sql_conexao import PoolConexoesSQL
+from sql_escrita import gravar_registros, mesclar_registros, truncar_data_hora_sql, CACHE_INSTRUCOES, COLUNA_QUALIDADE
+from spool_local import SpoolLocal, DrenadorSpool, filtrar_ja_gravados
+from pipeline import FilaInstantaneos, EstagioPersistencia
+from agendador import AgendadorCiclos, aguardar_varios
+from classes_varredura import ClasseVarredura, dividir_por_classe
+from compressao import ConfigCompressao, CompressorRegistros, carregar_compressao_do_csv, resolver_algoritmo
+from contadores import CalculadoraContadores, MODO_JUNTO
+from agregados import AgregadorPeriodos, GravadorAgregados, garantir_tabelas_agregados
+from esquema_sql import colunas_esperadas, assinatura_esquema, esquema_ja_aplicado, registrar_esquema_aplicado, reconciliar_esquema
+from esquema_sql import EsquemaTabela, AlargadorEsquema, inferir_tipo_sql, tipo_sql_do_datatype
+from sql_estreito import ArmazenamentoEstreito
+from recarga import ObservadorArquivos, diferenca_tags
+from classificador_linhas import ClassificadorLinhas
+from coletor_processos import SupervisorProcessos, ParticaoTags, AvisoSaude, atribuir_unidades
+from quarentena import QuarentenaTags, RevisaoQuarentena
+from sessao_opc import VigiaSessao, EsperaReconexao, encerrar_sessao
+from lacunas import MarcadorLacunas, GravadorLacunas, garantir_tabela_lacunas
+from vigia_estagios import VigiaEstagios, ESTAGIOS, AQUISICAO, CONVERSAO, PERSISTENCIA, MANUTENCAO
+
+# Tenta importar pyodbc
+try:
+    import pyodbc
+except ImportError:
+    print("ERRO CRITICO: A biblioteca 'pyodbc' nao esta instalada.")
+    print("Execute: pip install pyodbc")
+    sys.exit(1)
+
+logger = logging.getLogger('SeedLossMonitor')
+
+# Parametros que todo script precisa definir (mesmos nomes das constantes)
+PARAMETROS = (
+    "BASE_DIR", "OPC_URL", "NAMESPACE_INDEX",
+    "DB_SERVER", "DB_PORT", "DB_NAME", "DB_TABLE", "TAMANHO_POOL_SQL", "CICLOS_POR_LOTE_SQL",
+    "USAR_FAST_EXECUTEMANY", "MODO_ARMAZENAMENTO",
+    "INTERVALO_SEGUNDOS", "ALINHAR_CICLOS", "RECUPERAR_CICLOS_PERDIDOS", "TAMANHO_LOTE_LEITURA",
+    "MODO_AQUISICAO", "INTERVALO_PUBLICACAO_MS", "INTERVALO_AMOSTRAGEM_MS", "TAMANHO_FILA_ASSINATURA",
+    "SESSOES_LEITURA", "INTERVALO_KEEPALIVE", "ESPERA_RECONEXAO", "ESPERA_MAXIMA_RECONEXAO",
+    "CICLOS_PARA_LIMPEZA", "INTERVALO_VERIFICACAO_CONFIG", "PROCESSOS_COLETA", "INTERVALO_SAUDE_COLETORES",
+    "PRAZO_AQUISICAO", "PRAZO_CONVERSAO", "PRAZO_PERSISTENCIA", "PRAZO_MANUTENCAO", "ORCAMENTO_TRAVAMENTO",
+    "FALHAS_PARA_QUARENTENA", "ESPERA_QUARENTENA_SEGUNDOS", "ESPERA_MAXIMA_QUARENTENA_SEGUNDOS",
+    "TAMANHO_FILA_INSTANTANEOS", "POLITICA_TRANSBORDO",
+    "ARQUIVO_CONFIG", "SPOOL_DIR", "ARQUIVO_ESQUEMA", "ARQUIVO_TAGS_INVALIDAS", "ARQUIVO_QUARENTENA",
+    "LOG_DIR", "LOG_FILE", "MAX_LOG_SIZE_MB", "MAX_LOG_FILES", "DIAS_MANTER_BACKUP",
+    "CLASSES_VARREDURA", "COMPRESSAO_PADRAO", "ALGORITMO_COMPRESSAO", "SIGNIFICANCIA_PADRAO",
+    "TEMPO_MAX_COMPRESSAO", "CONTADORES", "MODO_CONTADORES", "CONTADOR_BITS", "CONTADOR_COM_SINAL",
+    "AGREGADOS_ATIVOS", "TURNOS", "AGREGADOS_INTERVALO_GRAVACAO",
+    "SPOOL_FSYNC", "SPOOL_TAMANHO_SEGMENTO_MB", "SPOOL_COTA_MB", "SPOOL_INTERVALO_DRENAGEM",
+    "MAPA_LINHA",
+)
+
+# Parametros opcionais
+PADROES = {
+    "TITULO": "SEED LOSS MONITOR",  # Cabecalho do log na partida
+    "NOME_PLANTA": None,  # Incluido em cada linha do log
+    "TIMEOUT_SQL": 10,  # Segundos para abrir uma conexao SQL
+    "ARQUIVO_INI": None,  # Observado junto com o tags_config.csv
+    "RECARREGAR_INI": None,  # funcao(config) chamada quando o ARQUIVO_INI muda
+    "PARTICAO": None,  # Modo multiprocesso: tags do processo coletor atual (None = todas)
+}
+
+
+class ConfigColetor:
+    """
+    Parametros do coletor como atributos (config.OPC_URL, config.DB_TABLE...).
+    Vai por pickle para cada processo coletor: RECARREGAR_INI precisa ser
+    uma funcao de modulo.
+    """
+
+    def __init__(self, **parametros):
+        faltando = [nome for nome in PARAMETROS if nome not in parametros]
+        if faltando:
+            raise TypeError(f"ConfigColetor sem os parametros: {', '.join(faltando)}")
+        self.__dict__.update(PADROES)
+        self.__dict__.update(parametros)
+
+    @classmethod
+    def das_constantes(cls, constantes, **extras):
+        """Monta a configuracao com as constantes de um script (globals())."""
+        parametros = {nome: constantes[nome] for nome in PARAMETROS + tuple(PADROES) if nome in constantes}
+        parametros.update(extras)
+        return cls(**parametros)
+
+    def copiar(self, **alteracoes):
+        copia = ConfigColetor(**self.__dict__)
+        copia.__dict__.update(alteracoes)
+        return copia
+
+
+# =================================================
+# CONFIGURACAO DE LOGGING
+# =================================================
+def configurar_logging(config):
+    """Configura logging com rotacao de arquivos (handlers anteriores sao fechados)."""
+    if not os.path.exists(config.LOG_DIR):
+        os.makedirs(config.LOG_DIR)
+    
+    logger.setLevel(logging.INFO)
+    
+    # Limpar handlers existentes
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    
+    file_handler = RotatingFileHandler(
+        config.LOG_FILE,
+        maxBytes=config.MAX_LOG_SIZE_MB * 1024 * 1024,
+        backupCount=config.MAX_LOG_FILES,
+        encoding='utf-8'
+    )
+    file_handler.setLevel(logging.INFO)
+    
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    
+    planta = f" {config.NOME_PLANTA} |" if config.NOME_PLANTA else ""
+    formatter = logging.Formatter(
+        f'%(asctime)s |{planta} %(levelname)-8s | %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+    
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    
+    return logger
+
+
+# =================================================
+# FUNCOES DE LIMPEZA
+# =================================================
+def limpar_cache_memoria():
+    """Forca coleta de lixo para liberar memoria."""
+    gc.collect()
+    logger.info("Cache de memoria limpo")
+
+
+def limpar_logs_antigos(config):
+    """Remove arquivos de log muito antigos."""
+    try:
+        if os.path.exists(config.LOG_DIR):
+            agora = datetime.now()
+            for arquivo in os.listdir(config.LOG_DIR):
+                caminho = os.path.join(config.LOG_DIR, arquivo)
+                if os.path.isfile(caminho):
+                    modificado = datetime.fromtimestamp(os.path.getmtime(caminho))
+                    if (agora - modificado).days > config.DIAS_MANTER_BACKUP:
+                        os.remove(caminho)
+                        logger.info(f"Log antigo removido: {arquivo}")
+    except Exception as e:
+        logger.warning(f"Erro ao limpar logs antigos: {e}")
+
+
+def manutencao_periodica(config):
+    """Limpeza periodica (roda na thread de persistencia, nao atrasa a leitura)."""
+    logger.info("Executando limpeza periodica...")
+    limpar_cache_memoria()
+    limpar_logs_antigos(config)
+
+
+# =================================================
+# FUNCOES PRINCIPAIS
+# =================================================
+def carregar_tags_do_csv(config):
+    """Carrega tags do CSV e agrupa por linha (SRT1, SRT2, etc)."""
+    tags_por_linha = {}
+    
+    if not os.path.exists(config.ARQUIVO_CONFIG):
+        logger.error(f"Arquivo {config.ARQUIVO_CONFIG} nao encontrado!")
+        return {}
+    
+    # Chaves do MAPA_LINHA casam com segmentos inteiros do caminho
+    classificador = ClassificadorLinhas(config.MAPA_LINHA)
+    ignoradas = 0
+    duplicadas = 0
+    with open(config.ARQUIVO_CONFIG, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+                
+            tag_path = row[0].strip()
+            
+            linha = classificador.classificar(tag_path)
+            
+            if not linha:
+                ignoradas += 1
+                if ignoradas <= 10:
+                    logger.warning(f"Tag ignorada (SRT nao identificado): {tag_path}")
+                continue
+            
+            coluna = tag_path.split('.')[-1]
+            
+            if linha not in tags_por_linha:
+                tags_por_linha[linha] = {}
+            
+            # Mesma coluna duas vezes na linha: vale a ultima (ordem do CSV)
+            if coluna in tags_por_linha[linha]:
+                duplicadas += 1
+                if duplicadas <= 10:
+                    logger.warning(f"Coluna {coluna} repetida na linha {linha}: {tags_por_linha[linha][coluna]} substituida por {tag_path}")
+            
+            tags_por_linha[linha][coluna] = tag_path
+    
+    if ignoradas > 10:
+        logger.warning(f"{ignoradas} tags ignoradas sem linha identificada")
+    if duplicadas > 10:
+        logger.warning(f"{duplicadas} colunas repetidas na mesma linha")
+    classificador.relatorio()
+    return tags_por_linha
+
+
+def carregar_tags_do_processo(config):
+    """Tags do CSV; no modo multiprocesso, so as do processo coletor atual."""
+    tags_por_linha = carregar_tags_do_csv(config)
+    if config.PARTICAO is not None:
+        tags_por_linha = config.PARTICAO.filtrar(tags_por_linha, config.CLASSES_VARREDURA)
+    return tags_por_linha
+
+
+def conectar_sql(config):
+    """Cria e retorna uma conexao com o SQL Server."""
+    try:
+        conn_str = (
+            f"DRIVER={{SQL Server}};"
+            f"SERVER={config.DB_SERVER},{config.DB_PORT};"
+            f"DATABASE={config.DB_NAME};"
+            "Trusted_Connection=yes;"
+            "Network=DBMSSOCN;"
+        )
+        conn = pyodbc.connect(conn_str, timeout=config.TIMEOUT_SQL)
+        return conn
+    except Exception as e:
+        logger.warning(f"Falha ao conectar no SQL Server: {e}")
+        return None
+
+
+def preparar_contadores(config, tags_por_linha):
+    """Cria a calculadora de contadores (None se nenhum padrao estiver configurado)."""
+    if not config.CONTADORES:
+        return None
+    calculadora = CalculadoraContadores(config.CONTADORES, config.MODO_CONTADORES, config.CONTADOR_BITS, config.CONTADOR_COM_SINAL)
+    colunas = {c for tags in tags_por_linha.values() for c in tags}
+    logger.info(f"Contadores: {sorted(c for c in colunas if calculadora.eh_contador(c))} (modo {config.MODO_CONTADORES})")
+    return calculadora
+
+
+def reconciliar_esquema_sql(config, tags_por_linha, calculadora, esquema):
+    """
+    Cria/alarga as colunas do tags_config.csv (e as _delta/_taxa dos
+    contadores) em um unico lote e preenche o cache de colunas 'esquema'.
+    Sem mudancas no CSV desde a ultima reconciliacao, nao acessa o banco.
+    Retorna True (esquema ok), False (migracao falhou) ou None (sem conexao).
+    """
+    colunas = {c for tags in tags_por_linha.values() for c in tags}
+    derivadas = calculadora.colunas_derivadas(colunas) if calculadora is not None else []
+    esperadas = colunas_esperadas(tags_por_linha, derivadas)
+    esquema.esperar(esperadas)
+    assinatura = assinatura_esquema(f"{config.DB_SERVER},{config.DB_PORT}/{config.DB_NAME}", config.DB_TABLE, esperadas)
+    colunas_tabela = esquema_ja_aplicado(config.ARQUIVO_ESQUEMA, assinatura)
+    if colunas_tabela is not None:
+        esquema.atualizar(colunas_tabela)
+        logger.info("Esquema do banco ja reconciliado com o tags_config.csv.")
+        return True
+    
+    logger.info(f"Reconciliando esquema da tabela {config.DB_TABLE} ({len(esperadas)} colunas)...")
+    conn = conectar_sql(config)
+    if not conn:
+        logger.warning("Nao foi possivel conectar para verificar esquema.")
+        return None
+    try:
+        aplicados, colunas_tabela = reconciliar_esquema(conn, config.DB_TABLE, esperadas, assinatura)
+        esquema.atualizar(colunas_tabela)
+        registrar_esquema_aplicado(config.ARQUIVO_ESQUEMA, assinatura, colunas_tabela)
+        logger.info(f"Esquema reconciliado: {aplicados} alteracao(oes) aplicada(s).")
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao reconciliar esquema: {e}")
+        return False
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+
+
+def preparar_agregados(config, calculadora):
+    """
+    Cria o agregador de hora/turno e garante suas tabelas.
+    Retorna None (agregados desligados) se as tabelas nao puderem ser criadas.
+    """
+    if not config.AGREGADOS_ATIVOS:
+        return None
+    agregador = AgregadorPeriodos(
+        config.DB_TABLE, config.TURNOS,
+        calculadora.eh_contador if calculadora is not None else None,
+        2 ** config.CONTADOR_BITS,
+    )
+    
+    conn = conectar_sql(config)
+    if not conn:
+        logger.warning("Nao foi possivel conectar para verificar as tabelas de agregados.")
+        return agregador
+    try:
+        if not garantir_tabelas_agregados(conn, agregador):
+            logger.error("Tabelas de agregados indisponiveis, agregados desligados.")
+            return None
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+    logger.info(f"Agregados: {agregador.tabela_hora} e {agregador.tabela_turno} (turnos {', '.join(config.TURNOS)})")
+    return agregador
+
+
+def preparar_lacunas(config, marcador):
+    """
+    Garante a tabela de lacunas. Retorna False (lacunas so no log) se ela
+    nao puder ser criada.
+    """
+    conn = conectar_sql(config)
+    if not conn:
+        logger.warning("Nao foi possivel conectar para verificar a tabela de lacunas.")
+        return True
+    try:
+        if not garantir_tabela_lacunas(conn, marcador):
+            logger.error("Tabela de lacunas indisponivel, lacunas registradas so no log.")
+            return False
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+    logger.info(f"Lacunas de amostragem: {marcador.tabela}")
+    return True
+
+
+def preparar_armazenamento(config, tags_por_linha, calculadora):
+    """
+    Modo estreito: cria as tabelas <tabela>_tags/_valores, registra as tags
+    no dicionario e recria a visao larga. Retorna None no modo largo.
+    """
+    if config.MODO_ARMAZENAMENTO != "estreito":
+        return None
+    colunas = {c for tags in tags_por_linha.values() for c in tags}
+    derivadas = calculadora.colunas_derivadas(colunas) if calculadora is not None else []
+    armazenamento = ArmazenamentoEstreito(
+        config.DB_TABLE, tags_por_linha, config.USAR_FAST_EXECUTEMANY, colunas_esperadas(tags_por_linha, derivadas)
+    )
+    
+    conn = conectar_sql(config)
+    if not conn:
+        logger.warning("Nao foi possivel conectar para preparar o armazenamento estreito.")
+        return armazenamento
+    try:
+        armazenamento.preparar(conn)
+        logger.info(f"Armazenamento estreito: {armazenamento.tabela_valores} (visao larga {armazenamento.visao})")
+    except Exception as e:
+        logger.error(f"Erro ao preparar o armazenamento estreito, nova tentativa na gravacao: {e}")
+    finally:
+        try:
+            conn.close()
+        except:
+            pass
+    return armazenamento
+
+
+def carregar_compressao(config):
+    """
+    Configuracao de compressao por tag (tags_config.csv) e a padrao
+    (config), no formato de CompressorRegistros.
+    """
+    configs = carregar_compressao_do_csv(
+        config.ARQUIVO_CONFIG, config.COMPRESSAO_PADRAO, config.ALGORITMO_COMPRESSAO, config.SIGNIFICANCIA_PADRAO,
+        config.TEMPO_MAX_COMPRESSAO
+    )
+    padrao = ConfigCompressao(
+        resolver_algoritmo(config.COMPRESSAO_PADRAO, config.ALGORITMO_COMPRESSAO), config.SIGNIFICANCIA_PADRAO,
+        config.TEMPO_MAX_COMPRESSAO
+    )
+    return configs, padrao
+
+
+def inserir_no_sql(config, conn, registros):
+    """
+    Insere em lote os registros (linha, data_hora, valores_dict) em uma unica
+    transacao. Retorna a lista de registros que nao puderam ser gravados.
+    """
+    return gravar_registros(conn, config.DB_TABLE, registros, config.USAR_FAST_EXECUTEMANY)
+
+
+def mesclar_no_sql(config, conn, registros):
+    """
+    Reenvio do spool de registros com colunas criadas depois da gravacao:
+    completa a linha (linha, DataHora) ja gravada. Retorna os que falharam.
+    """
+    return mesclar_registros(conn, config.DB_TABLE, registros)
+
+
+def detectar_colunas_novas(client, classes, esquema, tamanho_lote):
+    """
+    Le o DataType OPC das tags sem coluna na tabela e agenda a criacao das
+    colunas (AlargadorEsquema) com o tipo SQL correspondente.
+    """
+    tipos = {}
+    for classe in classes:
+        colunas = {c for _, colunas_linha, _, _ in classe.registro.linhas for c in colunas_linha}
+        novas = esquema.desconhecidas(colunas)
+        if not novas:
+            continue
+        try:
+            for coluna, data_type in classe.registro.ler_tipos_dados(client, set(novas), tamanho_lote).items():
+                tipos[coluna] = tipo_sql_do_datatype(data_type) or inferir_tipo_sql(coluna)
+        except Exception as e:
+            logger.warning(f"Nao foi possivel ler o DataType das tags [{classe.nome}]: {e}")
+    if tipos and esquema.carregado():
+        logger.info(f"Colunas novas na tabela: {sorted(tipos)}; ate o DDL terminar seus valores vao para o spool")
+    for classe in classes:
+        # Tags invalidas continuam com coluna (NULL) na tabela
+        invalidas = esquema.desconhecidas({coluna for _, coluna, _, _ in classe.registro.invalidas})
+        for coluna in invalidas:
+            tipos.setdefault(coluna, inferir_tipo_sql(coluna))
+    esquema.esperar(tipos)
+
+
+def relatar_tags_invalidas(config, classes):
+    """
+    Grava em ARQUIVO_TAGS_INVALIDAS as tags que o servidor OPC respondeu como
+    inexistentes na verificacao (ficam fora do ciclo, coluna NULL).
+    """
+    invalidas = [item for classe in classes for item in classe.registro.invalidas]
+    try:
+        with open(config.ARQUIVO_TAGS_INVALIDAS, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["linha", "coluna", "tag_address", "status"])
+            for linha, coluna, tag_path, status in invalidas:
+                writer.writerow([linha, coluna, tag_path, status.name])
+    except Exception as e:
+        logger.warning(f"Nao foi possivel gravar {config.ARQUIVO_TAGS_INVALIDAS}: {e}")
+    if invalidas:
+        logger.warning(f"{len(invalidas)} tag(s) inexistente(s) no servidor OPC, fora do ciclo (ver {config.ARQUIVO_TAGS_INVALIDAS})")
+        for linha, coluna, tag_path, status in invalidas[:10]:
+            logger.warning(f"  {tag_path} ({linha}.{coluna}): {status.name}")
+
+
+def relatar_quarentena(config, classes):
+    """Grava em ARQUIVO_QUARENTENA as tags em quarentena (fora do ciclo, nova tentativa agendada)."""
+    try:
+        with open(config.ARQUIVO_QUARENTENA, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(["classe", "tag_address", "status", "desde", "tentativas", "proxima_tentativa_s"])
+            for classe in classes:
+                for node_id, status, desde, tentativas, proxima in classe.quarentena.estado():
+                    writer.writerow([
+                        classe.nome, node_id.Identifier, status.name, desde.strftime('%Y-%m-%d %H:%M:%S'),
+                        tentativas, round(proxima)
+                    ])
+    except Exception as e:
+        logger.warning(f"Nao foi possivel gravar {config.ARQUIVO_QUARENTENA}: {e}")
+
+
+def gravar_pendentes(pool_sql, spool, esquema, registros, inserir):
+    """
+    Grava os registros acumulados; o que falhar vai para o spool local, assim
+    como as colunas que ainda nao existem na tabela (modo largo).
+    """
+    if not registros:
+        return
+    
+    if esquema is not None:
+        # Linha com colunas sem DDL: grava as conhecidas e o spool completa depois
+        registros, completos = esquema.separar(registros)
+        spool.gravar(completos, mesclar=True)
+    falhas = registros
+    conn = pool_sql.obter()
+    if conn:
+        falhas = inserir(conn, registros)
+        pool_sql.devolver(conn, com_erro=bool(falhas))
+        gravados = len(registros) - len(falhas)
+        if gravados:
+            logger.info(f"SQL OK - {gravados} registro(s) em lote")
+    
+    spool.gravar(falhas)
+
+
+def cancelar_aquisicao(client, leitor):
+    """Acao do vigia para aquisicao travada: fecha os sockets OPC; o Read falha e a aquisicao reconecta."""
+    encerrar_sessao(client, perdida=True)
+    if leitor is not None:
+        leitor.desconectar()
+
+
+def descarregar_filas(classes, spool):
+    """Antes do reinicio controlado: instantaneos ainda nas filas vao para o spool."""
+    for classe in classes:
+        itens = classe.fila.retirar(len(classe.fila), 0)
+        registros = [registro for instantaneo in itens for registro in instantaneo]
+        if registros:
+            spool.gravar(registros)
+            logger.warning(f"Reinicio: {len(registros)} registro(s) da fila '{classe.nome}' gravados no spool")
+
+
+def criar_classe(config, nome, intervalo, tags_classe, gravar, spool, manutencao=None):
+    """Cria a classe de varredura com fila e thread de persistencia proprias."""
+    fila = FilaInstantaneos(config.TAMANHO_FILA_INSTANTANEOS, config.POLITICA_TRANSBORDO, spool.gravar)
+    persistencia = EstagioPersistencia(fila, gravar, config.CICLOS_POR_LOTE_SQL, manutencao, config.CICLOS_PARA_LIMPEZA)
+    # NodeIds resolvidos uma vez; ordem das colunas fixa por linha
+    registro = RegistroTags(tags_classe, config.NAMESPACE_INDEX)
+    # Assinatura: tag com erro nao custa Read, a quarentena nao se aplica
+    quarentena = QuarentenaTags(
+        registro, config.FALHAS_PARA_QUARENTENA if config.MODO_AQUISICAO != "assinatura" else 0,
+        config.ESPERA_QUARENTENA_SEGUNDOS, config.ESPERA_MAXIMA_QUARENTENA_SEGUNDOS
+    )
+    classe = ClasseVarredura(
+        nome, intervalo, registro,
+        AgendadorCiclos(intervalo, config.ALINHAR_CICLOS, config.RECUPERAR_CICLOS_PERDIDOS), fila, persistencia, quarentena
+    )
+    persistencia.start()
+    logger.info(f"Classe '{nome}': {len(classe.registro)} tags a cada {intervalo}s")
+    return classe
+
+
+def recarregar_tags(config, client, tamanho_lote, classes, assinatura, tags_antigas, gravar, spool):
+    """
+    Aplica o tags_config.csv alterado na sessao OPC atual: registra/libera
+    so os nos que mudaram, acrescenta/remove so os itens monitorados que
+    mudaram e esquece so as instrucoes SQL com colunas removidas. Filas e
+    lotes em andamento nao sao tocados.
+    Classes sao redivididas (padroes e intervalos podem ter mudado).
+    Retorna as tags em vigor (as antigas, se o CSV novo nao tiver tags).
+    """
+    tags_novas = carregar_tags_do_processo(config)
+    if not tags_novas:
+        logger.warning("tags_config.csv sem tags, recarga ignorada.")
+        return tags_antigas
+    adicionadas, removidas = diferenca_tags(tags_antigas, tags_novas)
+
+    divisao = {nome: (intervalo, tags) for nome, intervalo, tags in dividir_por_classe(tags_novas, config.CLASSES_VARREDURA, config.INTERVALO_SEGUNDOS)}
+    node_adicionados = []
+    node_removidos = []
+    for classe in classes:
+        intervalo, tags_classe = divisao.pop(classe.nome, (classe.intervalo, {}))
+        adicionados, removidos = classe.registro.atualizar(client, tags_classe, tamanho_lote)
+        node_adicionados.extend(adicionados)
+        node_removidos.extend(removidos)
+        if intervalo != classe.intervalo:
+            classe.intervalo = intervalo
+            classe.agendador = AgendadorCiclos(intervalo, config.ALINHAR_CICLOS, config.RECUPERAR_CICLOS_PERDIDOS)
+            logger.info(f"Classe '{classe.nome}': intervalo alterado para {intervalo}s")
+    for nome, (intervalo, tags_classe) in divisao.items():
+        classe = criar_classe(config, nome, intervalo, tags_classe, gravar, spool)
+        classe.registro.compilar(client, tamanho_lote)
+        classes.append(classe)
+        node_adicionados.extend(classe.registro.node_ids)
+
+    # Tag que so mudou de classe continua monitorada
+    if assinatura is not None:
+        assinatura.desmonitorar(set(node_removidos) - set(node_adicionados))
+        falhas = assinatura.monitorar(node_adicionados)
+        if falhas:
+            logger.warning(f"{falhas} tag(s) nova(s) nao puderam ser monitoradas")
+
+    relatar_tags_invalidas(config, classes)
+    colunas_removidas = {coluna for _, coluna in removidas}
+    CACHE_INSTRUCOES.esquecer_colunas(colunas_removidas)
+    logger.info(
+        f"tags_config.csv recarregado: {len(adicionadas)} tag(s) nova(s)/alterada(s), "
+        f"{len(removidas)} removida(s)/alterada(s), sem reconectar"
+    )
+    return tags_novas
+
+
+def main(config):
+    logger.info("=" * 60)
+    logger.info(config.TITULO)
+    logger.info("=" * 60)
+    logger.info(f"OPC UA: {config.OPC_URL}")
+    logger.info(f"SQL Server: {config.DB_SERVER}:{config.DB_PORT}/{config.DB_NAME}")
+    logger.info(f"Intervalo: {config.INTERVALO_SEGUNDOS}s")
+    logger.info(f"Diretorio: {config.BASE_DIR}")
+    logger.info("=" * 60)
+    
+    # Carregar tags
+    tags_por_linha = carregar_tags_do_csv(config)
+    
+    if not tags_por_linha:
+        logger.error("Nenhuma tag configurada!")
+        return
+    
+    logger.info(f"Linhas configuradas: {list(tags_por_linha.keys())}")
+    for linha, tags in tags_por_linha.items():
+        logger.info(f"Linha {linha}: {len(tags)} tags")
+    
+    logger.info(f"Modo de aquisicao: {config.MODO_AQUISICAO}")
+    
+    if config.PROCESSOS_COLETA > 1:
+        supervisionar(config, tags_por_linha)
+        return
+    
+    coletar(config, tags_por_linha)
+
+
+def supervisionar(config, tags_por_linha):
+    """
+    Modo multiprocesso: prepara o banco uma vez com todas as tags, divide as
+    linhas/classes entre os processos coletores e acompanha a vazao deles.
+    """
+    calculadora = preparar_contadores(config, tags_por_linha)
+    if preparar_armazenamento(config, tags_por_linha, calculadora) is None:
+        reconciliar_esquema_sql(config, tags_por_linha, calculadora, EsquemaTabela(config.DB_TABLE))
+    
+    atribuicao = atribuir_unidades(tags_por_linha, config.CLASSES_VARREDURA, config.PROCESSOS_COLETA)
+    processos = len(set(atribuicao.values()))
+    if processos < config.PROCESSOS_COLETA:
+        logger.warning(f"Apenas {processos} grupo(s) linha/classe: {processos} coletor(es) em vez de {config.PROCESSOS_COLETA}")
+    for indice in range(processos):
+        unidades = sorted(u for u, i in atribuicao.items() if i == indice)
+        logger.info(f"Coletor {indice + 1}: {', '.join(f'{linha}/{classe}' for linha, classe in unidades)}")
+    SupervisorProcessos(processo_coletor, processos, (atribuicao, config), config.INTERVALO_SAUDE_COLETORES).executar()
+
+
+def processo_coletor(indice, processos, atribuicao, config, fila_saude, parar):
+    """Entrada de cada processo coletor: spool, log e esquema proprios."""
+    config = config.copiar(
+        PARTICAO=ParticaoTags(atribuicao, processos, indice),
+        SPOOL_DIR=os.path.join(config.SPOOL_DIR, f"processo{indice + 1}") if indice > 0 else config.SPOOL_DIR,
+        ARQUIVO_ESQUEMA=os.path.join(config.BASE_DIR, f"esquema_aplicado_processo{indice + 1}.json"),
+        ARQUIVO_TAGS_INVALIDAS=os.path.join(config.BASE_DIR, f"tags_invalidas_processo{indice + 1}.csv"),
+        ARQUIVO_QUARENTENA=os.path.join(config.BASE_DIR, f"tags_quarentena_processo{indice + 1}.csv"),
+        LOG_FILE=os.path.join(config.LOG_DIR, f"seed_loss_monitor_processo{indice + 1}.log"),
+    )
+    configurar_logging(config)
+    
+    tags_por_linha = carregar_tags_do_processo(config)
+    logger.info(f"Coletor {indice + 1}/{processos}: {sum(len(t) for t in tags_por_linha.values())} tags")
+    if not tags_por_linha:
+        logger.warning("Nenhuma tag para este coletor, aguardando encerramento.")
+        parar.wait()
+        return
+    try:
+        coletar(config, tags_por_linha, AvisoSaude(fila_saude, indice, config.INTERVALO_SAUDE_COLETORES), parar)
+    except KeyboardInterrupt:
+        pass
+
+
+def coletar(config, tags_por_linha, saude=None, parar=None):
+    """
+    Aquisicao e gravacao das tags: o servico inteiro ou, no modo
+    multiprocesso, um coletor ('saude' recebe a vazao, 'parar' encerra).
+    """
+    # Incrementos de contadores (rollover/reset do CLP) calculados no coletor
+    calculadora = preparar_contadores(config, tags_por_linha)
+    
+    # Armazenamento estreito (tag, DataHora, valor): tags novas sem DDL
+    armazenamento = preparar_armazenamento(config, tags_por_linha, calculadora)
+    if armazenamento is not None:
+        inserir = armazenamento.gravar
+    else:
+        inserir = lambda conn, registros: inserir_no_sql(config, conn, registros)
+    
+    # Tabela larga: colunas do tags_config.csv criadas/alargadas (BIGINT contra overflow) em um lote
+    esquema = None
+    if armazenamento is None:
+        esquema = EsquemaTabela(config.DB_TABLE)
+        esquema_ok = reconciliar_esquema_sql(config, tags_por_linha, calculadora, esquema)
+        if esquema_ok is False and calculadora is not None and calculadora.modo == MODO_JUNTO:
+            logger.error("Colunas de contadores indisponiveis, calculo de incrementos desligado.")
+            calculadora = None
+    
+    # Agregados por hora/turno mantidos em memoria (O(1) por amostra)
+    agregador = preparar_agregados(config, calculadora)
+    
+    # Compressao por tag: so registros significativos seguem para o SQL
+    configs_compressao, compressao_padrao = carregar_compressao(config)
+    compressor = CompressorRegistros(configs_compressao, tags_por_linha, compressao_padrao)
+    
+    ciclo_count = 0
+    
+    # Conexoes SQL persistentes (reaproveitadas entre ciclos)
+    pool_sql = PoolConexoesSQL(lambda: conectar_sql(config), config.TAMANHO_POOL_SQL, ao_fechar=CACHE_INSTRUCOES.esquecer)
+    
+    # Spool local: recebe o que o SQL recusar e reenvia quando o SQL voltar
+    spool = SpoolLocal(config.SPOOL_DIR, config.SPOOL_FSYNC, config.SPOOL_TAMANHO_SEGMENTO_MB, config.SPOOL_COTA_MB)
+    drenador = DrenadorSpool(
+        spool, pool_sql, config.DB_TABLE, inserir, config.SPOOL_INTERVALO_DRENAGEM,
+        pode_drenar=(lambda: not esquema.pendentes()) if esquema is not None else None,
+        filtrar=filtrar_ja_gravados if armazenamento is None else None,
+        mesclar=(lambda conn, registros: mesclar_no_sql(config, conn, registros)) if armazenamento is None else None
+    )
+    drenador.start()
+    
+    # Colunas novas criadas em segundo plano, sem parar a aquisicao
+    alargador = None
+    if esquema is not None:
+        alargador = AlargadorEsquema(esquema, lambda: conectar_sql(config))
+        alargador.start()
+    
+    gravador_agregados = None
+    if agregador is not None:
+        gravador_agregados = GravadorAgregados(agregador, pool_sql, config.AGREGADOS_INTERVALO_GRAVACAO)
+        gravador_agregados.start()
+    
+    # Ciclos sem amostra (queda da sessao, atraso) gravados em <DB_TABLE>_lacunas
+    lacunas = MarcadorLacunas(config.DB_TABLE)
+    gravador_lacunas = None
+    if preparar_lacunas(config, lacunas):
+        gravador_lacunas = GravadorLacunas(lacunas, pool_sql)
+        gravador_lacunas.start()
+    
+    # Aquisicao e persistencia desacopladas por uma fila limitada por classe;
+    # a limpeza periodica roda na persistencia da classe mais lenta
+    classes = []
+    divisao = dividir_por_classe(tags_por_linha, config.CLASSES_VARREDURA, config.INTERVALO_SEGUNDOS)
+    mais_lenta = max(range(len(divisao)), key=lambda i: divisao[i][1])
+    gravar = lambda registros: gravar_pendentes(pool_sql, spool, esquema, registros, inserir)
+    for i, (nome, intervalo, tags_classe) in enumerate(divisao):
+        classes.append(criar_classe(
+            config, nome, intervalo, tags_classe, gravar, spool,
+            (lambda: manutencao_periodica(config)) if i == mais_lenta else None
+        ))
+    logger.info(f"Fila de gravacao: {config.TAMANHO_FILA_INSTANTANEOS} ciclos por classe, transbordo '{config.POLITICA_TRANSBORDO}'")
+    ativas = list(classes)
+    agendadores = [classe.agendador for classe in ativas]
+    
+    # tags_config.csv (e o ARQUIVO_INI, se houver) alterados aplicados sem reiniciar o servico
+    observados = [config.ARQUIVO_CONFIG] + ([config.ARQUIVO_INI] if config.ARQUIVO_INI else [])
+    observador = ObservadorArquivos(observados, config.INTERVALO_VERIFICACAO_CONFIG)
+    
+    # Leitura em varias sessoes OPC: o ciclo espera a fatia mais lenta, nao a soma
+    leitor = None
+    if config.MODO_AQUISICAO != "assinatura" and config.SESSOES_LEITURA > 1:
+        leitor = LeitorParalelo(config.OPC_URL, config.SESSOES_LEITURA)
+    client = Client(config.OPC_URL)
+    
+    # Tags em quarentena sao lidas de novo fora do ciclo
+    revisao = None
+    if config.MODO_AQUISICAO != "assinatura" and config.FALHAS_PARA_QUARENTENA > 0:
+        revisao = RevisaoQuarentena(client, lambda: [classe.quarentena for classe in classes])
+        revisao.start()
+    
+    # Estagio que passa do prazo: pilhas no log e recuperacao; alem do orcamento, reinicio
+    vigia_estagios = VigiaEstagios(
+        {AQUISICAO: config.PRAZO_AQUISICAO, CONVERSAO: config.PRAZO_CONVERSAO, PERSISTENCIA: config.PRAZO_PERSISTENCIA,
+         MANUTENCAO: config.PRAZO_MANUTENCAO},
+        config.ORCAMENTO_TRAVAMENTO,
+        {AQUISICAO: lambda: cancelar_aquisicao(client, leitor)},
+        lambda: descarregar_filas(classes, spool),
+    )
+    vigia_estagios.start()
+    
+    # Reconexao com espera exponencial (com jitter); registros e quarentena sao mantidos
+    espera = EsperaReconexao(config.ESPERA_RECONEXAO, config.ESPERA_MAXIMA_RECONEXAO)
+    vigia = None
+    queda = None
+    
+    while True:
+        try:
+            logger.info(f"Conectando ao OPC UA ({config.OPC_URL})...")
+            ESTAGIOS.entrar(AQUISICAO)
+            client.connect()
+            logger.info("Conectado ao OPC UA!")
+            
+            tamanho_lote = obter_max_nodes_por_leitura(client, config.TAMANHO_LOTE_LEITURA)
+            for classe in classes:
+                classe.registro.compilar(client, tamanho_lote, registrar=leitor is None)
+            # Verificacao previa: tags inexistentes ficam fora do ciclo
+            relatar_tags_invalidas(config, classes)
+            if esquema is not None:
+                detectar_colunas_novas(client, classes, esquema, tamanho_lote)
+            
+            tabela_valores = None
+            assinatura = None
+            if config.MODO_AQUISICAO == "assinatura":
+                tabela_valores = TabelaUltimosValores()
+                assinatura = iniciar_assinatura(
+                    client, [n for classe in classes for n in classe.registro.node_ids], tabela_valores,
+                    config.INTERVALO_PUBLICACAO_MS, config.INTERVALO_AMOSTRAGEM_MS, config.TAMANHO_FILA_ASSINATURA, tamanho_lote
+                )
+            else:
+                logger.info(f"Leitura em lote: ate {tamanho_lote} tags por Read")
+                if leitor is not None:
+                    leitor.conectar(tamanho_lote)
+            
+            # Queda do servidor detectada em segundos, mesmo durante a espera do ciclo
+            vigia = VigiaSessao(client, config.INTERVALO_KEEPALIVE)
+            vigia.start()
+            # Horario perdido durante a queda: executado agora se ainda couber no intervalo
+            for agendador in agendadores:
+                agendador.reavaliar()
+            ESTAGIOS.sair()
+            
+            while parar is None or not parar.is_set():
+                # Dorme ate o proximo horario de alguma classe; DataHora e o horario nominal
+                for indice, data_slot in aguardar_varios(agendadores, vigia.perdida):
+                    classe = ativas[indice]
+                    registro = classe.registro
+                    ciclo_count += 1
+                    logger.info(f"Ciclo {ciclo_count} [{classe.nome}]: {data_slot.strftime('%Y-%m-%d %H:%M:%S')}")
+                    if classe.agendador.ciclos % config.CICLOS_PARA_LIMPEZA == 0:
+                        logger.info(f"[{classe.nome}] {classe.agendador.resumo()}")
+                        logger.info(compressor.resumo())
+                        logger.info(vigia_estagios.resumo())
+                        if classe.quarentena.ativa():
+                            logger.info(f"[{classe.nome}] {classe.quarentena.resumo()}")
+                    
+                    # Instante da amostra (gravado em DataHora, nao o horario do INSERT)
+                    data_amostra = truncar_data_hora_sql(data_slot)
+                    
+                    # Assinatura: le a tabela de ultimos valores; leitura: um Read em lote
+                    ESTAGIOS.entrar(AQUISICAO)
+                    if tabela_valores is not None:
+                        valores, status = tabela_valores.ler(registro.node_ids)
+                    elif leitor is not None:
+                        valores, status = leitor.ler(registro)
+                    else:
+                        valores, status = registro.ler(client)
+                    if queda is not None:
+                        logger.info(f"Primeira amostra {time.monotonic() - queda:.1f}s apos a queda da sessao OPC")
+                        queda = None
+                        espera.zerar()
+                    
+                    ESTAGIOS.entrar(CONVERSAO)
+                    instantaneo = []
+                    for linha, colunas, inicio, fim in registro.linhas:
+                        # Conversor fixo por tag (DataType lido na compilacao do registro)
+                        convertidos = converter_valores(registro.conversores[inicio:fim], valores[inicio:fim])
+                        erros = 0
+                        isoladas = 0
+                        # Modo estreito: StatusCode das tags com erro vai para a coluna qualidade
+                        qualidades = {} if armazenamento is not None else None
+                        
+                        for i, st in enumerate(status[inicio:fim]):
+                            if not st.is_good():
+                                convertidos[i] = None
+                                if qualidades is not None:
+                                    qualidades[colunas[i]] = st.value
+                                # Em quarentena: nao foi lida, sem aviso por ciclo
+                                if st is STATUS_QUARENTENA:
+                                    isoladas += 1
+                                    continue
+                                erros += 1
+                                classe.quarentena.falhou(registro.node_ids[inicio + i], st)
+                                if erros <= 3:
+                                    logger.warning(f"Erro tag {colunas[i]}: {st.name}")
+                        
+                        logger.info(
+                            f"Linha {linha}: {len(colunas) - erros - isoladas}/{len(colunas)} tags OK"
+                            + (f", {isoladas} em quarentena" if isoladas else "")
+                        )
+                        valores_linha = dict(zip(colunas, convertidos))
+                        if qualidades is not None:
+                            valores_linha[COLUNA_QUALIDADE] = qualidades
+                        instantaneo.append((linha, data_amostra, valores_linha))
+                    if classe.quarentena.fechar_ciclo():
+                        relatar_quarentena(config, classes)
+                    
+                    # Gravacao fica com a thread de persistencia da classe
+                    # Agregados usam todas as amostras (antes da compressao)
+                    if agregador is not None:
+                        agregador.adicionar(instantaneo)
+                    registros = compressor.filtrar(instantaneo)
+                    if calculadora is not None:
+                        registros = calculadora.processar(registros)
+                    classe.fila.colocar(registros)
+                    lacunas.amostra(classe.nome, data_slot, classe.intervalo, registro.linhas)
+                    if saude is not None:
+                        saude.registrar(len(registro), sum(len(c.fila) for c in classes))
+                    ESTAGIOS.sair()
+                
+                if vigia.perdida.is_set():
+                    raise ConnectionError(vigia.motivo)
+                
+                ESTAGIOS.entrar(MANUTENCAO)
+                alterados = observador.alterados()
+                if alterados:
+                    if config.ARQUIVO_INI in alterados and config.RECARREGAR_INI is not None:
+                        config.RECARREGAR_INI(config)
+                    tags_novas = recarregar_tags(
+                        config, client, tamanho_lote, classes, assinatura, tags_por_linha, gravar, spool
+                    )
+                    if tags_novas is not tags_por_linha:
+                        # Pontos retidos com a configuracao antiga sao gravados antes da troca
+                        configs_compressao, compressao_padrao = carregar_compressao(config)
+                        registros = compressor.atualizar(configs_compressao, tags_novas, compressao_padrao)
+                        if calculadora is not None:
+                            registros = calculadora.processar(registros)
+                        classes[0].fila.colocar(registros)
+                        colunas = {c for tags in tags_novas.values() for c in tags}
+                        derivadas = calculadora.colunas_derivadas(colunas) if calculadora is not None else []
+                        if esquema is not None:
+                            detectar_colunas_novas(client, classes, esquema, tamanho_lote)
+                            esquema.esperar(dict(derivadas))
+                        else:
+                            armazenamento.atualizar(tags_novas, colunas_esperadas(tags_novas, derivadas))
+                        tags_por_linha = tags_novas
+                        ativas = [classe for classe in classes if len(classe.registro)]
+                        agendadores = [classe.agendador for classe in ativas]
+                ESTAGIOS.sair()
+            
+            # Encerramento pedido pelo supervisor (modo multiprocesso)
+            break
+                
+        except KeyboardInterrupt:
+            logger.info("Parando monitor (KeyboardInterrupt)...")
+            break
+        except Exception as e:
+            ESTAGIOS.sair()
+            logger.error(f"Erro na conexao OPC: {e}")
+            if queda is None:
+                queda = time.monotonic()
+            lacunas.falha(e)
+            # Sessao perdida: fecha so o socket, sem esperar CloseSession no servidor caido
+            perdida = vigia is not None and vigia.perdida.is_set()
+            if vigia is not None:
+                vigia.parar()
+                vigia = None
+            if leitor is not None:
+                leitor.desconectar()
+            encerrar_sessao(client, perdida)
+            segundos = espera.proxima()
+            logger.info(f"Tentando reconectar em {segundos:.1f} segundos...")
+            time.sleep(segundos)
+            continue
+    
+    if vigia is not None:
+        vigia.parar()
+    vigia_estagios.parar()
+    if revisao is not None:
+        revisao.parar()
+    if leitor is not None:
+        leitor.fechar()
+    try:
+        client.disconnect()
+        logger.info("Desconectado do OPC UA.")
+    except:
+        pass
+    
+    # Grava o que ainda estiver nas filas (e os pontos retidos pela compressao) antes de encerrar
+    registros = compressor.descarregar()
+    if calculadora is not None:
+        registros = calculadora.processar(registros)
+    classes[0].fila.colocar(registros)
+    for classe in classes:
+        classe.persistencia.parar()
+        if classe.fila.transbordos:
+            logger.warning(f"Fila de gravacao '{classe.nome}' transbordou {classe.fila.transbordos} vez(es) (politica '{classe.fila.politica}')")
+    if gravador_agregados is not None:
+        gravador_agregados.parar()
+    if gravador_lacunas is not None:
+        gravador_lacunas.parar()
+    if alargador is not None:
+        alargador.parar()
+    drenador.parar()
+    spool.fechar()
+    pool_sql.fechar_todas()
@@ -0,0 +1,206 @@
+"""
+COLETA EM VARIOS PROCESSOS
+Para plantas com dezenas de milhares de tags, a decodificacao e a conversao
+de tipos no ciclo ficam presas a um nucleo (GIL). Neste modo o processo
+principal vira supervisor: divide as tags em unidades (linha, classe de
+varredura), distribui as unidades entre N processos coletores e acompanha
+a saude de cada um.
+
+Cada coletor tem sua sessao OPC, seu pool SQL, seu spool e seu log; ele
+grava so as suas linhas/classes, que ja sao registros separados na tabela
+(uma classe de varredura grava suas proprias linhas), entao os processos
+nao disputam o mesmo registro. Os coletores enviam periodicamente ciclos,
+tags lidas e ocupacao das filas; o supervisor registra a vazao de cada um
+e reinicia o coletor que parar.
+"""
+
+import time
+import zlib
+import queue
+import logging
+import multiprocessing
+from classes_varredura import classe_da_coluna, CLASSE_PADRAO
+
+logger = logging.getLogger('SeedLossMonitor')
+
+INTERVALO_SAUDE_SEGUNDOS = 60
+ESPERA_REINICIO_SEGUNDOS = 30
+
+
+def _classe(coluna, classes):
+    return classe_da_coluna(coluna, classes) or CLASSE_PADRAO
+
+
+def atribuir_unidades(tags_por_linha, classes, processos):
+    """
+    {(linha, classe): indice do processo}. Unidades maiores primeiro, cada
+    uma para o processo com menos tags (resultado deterministico).
+    """
+    tamanhos = {}
+    for linha, tags in tags_por_linha.items():
+        for coluna in tags:
+            unidade = (linha, _classe(coluna, classes))
+            tamanhos[unidade] = tamanhos.get(unidade, 0) + 1
+
+    carga = [0] * max(1, int(processos))
+    atribuicao = {}
+    for unidade in sorted(tamanhos, key=lambda u: (-tamanhos[u], u)):
+        indice = carga.index(min(carga))
+        atribuicao[unidade] = indice
+        carga[indice] += tamanhos[unidade]
+    return atribuicao
+
+
+class ParticaoTags:
+    """
+    Tags de um processo coletor. Unidades que nao existiam na divisao
+    inicial (linha/classe nova na recarga do CSV) vao para um processo
+    escolhido pelo hash do nome, o mesmo em todos os coletores.
+    """
+
+    def __init__(self, atribuicao, processos, indice):
+        self.atribuicao = atribuicao
+        self.processos = processos
+        self.indice = indice
+
+    def dono(self, linha, classe):
+        indice = self.atribuicao.get((linha, classe))
+        if indice is None:
+            indice = zlib.crc32(f"{linha}|{classe}".encode('utf-8')) % self.processos
+        return indice
+
+    def filtrar(self, tags_por_linha, classes):
+        resultado = {}
+        for linha, tags in tags_por_linha.items():
+            for coluna, tag_path in tags.items():
+                if self.dono(linha, _classe(coluna, classes)) == self.indice:
+                    resultado.setdefault(linha, {})[coluna] = tag_path
+        return resultado
+
+
+class AvisoSaude:
+    """Lado do coletor: envia (indice, ciclos, tags lidas, fila) no maximo a cada 'intervalo'."""
+
+    def __init__(self, fila, indice, intervalo_segundos=INTERVALO_SAUDE_SEGUNDOS):
+        self.fila = fila
+        self.indice = indice
+        self.intervalo = intervalo_segundos
+        self.ciclos = 0
+        self.tags_lidas = 0
+        self._proximo = 0.0
+
+    def registrar(self, tags_lidas, pendentes):
+        self.ciclos += 1
+        self.tags_lidas += tags_lidas
+        agora = time.monotonic()
+        if agora < self._proximo:
+            return
+        self._proximo = agora + self.intervalo
+        try:
+            self.fila.put_nowait((self.indice, self.ciclos, self.tags_lidas, pendentes, time.time()))
+        except Exception:
+            pass
+
+
+class SupervisorProcessos:
+    """
+    Inicia os coletores alvo(indice, processos, *argumentos, fila_saude,
+    evento_parar), registra a vazao de cada um e reinicia os que terminarem.
+    executar() bloqueia ate KeyboardInterrupt.
+    """
+
+    def __init__(self, alvo, processos, argumentos=(), intervalo_saude=INTERVALO_SAUDE_SEGUNDOS,
+                 espera_reinicio=ESPERA_REINICIO_SEGUNDOS):
+        self.alvo = alvo
+        self.processos = max(1, int(processos))
+        self.argumentos = tuple(argumentos)
+        self.intervalo_saude = intervalo_saude
+        self.espera_reinicio = espera_reinicio
+        self.fila_saude = multiprocessing.Queue()
+        self.evento_parar = multiprocessing.Event()
+        self._coletores = [None] * self.processos
+        self._reinicio = [0.0] * self.processos
+        self._saude = {}  # indice -> (ciclos, tags_lidas, pendentes, instante)
+        self._anterior = {}  # indice -> (tags_lidas, instante) do ultimo resumo
+        self.reinicios = 0
+
+    def _iniciar(self, indice):
+        processo = multiprocessing.Process(
+            target=self.alvo,
+            args=(indice, self.processos) + self.argumentos + (self.fila_saude, self.evento_parar),
+            name=f"Coletor{indice + 1}",
+        )
+        processo.start()
+        self._coletores[indice] = processo
+        logger.info(f"Coletor {indice + 1}/{self.processos} iniciado (pid {processo.pid})")
+
+    def _verificar(self):
+        agora = time.monotonic()
+        for indice, processo in enumerate(self._coletores):
+            if processo is not None and processo.is_alive():
+                continue
+            if processo is not None:
+                logger.error(f"Coletor {indice + 1} terminou (codigo {processo.exitcode}); "
+                             f"reinicio em {self.espera_reinicio}s")
+                self._coletores[indice] = None
+                self._reinicio[indice] = agora + self.espera_reinicio
+                self.reinicios += 1
+            elif agora >= self._reinicio[indice]:
+                self._iniciar(indice)
+
+    def _receber(self, espera):
+        try:
+            indice, ciclos, tags_lidas, pendentes, instante = self.fila_saude.get(timeout=espera)
+        except queue.Empty:
+            return
+        self._saude[indice] = (ciclos, tags_lidas, pendentes, instante)
+
+    def resumo(self):
+        """Vazao (tags/s) de cada coletor desde o ultimo resumo."""
+        partes = []
+        total = 0.0
+        for indice in range(self.processos):
+            saude = self._saude.get(indice)
+            if saude is None:
+                partes.append(f"C{indice + 1}: sem aviso")
+                continue
+            ciclos, tags_lidas, pendentes, instante = saude
+            anteriores, instante_anterior = self._anterior.get(indice, (0, None))
+            if tags_lidas < anteriores:  # Coletor reiniciado, contagem recomecou
+                anteriores = 0
+            vazao = 0.0
+            if instante_anterior is not None and instante > instante_anterior:
+                vazao = (tags_lidas - anteriores) / (instante - instante_anterior)
+            self._anterior[indice] = (tags_lidas, instante)
+            total += vazao
+            partes.append(
+                f"C{indice + 1}: {vazao:.0f} tags/s, {ciclos} ciclos, fila {pendentes}, "
+                f"aviso ha {time.time() - instante:.0f}s"
+            )
+        return f"Coletores: {total:.0f} tags/s | " + " | ".join(partes)
+
+    def executar(self):
+        for indice in range(self.processos):
+            self._iniciar(indice)
+        proximo_resumo = time.monotonic() + self.intervalo_saude
+        try:
+            while True:
+                self._receber(1.0)
+                self._verificar()
+                if time.monotonic() >= proximo_resumo:
+                    proximo_resumo = time.monotonic() + self.intervalo_saude
+                    logger.info(self.resumo())
+        except KeyboardInterrupt:
+            logger.info("Parando coletores...")
+        finally:
+            self.parar()
+
+    def parar(self, espera=60):
+        """Pede o encerramento (cada coletor grava suas filas) e aguarda."""
+        self.evento_parar.set()
+        for processo in self._coletores:
+            if processo is not None:
+                processo.join(espera)
+                if processo.is_alive():
+                    logger.warning(f"{processo.name} nao encerrou em {espera}s, finalizando")
+                    processo.terminate()
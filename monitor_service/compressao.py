@@ -0,0 +1,250 @@
+"""
+COMPRESSAO NO COLETOR (DEADBAND / SWINGING DOOR)
+Mesma semantica do historiador IP21 (ver tag_automation/taglist_to_deloitte.py):
+    IP_COMPRESSION      ON/OFF (ou DEADBAND / SWINGING_DOOR explicito)
+    IP_DC_SIGNIFICANCE  desvio significativo, absoluto ("1.00") ou percentual ("2%")
+    IP_DC_MAX_TIME_INT  tempo maximo sem gravar ("+000:05:00.0" = hhh:mm:ss.d)
+
+A gravacao no SQL e por linha (uma linha da tabela tem todas as colunas da
+linha de producao), entao a decisao tambem e por linha: o registro vai para
+o SQL quando alguma de suas tags tem um ponto significativo. Tags com
+compressao OFF tornam a linha sempre significativa.
+
+Configuracao por tag: colunas opcionais IP_DC_SIGNIFICANCE,
+IP_DC_MAX_TIME_INT e IP_COMPRESSION no tags_config.csv. Celulas vazias
+usam os padroes do script.
+"""
+
+import os
+import csv
+import logging
+from sql_escrita import COLUNA_QUALIDADE
+
+logger = logging.getLogger('SeedLossMonitor')
+
+COMPRESSAO_OFF = "OFF"
+COMPRESSAO_ON = "ON"
+DEADBAND = "DEADBAND"
+SWINGING_DOOR = "SWINGING_DOOR"
+
+COLUNA_SIGNIFICANCIA = "IP_DC_SIGNIFICANCE"
+COLUNA_TEMPO_MAX = "IP_DC_MAX_TIME_INT"
+COLUNA_COMPRESSAO = "IP_COMPRESSION"
+
+
+def interpretar_tempo_ip21(texto):
+    """Converte '+000:05:00.0' (hhh:mm:ss.d) ou segundos ('300') em segundos."""
+    texto = str(texto).strip().lstrip('+')
+    if ':' not in texto:
+        return float(texto)
+    segundos = 0.0
+    for parte in texto.split(':'):
+        segundos = segundos * 60 + float(parte)
+    return segundos
+
+
+class ConfigCompressao:
+    """Parametros de compressao de uma tag."""
+
+    def __init__(self, algoritmo=COMPRESSAO_OFF, significancia="1.00", tempo_max="+000:05:00.0"):
+        self.algoritmo = algoritmo
+        significancia = str(significancia).strip()
+        self.percentual = significancia.endswith('%')
+        self.significancia = float(significancia.rstrip('%') or 0)
+        self.tempo_max = interpretar_tempo_ip21(tempo_max) if str(tempo_max).strip() else 0.0
+
+    def desvio_permitido(self, referencia):
+        if self.percentual:
+            return abs(referencia) * self.significancia / 100.0
+        return self.significancia
+
+
+def resolver_algoritmo(compressao, algoritmo_on):
+    """IP_COMPRESSION -> DEADBAND, SWINGING_DOOR ou OFF ('ON' usa 'algoritmo_on')."""
+    compressao = str(compressao).strip().upper()
+    if compressao == COMPRESSAO_ON:
+        return algoritmo_on.strip().upper()
+    if compressao in (DEADBAND, SWINGING_DOOR):
+        return compressao
+    return COMPRESSAO_OFF
+
+
+def carregar_compressao_do_csv(caminho, compressao_padrao, algoritmo_on, significancia_padrao, tempo_max_padrao):
+    """
+    Le as colunas IP21 opcionais do tags_config.csv.
+    Retorna {tag_path: ConfigCompressao}; tags sem linha no CSV usam o padrao
+    via config_da_tag().
+    """
+    configs = {}
+    if not os.path.exists(caminho):
+        return configs
+    with open(caminho, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        cabecalho = [c.strip() for c in next(reader, [])]
+        for row in reader:
+            if not row or not row[0].strip():
+                continue
+            campos = dict(zip(cabecalho, [c.strip() for c in row]))
+            try:
+                configs[row[0].strip()] = ConfigCompressao(
+                    resolver_algoritmo(campos.get(COLUNA_COMPRESSAO) or compressao_padrao, algoritmo_on),
+                    campos.get(COLUNA_SIGNIFICANCIA) or significancia_padrao,
+                    campos.get(COLUNA_TEMPO_MAX) or tempo_max_padrao,
+                )
+            except ValueError as e:
+                logger.warning(f"Compressao invalida para {row[0].strip()}, tag sem compressao: {e}")
+                configs[row[0].strip()] = ConfigCompressao(COMPRESSAO_OFF)
+    return configs
+
+
+def _numerico(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+class CompressorLinha:
+    """
+    Estado de compressao de uma linha (um conjunto fixo de colunas).
+
+    Deadband: grava a amostra atual quando ela se afasta mais que a
+    significancia do ultimo valor gravado.
+    Swinging door: mantem, por tag, o corredor de inclinacoes que cabe em
+    +/- significancia desde o ultimo ponto gravado; quando a amostra atual
+    fecha o corredor, grava a amostra ANTERIOR (retida) e reabre a porta
+    a partir dela.
+    """
+
+    def __init__(self, configs):
+        self.configs = configs  # {coluna: ConfigCompressao}
+        self.tempo_max = min((c.tempo_max for c in configs.values() if c.tempo_max > 0), default=0.0)
+        self.sempre = any(c.algoritmo == COMPRESSAO_OFF for c in configs.values())
+        self._gravado = None  # (data_hora, valores)
+        self._retido = None  # (data_hora, valores) ainda nao gravado
+        self._portas = {}  # coluna -> [inclinacao_min, inclinacao_max]
+
+    def _abrir_portas(self, data_hora, valores):
+        self._gravado = (data_hora, valores)
+        self._portas = {}
+
+    def _porta_fechou(self, coluna, config, data_hora, valor):
+        """Atualiza o corredor da tag e retorna True se ele fechou."""
+        t0, valores0 = self._gravado
+        v0 = valores0.get(coluna)
+        dt = (data_hora - t0).total_seconds()
+        if dt <= 0:
+            return False
+        desvio = config.desvio_permitido(v0)
+        porta = self._portas.setdefault(coluna, [float('-inf'), float('inf')])
+        porta[0] = max(porta[0], (valor - v0 - desvio) / dt)
+        porta[1] = min(porta[1], (valor - v0 + desvio) / dt)
+        return porta[0] > porta[1]
+
+    def _avaliar(self, data_hora, valores):
+        """Retorna (saiu_da_banda, porta_fechou) da amostra frente ao ultimo ponto gravado."""
+        _, gravados = self._gravado
+        # Mudanca de StatusCode (modo estreito) e significativa
+        banda = valores.get(COLUNA_QUALIDADE) != gravados.get(COLUNA_QUALIDADE)
+        porta = False
+        for coluna, config in self.configs.items():
+            valor = valores.get(coluna)
+            anterior = gravados.get(coluna)
+            if not (_numerico(valor) and _numerico(anterior)):
+                # Texto, bool, falha de leitura: qualquer mudanca e significativa
+                banda = banda or valor != anterior
+            elif config.algoritmo == SWINGING_DOOR:
+                porta = self._porta_fechou(coluna, config, data_hora, valor) or porta
+            elif abs(valor - anterior) >= config.desvio_permitido(anterior) and valor != anterior:
+                banda = True
+        return banda, porta
+
+    def processar(self, data_hora, valores):
+        """Recebe uma amostra e retorna a lista de (data_hora, valores) a gravar."""
+        if self.sempre or self._gravado is None:
+            self._abrir_portas(data_hora, valores)
+            self._retido = None
+            return [(data_hora, valores)]
+
+        gravar = []
+        banda, porta = self._avaliar(data_hora, valores)
+        if porta and self._retido is not None:
+            # Grava o ultimo ponto dentro da porta e reavalia a amostra atual a partir dele
+            gravar.append(self._retido)
+            self._abrir_portas(*self._retido)
+            self._retido = None
+            banda, porta = self._avaliar(data_hora, valores)
+
+        vencido = self.tempo_max and (data_hora - self._gravado[0]).total_seconds() >= self.tempo_max
+        if banda or porta or vencido:
+            gravar.append((data_hora, valores))
+            self._abrir_portas(data_hora, valores)
+            self._retido = None
+        else:
+            self._retido = (data_hora, valores)
+        return gravar
+
+    def descarregar(self):
+        """Ponto retido ainda nao gravado (usar no encerramento)."""
+        retido, self._retido = self._retido, None
+        return [retido] if retido is not None else []
+
+
+class CompressorRegistros:
+    """
+    Compressores por linha/conjunto de colunas. filtrar() recebe o
+    instantaneo do ciclo [(linha, data_hora, valores_dict)] e devolve so os
+    registros significativos.
+    """
+
+    def __init__(self, configs_por_tag, tags_por_linha, config_padrao):
+        self._configs_por_tag = configs_por_tag
+        self._tags_por_linha = tags_por_linha
+        self._config_padrao = config_padrao
+        self._linhas = {}
+        self.recebidos = 0
+        self.gravados = 0
+
+    def _compressor(self, linha, valores):
+        chave = (linha, tuple(valores.keys()))
+        compressor = self._linhas.get(chave)
+        if compressor is None:
+            tags = self._tags_por_linha.get(linha, {})
+            configs = {
+                coluna: self._configs_por_tag.get(tags.get(coluna), self._config_padrao)
+                for coluna in valores if coluna != COLUNA_QUALIDADE
+            }
+            compressor = self._linhas[chave] = CompressorLinha(configs)
+        return compressor
+
+    def filtrar(self, instantaneo):
+        saida = []
+        for linha, data_hora, valores in instantaneo:
+            self.recebidos += 1
+            for data_gravar, valores_gravar in self._compressor(linha, valores).processar(data_hora, valores):
+                saida.append((linha, data_gravar, valores_gravar))
+        self.gravados += len(saida)
+        return saida
+
+    def atualizar(self, configs_por_tag, tags_por_linha, config_padrao=None):
+        """
+        Troca a configuracao (recarga do tags_config.csv). Os compressores sao
+        recriados com os novos parametros; retorna os registros que estavam
+        retidos, para serem gravados.
+        """
+        saida = self.descarregar()
+        self._configs_por_tag = configs_por_tag
+        self._tags_por_linha = tags_por_linha
+        if config_padrao is not None:
+            self._config_padrao = config_padrao
+        self._linhas = {}
+        return saida
+
+    def descarregar(self):
+        """Registros retidos de todas as linhas (encerramento do servico)."""
+        saida = []
+        for (linha, _), compressor in self._linhas.items():
+            saida.extend((linha, d, v) for d, v in compressor.descarregar())
+        self.gravados += len(saida)
+        return saida
+
+    def resumo(self):
+        taxa = self.recebidos / self.gravados if self.gravados else 0.0
+        return f"Compressao: {self.recebidos} registro(s) lidos, {self.gravados} gravados ({taxa:.1f}:1)"
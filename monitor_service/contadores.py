@@ -0,0 +1,138 @@
+"""
+CONTADORES (TOTAIS CRESCENTES) - INCREMENTO E TAXA
+Para as colunas declaradas como contador (ex: dTotEarsBatch, dBatchTime)
+calcula o incremento desde o registro anterior da mesma linha e a taxa
+por segundo, tratando o estouro do registrador do CLP (rollover) e o
+zeramento do contador (reset / novo lote).
+
+Modo "junto": grava <coluna>_delta e <coluna>_taxa ao lado do total.
+Modo "substituir": grava o incremento no lugar do total.
+"""
+
+import logging
+from fnmatch import fnmatchcase
+from sql_escrita import COLUNA_QUALIDADE
+
+logger = logging.getLogger('SeedLossMonitor')
+
+MODO_JUNTO = "junto"
+MODO_SUBSTITUIR = "substituir"
+
+SUFIXO_DELTA = "_delta"
+SUFIXO_TAXA = "_taxa"
+
+# Queda maior que esta fracao da faixa do registrador e tratada como reset, nao rollover
+FRACAO_ROLLOVER = 0.5
+
+EVENTO_ROLLOVER = "rollover"
+EVENTO_RESET = "reset"
+
+
+def calcular_incremento(anterior, atual, faixa):
+    """
+    Incremento de um contador com registrador de 'faixa' valores.
+    Retorna (delta, evento) com evento None, EVENTO_ROLLOVER ou EVENTO_RESET.
+    """
+    if atual >= anterior:
+        return atual - anterior, None
+    volta = atual - anterior + faixa
+    if volta <= faixa * FRACAO_ROLLOVER:
+        return volta, EVENTO_ROLLOVER
+    # Zerado no CLP (reset ou novo lote): conta a partir de zero
+    return max(atual, 0), EVENTO_RESET
+
+
+def _numerico(valor):
+    return isinstance(valor, (int, float)) and not isinstance(valor, bool)
+
+
+class CalculadoraContadores:
+    """
+    Incrementos por (linha, coluna) entre registros consecutivos.
+
+    'padroes' sao padroes de coluna (fnmatch) dos contadores. 'bits' e
+    'com_sinal' descrevem o registrador do CLP (DINT = 32 bits com sinal):
+    leituras fora da faixa do registrador (ex: o servidor entrega o DINT
+    como UDINT) sao trazidas para [minimo, minimo + faixa) antes do calculo.
+    """
+
+    def __init__(self, padroes, modo=MODO_JUNTO, bits=32, com_sinal=True):
+        self.padroes = list(padroes)
+        self.modo = modo
+        self.faixa = 2 ** int(bits)
+        self.minimo = -(self.faixa // 2) if com_sinal else 0
+        self._estado = {}  # (linha, coluna) -> (data_hora, valor)
+        self._contadores_por_colunas = {}  # colunas -> (contadores, ...)
+
+        # Contadores para log/diagnostico
+        self.rollovers = 0
+        self.resets = 0
+
+    def eh_contador(self, coluna):
+        return any(fnmatchcase(coluna, p) for p in self.padroes)
+
+    def _contadores(self, colunas):
+        contadores = self._contadores_por_colunas.get(colunas)
+        if contadores is None:
+            contadores = self._contadores_por_colunas[colunas] = tuple(
+                c for c in colunas if c != COLUNA_QUALIDADE and self.eh_contador(c)
+            )
+        return contadores
+
+    def colunas_derivadas(self, colunas):
+        """[(coluna, tipo_sql)] que o modo atual acrescenta na tabela."""
+        if self.modo != MODO_JUNTO:
+            return []
+        derivadas = []
+        for coluna in sorted(c for c in colunas if self.eh_contador(c)):
+            derivadas.append((coluna + SUFIXO_DELTA, "BIGINT"))
+            derivadas.append((coluna + SUFIXO_TAXA, "FLOAT"))
+        return derivadas
+
+    def normalizar(self, valor):
+        """Valor do registrador na faixa [minimo, minimo + faixa)."""
+        if self.minimo <= valor < self.minimo + self.faixa:
+            return valor
+        return (valor - self.minimo) % self.faixa + self.minimo
+
+    def incremento(self, linha, coluna, anterior, atual):
+        """Incremento de 'anterior' para 'atual' considerando rollover e reset."""
+        delta, evento = calcular_incremento(anterior, atual, self.faixa)
+        if evento == EVENTO_ROLLOVER:
+            self.rollovers += 1
+            logger.info(f"Contador {coluna} linha {linha}: estouro do registrador ({anterior} -> {atual})")
+        elif evento == EVENTO_RESET:
+            self.resets += 1
+        return delta
+
+    def processar(self, registros):
+        """Recebe [(linha, data_hora, valores_dict)] e devolve os registros com os incrementos."""
+        saida = []
+        for linha, data_hora, valores in registros:
+            contadores = self._contadores(tuple(valores.keys()))
+            if not contadores:
+                saida.append((linha, data_hora, valores))
+                continue
+
+            novos = dict(valores)
+            for coluna in contadores:
+                atual = valores[coluna]
+                delta = taxa = None
+                if _numerico(atual):
+                    atual = self.normalizar(atual)
+                    chave = (linha, coluna)
+                    anterior = self._estado.get(chave)
+                    if anterior is not None:
+                        delta = self.incremento(linha, coluna, anterior[1], atual)
+                        segundos = (data_hora - anterior[0]).total_seconds()
+                        taxa = delta / segundos if segundos > 0 else None
+                    self._estado[chave] = (data_hora, atual)
+
+                if self.modo == MODO_SUBSTITUIR:
+                    novos[coluna] = delta
+                else:
+                    novos[coluna + SUFIXO_DELTA] = delta
+                    novos[coluna + SUFIXO_TAXA] = taxa
+            saida.append((linha, data_hora, novos))
+        return saida
+
@@ -0,0 +1,74 @@
+"""
+CONVERSAO DE VALORES POR TAG
+O DataType de cada tag e lido uma vez, na compilacao do registro, e cada
+tag recebe um conversor fixo (int, float, str, datetime). O ciclo aplica os
+conversores de uma linha de uma vez, sem cadeia de isinstance nem
+try/except por valor, e cada coluna chega ao SQL sempre com o mesmo tipo
+de parametro (Boolean vira 0/1, nunca bool do Python).
+"""
+
+from datetime import datetime
+from sql_escrita import truncar_data_hora_sql
+
+# Menor data da coluna DATETIME; o DateTime nulo do OPC (1601-01-01) vira None
+MENOR_DATA_SQL = datetime(1753, 1, 1)
+
+
+def converter_data_hora(valor):
+    """DateTime OPC (datetime UTC) para a coluna DATETIME, truncado como a DataHora."""
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    if not isinstance(valor, datetime):
+        raise TypeError(f"DateTime invalido: {valor!r}")
+    if valor.replace(tzinfo=None) < MENOR_DATA_SQL:
+        return None
+    return truncar_data_hora_sql(valor)
+
+
+# DataType OPC (ns=0) -> conversor; demais tipos usam converter_generico
+CONVERSORES_POR_DATATYPE = {
+    1: int,  # Boolean (True -> 1)
+    2: int,  # SByte
+    3: int,  # Byte
+    4: int,  # Int16
+    5: int,  # UInt16
+    6: int,  # Int32
+    7: int,  # UInt32
+    8: int,  # Int64
+    9: int,  # UInt64
+    10: float,  # Float
+    11: float,  # Double
+    12: str,  # String
+    13: converter_data_hora,  # DateTime
+}
+
+
+def converter_generico(valor):
+    """Conversao pelo tipo do valor (DataType desconhecido ou valor fora do tipo declarado)."""
+    if valor is None or isinstance(valor, (float, str)):
+        return valor
+    if isinstance(valor, int):
+        return int(valor)  # bool -> 0/1
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return str(valor)
+
+
+def conversor_do_datatype(data_type):
+    """Conversor da tag a partir do DataType OPC (ua.NodeId ou None)."""
+    if data_type is None or getattr(data_type, 'NamespaceIndex', None) != 0:
+        return converter_generico
+    return CONVERSORES_POR_DATATYPE.get(data_type.Identifier, converter_generico)
+
+
+def converter_valores(conversores, valores):
+    """
+    Aplica o conversor de cada tag (None continua None). Se algum valor nao
+    casar com o tipo declarado (ex: array), a linha inteira usa a conversao
+    generica; o caminho normal nao tem tratamento de excecao por valor.
+    """
+    try:
+        return [None if v is None else c(v) for c, v in zip(conversores, valores)]
+    except (TypeError, ValueError):
+        return [converter_generico(v) for v in valores]
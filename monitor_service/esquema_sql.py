@@ -0,0 +1,372 @@
+"""
+RECONCILIACAO DO ESQUEMA SQL
+Compara as colunas que o tags_config.csv exige (com tipo inferido pelo
+prefixo do nome da tag) com as colunas da tabela, lidas de uma vez do
+INFORMATION_SCHEMA.COLUMNS, e aplica so o que falta em um unico lote
+(ADD para colunas novas, ALTER COLUMN apenas para alargar o tipo).
+
+Cada comando aplicado fica registrado na tabela schema_migracoes, e a
+assinatura do esquema reconciliado fica em um arquivo local: enquanto o
+tags_config.csv nao mudar, o reinicio do servico nao consulta o banco.
+
+Em execucao, EsquemaTabela guarda o conjunto de colunas em cache. Colunas
+novas (tags que ainda nao tem coluna) sao criadas pelo AlargadorEsquema
+com o tipo do DataType OPC; ate o DDL terminar, a parte conhecida de cada
+registro segue para o INSERT e so as colunas novas vao para o spool.
+"""
+
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('SeedLossMonitor')
+
+TABELA_MIGRACOES = "schema_migracoes"
+TIPO_TEXTO = "NVARCHAR(100)"
+
+# Prefixo da tag (convencao do CLP) -> tipo SQL. 'd' (DINT) vira BIGINT
+# porque os totais do CLP estouram o INT do SQL Server.
+TIPOS_POR_PREFIXO = {
+    "b": "BIT",
+    "d": "BIGINT",
+    "i": "INT",
+    "r": "FLOAT",
+    "s": TIPO_TEXTO,
+}
+
+# Ordem de alargamento dos tipos numericos (so se altera para um tipo maior)
+ORDEM_NUMERICOS = ["bit", "tinyint", "smallint", "int", "bigint", "real", "float"]
+TIPOS_TEXTO = ("varchar", "nvarchar")
+
+# DataType OPC UA (ns=0, ua.ObjectIds) -> tipo SQL
+TIPOS_POR_DATATYPE_OPC = {
+    1: "BIT",  # Boolean
+    2: "SMALLINT",  # SByte
+    3: "SMALLINT",  # Byte
+    4: "SMALLINT",  # Int16
+    5: "INT",  # UInt16
+    6: "BIGINT",  # Int32 (DINT; mesmo tipo do prefixo 'd')
+    7: "BIGINT",  # UInt32
+    8: "BIGINT",  # Int64
+    9: "FLOAT",  # UInt64
+    10: "FLOAT",  # Float
+    11: "FLOAT",  # Double
+    12: TIPO_TEXTO,  # String
+    13: "DATETIME",  # DateTime
+}
+
+INTERVALO_ALARGAMENTO_SEGUNDOS = 30
+
+_PREFIXO = re.compile(r"^([a-z])[A-Z0-9_]")
+
+
+def inferir_tipo_sql(coluna):
+    """Tipo SQL pelo prefixo do nome (bER -> BIT, dStatus -> BIGINT, rInst -> FLOAT)."""
+    m = _PREFIXO.match(coluna)
+    if m:
+        return TIPOS_POR_PREFIXO.get(m.group(1), TIPO_TEXTO)
+    return TIPO_TEXTO
+
+
+def tipo_sql_do_datatype(data_type):
+    """Tipo SQL do DataType OPC (ua.NodeId), ou None se nao for um tipo basico."""
+    if data_type is None or getattr(data_type, 'NamespaceIndex', None) != 0:
+        return None
+    return TIPOS_POR_DATATYPE_OPC.get(data_type.Identifier)
+
+
+def colunas_esperadas(tags_por_linha, extras=()):
+    """
+    {coluna: tipo_sql} de todas as linhas do tags_config.csv, mais 'extras'
+    [(coluna, tipo_sql)] (ex: colunas _delta/_taxa dos contadores).
+    """
+    esperadas = {}
+    for tags in tags_por_linha.values():
+        for coluna in tags:
+            esperadas.setdefault(coluna, inferir_tipo_sql(coluna))
+    for coluna, tipo in extras:
+        esperadas[coluna] = tipo
+    return esperadas
+
+
+def _separar_tipo(tipo):
+    """'NVARCHAR(100)' -> ('nvarchar', 100); 'BIGINT' -> ('bigint', None)."""
+    nome, _, tamanho = tipo.lower().partition('(')
+    tamanho = tamanho.rstrip(')').strip()
+    if tamanho == 'max':
+        return nome.strip(), -1
+    return nome.strip(), int(tamanho) if tamanho else None
+
+
+def ler_colunas(conn, tabela):
+    """{coluna_minuscula: (coluna, tipo, tamanho)} da tabela, em uma consulta."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            "SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH "
+            "FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?",
+            tabela,
+        )
+        return {nome.lower(): (nome, tipo.lower(), tamanho) for nome, tipo, tamanho in cursor.fetchall()}
+    finally:
+        cursor.close()
+
+
+def precisa_alargar(atual, tamanho_atual, desejado):
+    """True se o tipo atual deve ser alterado para o desejado (nunca estreita)."""
+    tipo, tamanho = _separar_tipo(desejado)
+    if atual in ORDEM_NUMERICOS and tipo in ORDEM_NUMERICOS:
+        return ORDEM_NUMERICOS.index(tipo) > ORDEM_NUMERICOS.index(atual)
+    if atual in TIPOS_TEXTO and tipo in TIPOS_TEXTO:
+        if tamanho_atual == -1:
+            return False
+        return tamanho == -1 or (tamanho or 0) > (tamanho_atual or 0)
+    return False
+
+
+def _mesma_familia(atual, desejado):
+    tipo = _separar_tipo(desejado)[0]
+    return (atual in ORDEM_NUMERICOS and tipo in ORDEM_NUMERICOS) or (atual in TIPOS_TEXTO and tipo in TIPOS_TEXTO)
+
+
+def planejar_migracoes(tabela, existentes, esperadas):
+    """
+    Diferenca entre o esquema atual e o esperado.
+    Retorna [(coluna, comando_sql)] na ordem de aplicacao.
+    """
+    comandos = []
+    for coluna, tipo in sorted(esperadas.items()):
+        atual = existentes.get(coluna.lower())
+        if atual is None:
+            comandos.append((coluna, f"ALTER TABLE {tabela} ADD [{coluna}] {tipo} NULL"))
+            continue
+        nome, tipo_atual, tamanho_atual = atual
+        if precisa_alargar(tipo_atual, tamanho_atual, tipo):
+            comandos.append((nome, f"ALTER TABLE {tabela} ALTER COLUMN [{nome}] {tipo} NULL"))
+        elif not _mesma_familia(tipo_atual, tipo):
+            logger.warning(f"Coluna [{nome}] e {tipo_atual} (esperado {tipo}), mantida como esta")
+    return comandos
+
+
+def sql_criar_tabela_migracoes():
+    return f"""
+IF OBJECT_ID('{TABELA_MIGRACOES}', 'U') IS NULL
+CREATE TABLE {TABELA_MIGRACOES} (
+    [Id] INT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+    [DataHora] DATETIME NOT NULL DEFAULT GETDATE(),
+    [tabela] NVARCHAR(128) NOT NULL,
+    [coluna] NVARCHAR(128) NOT NULL,
+    [comando] NVARCHAR(400) NOT NULL,
+    [assinatura] CHAR(40) NOT NULL
+)"""
+
+
+def assinatura_esquema(identificacao, tabela, esperadas):
+    """Hash do esquema esperado (servidor/banco, tabela e colunas com tipo)."""
+    texto = "|".join([identificacao, tabela] + [f"{c}:{t}" for c, t in sorted(esperadas.items())])
+    return hashlib.sha1(texto.encode('utf-8')).hexdigest()
+
+
+def esquema_ja_aplicado(arquivo, assinatura):
+    """
+    Colunas da tabela gravadas na ultima reconciliacao, se ela tem a mesma
+    assinatura; senao None.
+    """
+    try:
+        with open(arquivo, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if dados.get('assinatura') != assinatura:
+        return None
+    return dados.get('colunas', [])
+
+
+def registrar_esquema_aplicado(arquivo, assinatura, colunas):
+    temporario = arquivo + ".tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({
+            'assinatura': assinatura,
+            'data': datetime.now().isoformat(timespec='seconds'),
+            'colunas': sorted(colunas),
+        }, f)
+    os.replace(temporario, arquivo)
+
+
+def reconciliar_esquema(conn, tabela, esperadas, assinatura):
+    """
+    Le o esquema uma vez e aplica as migracoes necessarias em uma transacao,
+    registrando cada comando em schema_migracoes.
+    Retorna (comandos aplicados, colunas da tabela ao final); propaga a
+    excecao (com rollback) se algum falhar, sem deixar o esquema pela metade.
+    """
+    existentes = ler_colunas(conn, tabela)
+    colunas = [nome for nome, _, _ in existentes.values()]
+    colunas.extend(c for c in esperadas if c.lower() not in existentes)
+    comandos = planejar_migracoes(tabela, existentes, esperadas)
+    if not comandos:
+        return 0, colunas
+
+    cursor = conn.cursor()
+    try:
+        lote = ";\n".join(["SET XACT_ABORT ON", sql_criar_tabela_migracoes()] + [c for _, c in comandos])
+        cursor.execute(lote)
+        cursor.executemany(
+            f"INSERT INTO {TABELA_MIGRACOES} ([tabela], [coluna], [comando], [assinatura]) VALUES (?, ?, ?, ?)",
+            [[tabela, coluna, comando, assinatura] for coluna, comando in comandos],
+        )
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        cursor.close()
+
+    for _, comando in comandos:
+        logger.info(f"Esquema: {comando}")
+    return len(comandos), colunas
+
+
+class EsquemaTabela:
+    """
+    Colunas da tabela em cache e colunas esperadas (tags configuradas) com
+    o tipo SQL de cada uma. Enquanto o esquema nao foi lido (SQL fora no
+    inicio), todas as colunas sao tratadas como conhecidas.
+    """
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+        self.aviso = threading.Event()  # Acorda o AlargadorEsquema
+        self._lock = threading.Lock()
+        self._colunas = None  # {coluna_minuscula}
+        self._esperadas = {}  # coluna -> tipo SQL
+        self._divisoes = {}  # (colunas do registro) -> (conhecidas, novas)
+
+    def carregado(self):
+        return self._colunas is not None
+
+    def atualizar(self, colunas):
+        """Define/acrescenta colunas existentes na tabela."""
+        with self._lock:
+            if self._colunas is None:
+                self._colunas = set()
+            self._colunas.update(c.lower() for c in colunas)
+            self._divisoes = {}
+
+    def esperar(self, tipos):
+        """Registra colunas {coluna: tipo_sql} que os registros podem trazer."""
+        with self._lock:
+            for coluna, tipo in tipos.items():
+                if tipo:
+                    self._esperadas[coluna] = tipo
+        if self.pendentes():
+            self.aviso.set()
+
+    def desconhecidas(self, colunas):
+        """Colunas que nao estao no cache (todas, se o esquema nao foi lido)."""
+        conhecidas = self._colunas
+        if conhecidas is None:
+            return list(colunas)
+        return [c for c in colunas if c.lower() not in conhecidas]
+
+    def pendentes(self):
+        """{coluna: tipo_sql} esperadas que ainda nao existem na tabela."""
+        with self._lock:
+            if self._colunas is None:
+                return {}
+            return {c: t for c, t in self._esperadas.items() if c.lower() not in self._colunas}
+
+    def _dividir(self, colunas):
+        divisoes = self._divisoes  # atualizar() troca o dicionario inteiro
+        divisao = divisoes.get(colunas)
+        if divisao is None:
+            novas = set(self.desconhecidas(colunas))
+            divisao = (
+                tuple(c for c in colunas if c not in novas),
+                tuple(c for c in colunas if c in novas),
+            )
+            divisoes[colunas] = divisao
+        return divisao
+
+    def separar(self, registros):
+        """
+        Divide [(linha, data_hora, valores_dict)] em (conhecidos, completos):
+        os conhecidos so tem colunas que existem na tabela; os completos sao
+        os registros originais que tem alguma coluna ainda sem DDL, para o
+        spool reenviar como MERGE na linha gravada com os conhecidos (e nao
+        como uma segunda linha com a mesma linha e DataHora).
+        """
+        if self._colunas is None:
+            return registros, []
+        conhecidos = []
+        completos = []
+        for linha, data_hora, valores in registros:
+            conhecidas, novas = self._dividir(tuple(valores.keys()))
+            if not novas:
+                conhecidos.append((linha, data_hora, valores))
+                continue
+            if conhecidas:
+                conhecidos.append((linha, data_hora, {c: valores[c] for c in conhecidas}))
+            completos.append((linha, data_hora, valores))
+        return conhecidos, completos
+
+
+class AlargadorEsquema(threading.Thread):
+    """
+    Thread que cria as colunas pendentes do EsquemaTabela (e le o esquema,
+    se ainda nao foi lido) sem parar a aquisicao. Tenta de novo a cada
+    'intervalo_segundos' enquanto houver pendencias.
+    """
+
+    def __init__(self, esquema, conectar, intervalo_segundos=INTERVALO_ALARGAMENTO_SEGUNDOS):
+        super().__init__(name="AlargadorEsquema", daemon=True)
+        self.esquema = esquema
+        self.conectar = conectar
+        self.intervalo = intervalo_segundos
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            self.esquema.aviso.wait(self.intervalo)
+            self.esquema.aviso.clear()
+            if self._parar.is_set():
+                break
+            try:
+                self.alargar()
+            except Exception as e:
+                logger.error(f"Erro ao alargar esquema: {e}")
+
+    def alargar(self):
+        """Aplica as colunas pendentes. Retorna o numero de comandos aplicados."""
+        if self.esquema.carregado() and not self.esquema.pendentes():
+            return 0
+        conn = self.conectar()
+        if conn is None:
+            return 0
+        try:
+            if not self.esquema.carregado():
+                self.esquema.atualizar(c for c, _, _ in ler_colunas(conn, self.esquema.tabela).values())
+            pendentes = self.esquema.pendentes()
+            if not pendentes:
+                return 0
+            logger.info(f"Esquema: criando colunas novas {sorted(pendentes)}")
+            assinatura = assinatura_esquema("", self.esquema.tabela, pendentes)
+            aplicados, colunas = reconciliar_esquema(conn, self.esquema.tabela, pendentes, assinatura)
+            self.esquema.atualizar(colunas)
+            return aplicados
+        finally:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def parar(self):
+        self._parar.set()
+        self.esquema.aviso.set()
@@ -0,0 +1,170 @@
+"""
+LACUNAS DE AMOSTRAGEM
+Ciclo sem amostra (sessao OPC caida, reconexao, horario pulado por atraso)
+fica registrado explicitamente na tabela <tabela>_lacunas: uma linha por
+linha de producao e classe de varredura com o primeiro e o ultimo horario
+perdido, quantos ciclos e o motivo. Assim um buraco em seed_loss e
+distinguivel de "coletor sem dado" sem comparar DataHora a DataHora.
+
+A deteccao custa uma comparacao por ciclo: a DataHora de cada amostra e
+comparada com a anterior da mesma classe.
+"""
+
+import logging
+import threading
+from datetime import timedelta
+
+logger = logging.getLogger('SeedLossMonitor')
+
+SUFIXO_LACUNAS = "_lacunas"
+INTERVALO_GRAVACAO_SEGUNDOS = 60
+MOTIVO_ATRASO = "ciclo atrasado"
+
+
+def sql_criar_tabela(tabela):
+    return f"""
+IF OBJECT_ID('{tabela}', 'U') IS NULL
+CREATE TABLE {tabela} (
+    [linha] NVARCHAR(10) NOT NULL,
+    [classe] NVARCHAR(64) NOT NULL,
+    [inicio] DATETIME NOT NULL,
+    [fim] DATETIME NOT NULL,
+    [ciclos] INT NOT NULL,
+    [motivo] NVARCHAR(200) NULL,
+    PRIMARY KEY ([linha], [classe], [inicio])
+)"""
+
+
+def sql_inserir(tabela):
+    """Insert que ignora a lacuna ja gravada (reenvio apos falha do SQL)."""
+    return f"""
+INSERT INTO {tabela} ([linha], [classe], [inicio], [fim], [ciclos], [motivo])
+SELECT ?, ?, ?, ?, ?, ?
+WHERE NOT EXISTS (SELECT 1 FROM {tabela} WHERE [linha] = ? AND [classe] = ? AND [inicio] = ?)
+"""
+
+
+class MarcadorLacunas:
+    """
+    amostra() e chamada a cada ciclo gravado; falha(motivo) quando a sessao
+    cai. As lacunas detectadas ficam pendentes ate o GravadorLacunas.
+    """
+
+    def __init__(self, tabela_base):
+        self.tabela = f"{tabela_base}{SUFIXO_LACUNAS}"
+        self.total = 0
+        self._ultima = {}  # classe -> (data_slot, intervalo) da ultima amostra
+        self._motivos = {}  # classe -> motivo da proxima lacuna
+        self._pendentes = []
+        self._lock = threading.Lock()
+
+    def falha(self, motivo):
+        """Motivo das lacunas que as classes ja amostradas vao ter."""
+        for classe in self._ultima:
+            self._motivos.setdefault(classe, str(motivo)[:200])
+
+    def amostra(self, classe, data_slot, intervalo, linhas):
+        """Amostra da classe gravada; 'linhas' e RegistroTags.linhas."""
+        anterior = self._ultima.get(classe)
+        self._ultima[classe] = (data_slot, intervalo)
+        motivo = self._motivos.pop(classe, None)
+        if anterior is None:
+            return
+        ultima, intervalo_anterior = anterior
+        intervalo = max(intervalo, intervalo_anterior)  # Intervalo alterado na recarga
+        perdidos = round((data_slot - ultima).total_seconds() / intervalo) - 1
+        if perdidos <= 0:
+            return
+        passo = timedelta(seconds=intervalo)
+        inicio = ultima + passo
+        fim = data_slot - passo
+        motivo = motivo or MOTIVO_ATRASO
+        self.total += perdidos
+        logger.warning(
+            f"Lacuna [{classe}]: {perdidos} ciclo(s) sem amostra de {inicio:%Y-%m-%d %H:%M:%S} "
+            f"a {fim:%Y-%m-%d %H:%M:%S} ({motivo})"
+        )
+        with self._lock:
+            for linha, _, _, _ in linhas:
+                self._pendentes.append((linha, classe, inicio, fim, perdidos, motivo))
+
+    def retirar_pendentes(self):
+        with self._lock:
+            pendentes, self._pendentes = self._pendentes, []
+        return pendentes
+
+    def devolver_pendentes(self, pendentes):
+        with self._lock:
+            self._pendentes = pendentes + self._pendentes
+
+
+def garantir_tabela_lacunas(conn, marcador):
+    """Cria a tabela de lacunas se nao existir. Retorna True se deu certo."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql_criar_tabela(marcador.tabela))
+        conn.commit()
+        return True
+    except Exception as e:
+        logger.error(f"Erro ao criar a tabela de lacunas: {e}")
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        return False
+    finally:
+        cursor.close()
+
+
+def gravar_lacunas(marcador, pool_sql):
+    """Grava as lacunas pendentes em uma transacao. Retorna o numero de linhas gravadas."""
+    pendentes = marcador.retirar_pendentes()
+    if not pendentes:
+        return 0
+
+    conn = pool_sql.obter()
+    if conn is None:
+        marcador.devolver_pendentes(pendentes)
+        return 0
+
+    try:
+        cursor = conn.cursor()
+        cursor.executemany(
+            sql_inserir(marcador.tabela),
+            [[linha, classe, inicio, fim, ciclos, motivo, linha, classe, inicio]
+             for linha, classe, inicio, fim, ciclos, motivo in pendentes]
+        )
+        conn.commit()
+        cursor.close()
+    except Exception as e:
+        logger.error(f"Erro ao gravar lacunas ({len(pendentes)} linhas): {e}")
+        marcador.devolver_pendentes(pendentes)
+        pool_sql.devolver(conn, com_erro=True)
+        return 0
+
+    pool_sql.devolver(conn)
+    return len(pendentes)
+
+
+class GravadorLacunas(threading.Thread):
+    """Thread que grava as lacunas pendentes a cada 'intervalo_segundos'."""
+
+    def __init__(self, marcador, pool_sql, intervalo_segundos=INTERVALO_GRAVACAO_SEGUNDOS):
+        super().__init__(name="GravadorLacunas", daemon=True)
+        self.marcador = marcador
+        self.pool_sql = pool_sql
+        self.intervalo = intervalo_segundos
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                gravar_lacunas(self.marcador, self.pool_sql)
+            except Exception as e:
+                logger.error(f"Erro no gravador de lacunas: {e}")
+
+    def parar(self):
+        """Encerra a thread e grava o que estiver pendente."""
+        self._parar.set()
+        self.join(self.intervalo)
+        gravar_lacunas(self.marcador, self.pool_sql)
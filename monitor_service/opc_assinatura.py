@@ -0,0 +1,194 @@
+"""
+AQUISICAO POR ASSINATURA (REPORT-BY-EXCEPTION) - OPC UA
+O servidor envia apenas as mudancas de valor (MonitoredItems) e o coletor
+mantem uma tabela com o ultimo valor de cada tag. O passo de insercao por
+linha le dessa tabela no lugar de fazer um Read a cada ciclo.
+
+Ao monitorar uma tag, um Read em lote preenche a tabela com o valor atual:
+o primeiro ciclo apos assinar (ou reconectar) nao depende da chegada das
+notificacoes iniciais e nao e gravado todo NULL.
+"""
+
+import logging
+import threading
+from opcua import ua
+from opc_leitura import ler_valores_em_lote, TAMANHO_LOTE_PADRAO
+
+logger = logging.getLogger('SeedLossMonitor')
+
+# Padroes (milissegundos / numero de amostras)
+INTERVALO_PUBLICACAO_MS = 1000
+INTERVALO_AMOSTRAGEM_MS = 500
+TAMANHO_FILA = 10
+
+
+def _normalizar_node_id(node_id):
+    """Aceita 'ns=..;s=..' ou ua.NodeId e retorna ua.NodeId."""
+    return ua.NodeId.from_string(node_id) if isinstance(node_id, str) else node_id
+
+
+class TabelaUltimosValores:
+    """Ultimo valor recebido de cada tag (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._valores = {}
+        self.notificacoes = 0
+
+    def atualizar(self, node_id, valor, status):
+        with self._lock:
+            self._valores[node_id] = (valor, status)
+            self.notificacoes += 1
+
+    def semear(self, node_ids, valores, status):
+        """Valor inicial (Read) das tags que ainda nao receberam notificacao."""
+        with self._lock:
+            for node_id, valor, st in zip(node_ids, valores, status):
+                self._valores.setdefault(_normalizar_node_id(node_id), (valor, st))
+
+    def ler(self, node_ids):
+        """
+        Retorna (valores, status) na mesma ordem de 'node_ids', no mesmo
+        formato de ler_valores_em_lote(). Tags sem nenhuma notificacao ainda
+        retornam BadWaitingForInitialData.
+        """
+        sem_dado = (None, ua.StatusCode(ua.StatusCodes.BadWaitingForInitialData))
+        with self._lock:
+            pares = [self._valores.get(_normalizar_node_id(n), sem_dado) for n in node_ids]
+        valores = [p[0] for p in pares]
+        status = [p[1] for p in pares]
+        return valores, status
+
+    def esquecer(self, node_ids):
+        """Remove as tags que deixaram de ser monitoradas."""
+        with self._lock:
+            for node_id in node_ids:
+                self._valores.pop(_normalizar_node_id(node_id), None)
+
+
+class HandlerAssinatura:
+    """Recebe as notificacoes do servidor e grava na tabela de ultimos valores."""
+
+    def __init__(self, tabela):
+        self.tabela = tabela
+
+    def datachange_notification(self, node, val, data):
+        dv = data.monitored_item.Value
+        if dv.StatusCode.is_good():
+            self.tabela.atualizar(node.nodeid, val, dv.StatusCode)
+        else:
+            self.tabela.atualizar(node.nodeid, None, dv.StatusCode)
+
+    def status_change_notification(self, status):
+        logger.warning(f"Assinatura OPC mudou de status: {status}")
+
+
+class AssinaturaTags:
+    """
+    Assinatura OPC com o MonitoredItem de cada tag, para acrescentar ou
+    remover tags (recarga do tags_config.csv) sem recriar a assinatura.
+    """
+
+    def __init__(self, sub, tabela, intervalo_amostragem_ms=INTERVALO_AMOSTRAGEM_MS, tamanho_fila=TAMANHO_FILA,
+                 client=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        self.sub = sub
+        self.tabela = tabela
+        self.client = client  # Read do valor inicial (None: so notificacoes)
+        self.tamanho_lote = tamanho_lote
+        self.intervalo_amostragem_ms = intervalo_amostragem_ms
+        self.tamanho_fila = tamanho_fila
+        self.handles = {}  # ua.NodeId -> MonitoredItemId no servidor
+        self._ultimo_client_handle = 0  # ClientHandle precisa ser unico na assinatura
+
+    def monitorar(self, node_ids):
+        """Cria um MonitoredItem por tag ainda nao monitorada. Retorna o numero de falhas."""
+        node_ids = [n for n in (_normalizar_node_id(n) for n in node_ids) if n not in self.handles]
+        if not node_ids:
+            return 0
+
+        itens = []
+        for node_id in node_ids:
+            rv = ua.ReadValueId()
+            rv.NodeId = node_id
+            rv.AttributeId = ua.AttributeIds.Value
+
+            self._ultimo_client_handle += 1
+            mparams = ua.MonitoringParameters()
+            mparams.ClientHandle = self._ultimo_client_handle
+            mparams.SamplingInterval = self.intervalo_amostragem_ms
+            mparams.QueueSize = self.tamanho_fila
+            mparams.DiscardOldest = True
+
+            mir = ua.MonitoredItemCreateRequest()
+            mir.ItemToMonitor = rv
+            mir.MonitoringMode = ua.MonitoringMode.Reporting
+            mir.RequestedParameters = mparams
+            itens.append(mir)
+
+        resultados = self.sub.create_monitored_items(itens)
+
+        falhas = 0
+        for node_id, resultado in zip(node_ids, resultados):
+            if isinstance(resultado, ua.StatusCode):
+                falhas += 1
+                self.tabela.atualizar(node_id, None, resultado)
+                if falhas <= 3:
+                    logger.warning(f"Falha ao monitorar {node_id.to_string()}: {resultado.name}")
+            else:
+                self.handles[node_id] = resultado
+        self._semear([n for n in node_ids if n in self.handles])
+        return falhas
+
+    def _semear(self, node_ids):
+        """Read em lote das tags recem monitoradas, depois de criar os itens (nada se perde entre os dois)."""
+        if self.client is None or not node_ids:
+            return
+        try:
+            valores, status = ler_valores_em_lote(self.client, node_ids, self.tamanho_lote)
+        except Exception as e:
+            logger.warning(f"Leitura inicial de {len(node_ids)} tag(s) falhou, aguardando as notificacoes: {e}")
+            return
+        self.tabela.semear(node_ids, valores, status)
+
+    def desmonitorar(self, node_ids):
+        """Remove os MonitoredItems das tags e seus ultimos valores."""
+        node_ids = [_normalizar_node_id(n) for n in node_ids]
+        handles = [self.handles.pop(n) for n in node_ids if n in self.handles]
+        if handles:
+            try:
+                self.sub.unsubscribe(handles)
+            except Exception as e:
+                logger.warning(f"Falha ao remover {len(handles)} item(ns) monitorado(s): {e}")
+        self.tabela.esquecer(node_ids)
+
+    def delete(self):
+        self.sub.delete()
+
+
+def iniciar_assinatura(client, node_ids, tabela,
+                       intervalo_publicacao_ms=INTERVALO_PUBLICACAO_MS,
+                       intervalo_amostragem_ms=INTERVALO_AMOSTRAGEM_MS,
+                       tamanho_fila=TAMANHO_FILA,
+                       tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Cria a assinatura e um MonitoredItem por tag; a tabela ja sai preenchida
+    com um Read em lote das tags monitoradas.
+    Retorna o AssinaturaTags (usar delete() para encerrar).
+    """
+    params = ua.CreateSubscriptionParameters()
+    params.RequestedPublishingInterval = intervalo_publicacao_ms
+    params.RequestedLifetimeCount = 10000
+    params.RequestedMaxKeepAliveCount = 3000
+    params.MaxNotificationsPerPublish = 0  # Sem limite
+    params.PublishingEnabled = True
+    params.Priority = 0
+
+    sub = client.create_subscription(params, HandlerAssinatura(tabela))
+    assinatura = AssinaturaTags(sub, tabela, intervalo_amostragem_ms, tamanho_fila, client, tamanho_lote)
+    falhas = assinatura.monitorar(node_ids)
+
+    logger.info(
+        f"Assinatura OPC criada: {len(node_ids) - falhas}/{len(node_ids)} tags monitoradas "
+        f"(publicacao {intervalo_publicacao_ms} ms, amostragem {intervalo_amostragem_ms} ms, fila {tamanho_fila})"
+    )
+    return assinatura
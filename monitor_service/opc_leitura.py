@@ -0,0 +1,281 @@
+"""
+LEITURA EM LOTE - OPC UA
+Le todas as tags de todas as linhas com um (ou poucos) Read por ciclo,
+em vez de um get_value() por tag.
+"""
+
+import logging
+from opcua import ua
+from conversores import converter_generico, conversor_do_datatype
+
+logger = logging.getLogger('SeedLossMonitor')
+
+# Usado quando o servidor nao informa MaxNodesPerRead (0 = sem limite)
+TAMANHO_LOTE_PADRAO = 500
+
+# Status do Read de DataType que indicam tag inexistente no servidor (nao erro transitorio)
+STATUS_TAG_INVALIDA = {
+    ua.StatusCodes.BadNodeIdUnknown,
+    ua.StatusCodes.BadNodeIdInvalid,
+    ua.StatusCodes.BadAttributeIdInvalid,
+}
+
+# Status devolvido por ler() para as tags em quarentena (nao lidas no ciclo)
+STATUS_QUARENTENA = ua.StatusCode(ua.StatusCodes.BadResourceUnavailable)
+
+
+def obter_max_nodes_por_leitura(client, padrao=TAMANHO_LOTE_PADRAO):
+    """Le o limite MaxNodesPerRead do servidor e retorna o tamanho de lote a usar."""
+    try:
+        node = client.get_node(
+            ua.NodeId(ua.ObjectIds.Server_ServerCapabilities_OperationLimits_MaxNodesPerRead)
+        )
+        limite = node.get_value()
+        if limite and limite > 0:
+            return min(int(limite), padrao)
+    except Exception:
+        pass
+    return padrao
+
+
+def montar_read_value_id(node_id, atributo=ua.AttributeIds.Value):
+    """Monta o ReadValueId de um NodeId (string 'ns=..;s=..' ou ua.NodeId)."""
+    rv = ua.ReadValueId()
+    rv.NodeId = ua.NodeId.from_string(node_id) if isinstance(node_id, str) else node_id
+    rv.AttributeId = atributo
+    return rv
+
+
+def montar_lotes(node_ids, tamanho_lote=TAMANHO_LOTE_PADRAO, atributo=ua.AttributeIds.Value):
+    """Divide os nos em ReadParameters prontos de ate 'tamanho_lote' itens."""
+    lotes = []
+    tamanho_lote = max(1, int(tamanho_lote))
+    for inicio in range(0, len(node_ids), tamanho_lote):
+        params = ua.ReadParameters()
+        params.MaxAge = 0
+        params.TimestampsToReturn = ua.TimestampsToReturn.Neither
+        params.NodesToRead = [montar_read_value_id(n, atributo) for n in node_ids[inicio:inicio + tamanho_lote]]
+        lotes.append(params)
+    return lotes
+
+
+def ler_lotes(client, lotes):
+    """Executa um Read por lote e retorna (valores, status) na ordem dos lotes."""
+    valores = []
+    status = []
+
+    for params in lotes:
+        resultados = client.uaclient.read(params)
+
+        for dv in resultados:
+            status.append(dv.StatusCode)
+            if dv.StatusCode.is_good() and dv.Value is not None:
+                valores.append(dv.Value.Value)
+            else:
+                valores.append(None)
+
+    return valores, status
+
+
+def ler_valores_em_lote(client, node_ids, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Le varios nos usando o servico Read do OPC UA, em lotes de 'tamanho_lote'.
+
+    Retorna duas listas na mesma ordem de 'node_ids':
+        valores -> valor lido (None quando o status nao e Good)
+        status  -> ua.StatusCode de cada tag
+    """
+    return ler_lotes(client, montar_lotes(node_ids, tamanho_lote))
+
+
+def registrar_nos(client, node_ids, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """RegisterNodes em lotes. Retorna {original: registrado} ({} se nao suportado)."""
+    registrados = []
+    tamanho_lote = max(1, int(tamanho_lote))
+    try:
+        for inicio in range(0, len(node_ids), tamanho_lote):
+            registrados.extend(client.uaclient.register_nodes(node_ids[inicio:inicio + tamanho_lote]))
+    except Exception as e:
+        logger.warning(f"RegisterNodes nao suportado, usando NodeIds originais: {e}")
+        return {}
+    if len(registrados) != len(node_ids):
+        return {}
+    return dict(zip(node_ids, registrados))
+
+
+class RegistroTags:
+    """
+    Registro compilado das tags, montado uma vez apos carregar_tags_do_csv().
+
+    Todas as tags de todas as linhas ficam em uma lista unica (node_ids), com
+    a ordem das colunas fixa por linha. Cada linha guarda apenas a fatia
+    [inicio, fim) que ocupa nessa lista, entao o ciclo nao monta strings
+    nem dicionarios de NodeId.
+
+    compilar() deve ser chamado a cada (re)conexao: ele registra os nos na
+    sessao (RegisterNodes, quando o servidor suporta) e monta os lotes de
+    Read ja prontos. atualizar() troca o conjunto de tags na sessao atual
+    (recarga do tags_config.csv) registrando/liberando so a diferenca.
+
+    O DataType de cada tag e lido na compilacao (e na atualizacao, so das
+    tags novas); conversores[i] e o conversor do valor de node_ids[i].
+
+    Esse mesmo Read e a verificacao previa das tags: as que o servidor
+    responde como inexistentes vao para 'invalidas' e saem de node_ids e
+    das colunas da linha, entao nao custam nada no ciclo (a coluna fica
+    NULL na tabela). A verificacao e refeita a cada compilar(), ou seja,
+    a cada reconexao.
+
+    definir_quarentena() tira tags que falham seguidamente dos lotes do
+    ciclo sem mudar as colunas: ler() devolve None/STATUS_QUARENTENA nas
+    posicoes delas (indices em fora_do_ciclo).
+    """
+
+    def __init__(self, tags_por_linha, namespace_index):
+        self.namespace_index = namespace_index
+        self.lotes = []  # ua.ReadParameters prontos para a sessao atual
+        self.versao = 0  # Muda a cada troca de tags (leitores com lotes proprios recompilam)
+        self._sessao = {}  # NodeId original -> NodeId registrado na sessao
+        self._tipos = {}  # NodeId -> ua.NodeId do DataType
+        self._conversores = {}  # NodeId -> conversor do valor
+        self._invalidos = {}  # NodeId -> StatusCode da verificacao
+        self._quarentena = frozenset()  # NodeIds fora dos lotes do ciclo
+        self.tamanho_lote = TAMANHO_LOTE_PADRAO
+        self._montar(tags_por_linha)
+
+    def _montar(self, tags_por_linha):
+        self.versao += 1
+        self.tags_por_linha = tags_por_linha
+        self.linhas = []  # [(linha, colunas, inicio, fim)]
+        self.node_ids = []  # ua.NodeId na ordem fixa
+        self.invalidas = []  # [(linha, coluna, tag_path, status)] fora do ciclo
+        for linha, tags in tags_por_linha.items():
+            inicio = len(self.node_ids)
+            colunas = []
+            for coluna, tag_path in tags.items():
+                node_id = ua.NodeId(tag_path, self.namespace_index)
+                status = self._invalidos.get(node_id)
+                if status is not None:
+                    self.invalidas.append((linha, coluna, tag_path, status))
+                    continue
+                colunas.append(coluna)
+                self.node_ids.append(node_id)
+            self.linhas.append((linha, tuple(colunas), inicio, len(self.node_ids)))
+        self.conversores = [self._conversores.get(n, converter_generico) for n in self.node_ids]
+        self.fora_do_ciclo = [i for i, n in enumerate(self.node_ids) if n in self._quarentena]
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    def _carregar_tipos(self, client, node_ids, tamanho_lote):
+        """
+        Le o DataType dos nos (um Read por lote) e escolhe o conversor de cada
+        um. Retorna quantos nos o servidor respondeu como inexistentes.
+        """
+        if not node_ids:
+            return 0
+        try:
+            tipos, status = ler_lotes(client, montar_lotes(node_ids, tamanho_lote, ua.AttributeIds.DataType))
+        except Exception as e:
+            logger.warning(f"Nao foi possivel ler o DataType das tags, conversao generica: {e}")
+            return 0
+        invalidos = 0
+        for node_id, data_type, st in zip(node_ids, tipos, status):
+            if st.value in STATUS_TAG_INVALIDA:
+                self._invalidos[node_id] = st
+                invalidos += 1
+                continue
+            self._tipos[node_id] = data_type
+            self._conversores[node_id] = conversor_do_datatype(data_type)
+        self.conversores = [self._conversores.get(n, converter_generico) for n in self.node_ids]
+        return invalidos
+
+    def compilar(self, client, tamanho_lote=TAMANHO_LOTE_PADRAO, registrar=True):
+        """Verifica as tags e prepara os lotes de Read (e os conversores) para a sessao atual."""
+        if self._invalidos:
+            self._invalidos = {}
+            self._montar(self.tags_por_linha)
+        if self._carregar_tipos(client, self.node_ids, tamanho_lote):
+            self._montar(self.tags_por_linha)
+        self._sessao = registrar_nos(client, self.node_ids, tamanho_lote) if registrar else {}
+        self._montar_lotes(tamanho_lote)
+        logger.info(
+            f"Registro de tags compilado: {len(self)} tags em {len(self.lotes)} lote(s)"
+            + (f", {len(self.invalidas)} invalida(s) fora do ciclo" if self.invalidas else "")
+        )
+
+    def atualizar(self, client, tags_por_linha, tamanho_lote=TAMANHO_LOTE_PADRAO, registrar=True):
+        """
+        Troca as tags mantendo a sessao: so as tags novas sao registradas e
+        so as removidas sao liberadas (UnregisterNodes); as demais mantem o
+        handle atual. Retorna (node_ids adicionados, node_ids removidos).
+        """
+        antigos = set(self.node_ids)
+        # Invalida que saiu do CSV e volta depois e verificada de novo
+        for linha, coluna, tag_path, _ in self.invalidas:
+            if tags_por_linha.get(linha, {}).get(coluna) != tag_path:
+                self._invalidos.pop(ua.NodeId(tag_path, self.namespace_index), None)
+        self._montar(tags_por_linha)
+        # Tags novas passam pela verificacao antes de entrar no ciclo
+        if self._carregar_tipos(client, [n for n in self.node_ids if n not in antigos], tamanho_lote):
+            self._montar(tags_por_linha)
+        atuais = set(self.node_ids)
+        adicionados = [n for n in self.node_ids if n not in antigos]
+        removidos = [n for n in antigos if n not in atuais]
+
+        for node_id in removidos:
+            self._tipos.pop(node_id, None)
+            self._conversores.pop(node_id, None)
+
+        liberar = [self._sessao.pop(n) for n in removidos if n in self._sessao]
+        if liberar:
+            try:
+                client.uaclient.unregister_nodes(liberar)
+            except Exception as e:
+                logger.warning(f"UnregisterNodes falhou ({len(liberar)} tags): {e}")
+        if adicionados and registrar and (self._sessao or not antigos):
+            self._sessao.update(registrar_nos(client, adicionados, tamanho_lote))
+
+        self._montar_lotes(tamanho_lote)
+        return adicionados, removidos
+
+    def _montar_lotes(self, tamanho_lote):
+        self.tamanho_lote = tamanho_lote
+        self.lotes = montar_lotes(
+            [self._sessao.get(n, n) for n in self.node_ids if n not in self._quarentena], tamanho_lote
+        )
+
+    def definir_quarentena(self, node_ids):
+        """Troca o conjunto de tags em quarentena (fora dos lotes do ciclo)."""
+        self._quarentena = frozenset(node_ids)
+        self.versao += 1
+        self.fora_do_ciclo = [i for i, n in enumerate(self.node_ids) if n in self._quarentena]
+        self._montar_lotes(self.tamanho_lote)
+
+    def ler(self, client):
+        """Le todas as tags do registro (um Read por lote)."""
+        valores, status = ler_lotes(client, self.lotes)
+        # Poucas tags em quarentena: insercao na ordem crescente dos indices
+        for i in self.fora_do_ciclo:
+            valores.insert(i, None)
+            status.insert(i, STATUS_QUARENTENA)
+        return valores, status
+
+    def ler_tipos_dados(self, client, colunas=None, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        """
+        Le o atributo DataType das tags (um Read por lote; usa os ja lidos na
+        compilacao quando houver).
+        Retorna {coluna: ua.NodeId do DataType}; com 'colunas', so dessas colunas.
+        """
+        posicoes = {}
+        for _, colunas_linha, inicio, _ in self.linhas:
+            for i, coluna in enumerate(colunas_linha):
+                if (colunas is None or coluna in colunas) and coluna not in posicoes:
+                    posicoes[coluna] = inicio + i
+        if not posicoes:
+            return {}
+        node_ids = [self.node_ids[i] for i in posicoes.values()]
+        if all(n in self._tipos for n in node_ids):
+            return {coluna: self._tipos[n] for coluna, n in zip(posicoes.keys(), node_ids)}
+        tipos, _ = ler_lotes(client, montar_lotes(node_ids, tamanho_lote, ua.AttributeIds.DataType))
+        return dict(zip(posicoes.keys(), tipos))
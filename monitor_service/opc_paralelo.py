@@ -0,0 +1,149 @@
+"""
+LEITURA PARALELA - VARIAS SESSOES OPC UA
+As linhas do registro sao divididas em fatias, e cada fatia e lida por uma
+sessao OPC propria, em uma thread propria. Um CLP lento atras do KEPServer
+atrasa so a sua fatia: o ciclo leva o tempo da fatia mais lenta, e nao a
+soma de todas. O resultado e remontado na ordem do registro, entao o ciclo
+monta o instantaneo (uma DataHora) como na leitura em uma sessao.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from opcua import Client, ua
+from opc_leitura import montar_lotes, ler_lotes, registrar_nos, TAMANHO_LOTE_PADRAO, STATUS_QUARENTENA
+
+logger = logging.getLogger('SeedLossMonitor')
+
+STATUS_SEM_SESSAO = ua.StatusCode(ua.StatusCodes.BadNotConnected)
+
+
+def dividir_em_fatias(linhas, fatias, tamanho_lote=TAMANHO_LOTE_PADRAO):
+    """
+    Divide as linhas [(linha, colunas, inicio, fim)] em ate 'fatias' listas de
+    indices do registro. Linhas de ate um lote ficam inteiras em uma fatia
+    (tags do mesmo CLP na mesma sessao); as maiores sao partidas em blocos de
+    'tamanho_lote'. Cada bloco vai para a fatia com menos tags, do maior para
+    o menor (resultado deterministico).
+    """
+    tamanho_lote = max(1, int(tamanho_lote))
+    blocos = []
+    for _, _, inicio, fim in linhas:
+        for bloco in range(inicio, fim, tamanho_lote):
+            blocos.append(range(bloco, min(bloco + tamanho_lote, fim)))
+    blocos.sort(key=lambda b: (-len(b), b.start))
+
+    divisao = [[] for _ in range(max(1, min(int(fatias), len(blocos))))]
+    for bloco in blocos:
+        min(divisao, key=len).extend(bloco)
+    return [sorted(indices) for indices in divisao if indices]
+
+
+class SessaoLeitura:
+    """Uma sessao OPC de leitura e os lotes ja montados para ela, por registro."""
+
+    def __init__(self, url, numero):
+        self.url = url
+        self.numero = numero
+        self.client = None
+        self._lotes = {}  # (id(registro), fatia) -> (versao, indices, lotes, nos registrados)
+
+    def conectar(self):
+        self.client = Client(self.url)
+        self.client.connect()
+        self._lotes = {}
+
+    def desconectar(self):
+        client, self.client = self.client, None
+        self._lotes = {}
+        if client is not None:
+            try:
+                client.disconnect()
+            except Exception:
+                pass
+
+    def ler(self, registro, fatia, indices, tamanho_lote):
+        """Le os indices da fatia; reconecta a sessao se ela caiu."""
+        if self.client is None:
+            self.conectar()
+            logger.info(f"Sessao OPC de leitura {self.numero} reconectada")
+        chave = (id(registro), fatia)
+        item = self._lotes.get(chave)
+        if item is None or item[0] != registro.versao or item[1] is not indices:
+            if item is not None and item[3]:
+                try:
+                    self.client.uaclient.unregister_nodes(item[3])
+                except Exception:
+                    pass
+            node_ids = [registro.node_ids[i] for i in indices]
+            registrados = registrar_nos(self.client, node_ids, tamanho_lote)
+            lotes = montar_lotes([registrados.get(n, n) for n in node_ids], tamanho_lote)
+            item = (registro.versao, indices, lotes, list(registrados.values()))
+            self._lotes[chave] = item
+        return ler_lotes(self.client, item[2])
+
+
+class LeitorParalelo:
+    """
+    ler(registro) tem o mesmo retorno de RegistroTags.ler(client): (valores,
+    status) na ordem de registro.node_ids. Uma sessao que falha marca as
+    tags da sua fatia como BadNotConnected e e reconectada no ciclo seguinte,
+    sem derrubar as demais.
+    """
+
+    def __init__(self, url, sessoes, tamanho_lote=TAMANHO_LOTE_PADRAO):
+        self.sessoes = [SessaoLeitura(url, i + 1) for i in range(max(1, int(sessoes)))]
+        self.tamanho_lote = tamanho_lote
+        self._fatias = {}  # id(registro) -> (versao, [indices por fatia])
+        self._executor = ThreadPoolExecutor(max_workers=len(self.sessoes), thread_name_prefix="LeituraOPC")
+
+    def conectar(self, tamanho_lote=None):
+        if tamanho_lote:
+            self.tamanho_lote = tamanho_lote
+        self._fatias = {}
+        for sessao in self.sessoes:
+            sessao.conectar()
+        logger.info(f"Leitura paralela: {len(self.sessoes)} sessoes OPC")
+
+    def desconectar(self):
+        for sessao in self.sessoes:
+            sessao.desconectar()
+
+    def fatias(self, registro):
+        item = self._fatias.get(id(registro))
+        if item is None or item[0] != registro.versao:
+            fatias = dividir_em_fatias(registro.linhas, len(self.sessoes), self.tamanho_lote)
+            if registro.fora_do_ciclo:
+                fora = set(registro.fora_do_ciclo)
+                fatias = [[i for i in indices if i not in fora] for indices in fatias]
+            item = (registro.versao, fatias)
+            self._fatias[id(registro)] = item
+        return item[1]
+
+    def _ler_fatia(self, sessao, registro, fatia, indices):
+        try:
+            return sessao.ler(registro, fatia, indices, self.tamanho_lote)
+        except Exception as e:
+            logger.warning(f"Sessao OPC de leitura {sessao.numero} falhou ({len(indices)} tags): {e}")
+            sessao.desconectar()
+            return [None] * len(indices), [STATUS_SEM_SESSAO] * len(indices)
+
+    def ler(self, registro):
+        fatias = self.fatias(registro)
+        futuros = [
+            self._executor.submit(self._ler_fatia, sessao, registro, fatia, indices)
+            for fatia, (sessao, indices) in enumerate(zip(self.sessoes, fatias))
+        ]
+        valores = [None] * len(registro)
+        status = [STATUS_SEM_SESSAO] * len(registro)
+        for i in registro.fora_do_ciclo:
+            status[i] = STATUS_QUARENTENA
+        for indices, futuro in zip(fatias, futuros):
+            valores_fatia, status_fatia = futuro.result()
+            for i, valor, st in zip(indices, valores_fatia, status_fatia):
+                valores[i] = valor
+                status[i] = st
+        return valores, status
+
+    def fechar(self):
+        self.desconectar()
+        self._executor.shutdown(wait=True)
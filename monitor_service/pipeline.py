@@ -0,0 +1,170 @@
+"""
+PIPELINE AQUISICAO -> PERSISTENCIA
+A aquisicao (leitura OPC) produz um instantaneo por ciclo em uma fila
+limitada; uma thread de persistencia consome a fila e grava no SQL/spool.
+Assim um SQL lento, o spool ou a limpeza periodica nao atrasam a proxima
+amostra.
+
+Cada instantaneo e a lista de registros (linha, data_hora, valores_dict)
+de um ciclo.
+"""
+
+import logging
+import threading
+from collections import deque
+from vigia_estagios import ESTAGIOS, PERSISTENCIA, MANUTENCAO
+
+logger = logging.getLogger('SeedLossMonitor')
+
+TAMANHO_FILA_PADRAO = 600  # Instantaneos em memoria (600 ciclos = 10 h a 60 s)
+REGISTROS_POR_GRAVACAO = 1000  # Maximo de registros por chamada de gravar (um prazo do vigia)
+
+# Politicas quando a fila esta cheia
+TRANSBORDO_SPOOL = "spool"  # O instantaneo mais antigo vai direto para o spool local
+TRANSBORDO_DESCARTAR_ANTIGO = "descartar_antigo"  # Descarta o mais antigo
+TRANSBORDO_DESCARTAR_NOVO = "descartar_novo"  # Descarta o que acabou de chegar
+POLITICAS_TRANSBORDO = (TRANSBORDO_SPOOL, TRANSBORDO_DESCARTAR_ANTIGO, TRANSBORDO_DESCARTAR_NOVO)
+
+
+class FilaInstantaneos:
+    """
+    Fila limitada entre aquisicao e persistencia.
+
+    colocar() nunca bloqueia: com a fila cheia aplica a politica de
+    transbordo. Na politica "spool", 'ao_transbordar(instantaneo)' recebe o
+    instantaneo retirado da fila (ex: spool.gravar).
+    """
+
+    def __init__(self, tamanho=TAMANHO_FILA_PADRAO, politica=TRANSBORDO_SPOOL, ao_transbordar=None):
+        if politica not in POLITICAS_TRANSBORDO:
+            logger.warning(f"Politica de transbordo desconhecida '{politica}', usando '{TRANSBORDO_SPOOL}'")
+            politica = TRANSBORDO_SPOOL
+        if politica == TRANSBORDO_SPOOL and ao_transbordar is None:
+            politica = TRANSBORDO_DESCARTAR_ANTIGO
+        self.tamanho = max(1, int(tamanho))
+        self.politica = politica
+        self._ao_transbordar = ao_transbordar
+        self._itens = deque()
+        self._cond = threading.Condition()
+
+        # Contadores para log/diagnostico
+        self.transbordos = 0
+        self.maior_ocupacao = 0
+
+    def colocar(self, instantaneo):
+        retirado = None
+        with self._cond:
+            if len(self._itens) >= self.tamanho:
+                self.transbordos += 1
+                if self.politica == TRANSBORDO_DESCARTAR_NOVO:
+                    retirado, instantaneo = instantaneo, None
+                else:
+                    retirado = self._itens.popleft()
+            if instantaneo is not None:
+                self._itens.append(instantaneo)
+                self.maior_ocupacao = max(self.maior_ocupacao, len(self._itens))
+                self._cond.notify()
+
+        if retirado is None:
+            return
+        if self.politica == TRANSBORDO_SPOOL:
+            try:
+                self._ao_transbordar(retirado)
+            except Exception as e:
+                logger.error(f"Fila cheia: erro ao desviar instantaneo para o spool: {e}")
+        elif self.transbordos == 1 or self.transbordos % 100 == 0:
+            logger.error(f"Fila de instantaneos cheia ({self.tamanho}): {self.transbordos} instantaneo(s) descartados")
+
+    def retirar(self, maximo, espera=None):
+        """
+        Aguarda ate 'espera' segundos por pelo menos um instantaneo e retorna
+        ate 'maximo' deles, do mais antigo ao mais novo (lista vazia se nada chegou).
+        """
+        with self._cond:
+            if not self._itens:
+                self._cond.wait(espera)
+            n = min(maximo, len(self._itens))
+            return [self._itens.popleft() for _ in range(n)]
+
+    def acordar(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def __len__(self):
+        with self._cond:
+            return len(self._itens)
+
+
+class EstagioPersistencia(threading.Thread):
+    """
+    Consome a fila e chama 'gravar(registros)' a cada 'ciclos_por_lote'
+    instantaneos (ex: gravar_pendentes do script). 'manutencao()' roda a cada
+    'ciclos_manutencao' instantaneos consumidos, fora da thread de aquisicao.
+
+    Com ciclos_por_lote grande, 'gravar' e chamada em partes de ate
+    'registros_por_gravacao' registros: o prazo do vigia de estagios vale
+    para cada ida ao SQL, nao para o lote inteiro.
+
+    parar() grava o que restar na fila antes de encerrar a thread.
+    """
+
+    def __init__(self, fila, gravar, ciclos_por_lote=1, manutencao=None, ciclos_manutencao=60,
+                 registros_por_gravacao=REGISTROS_POR_GRAVACAO):
+        super().__init__(name="EstagioPersistencia", daemon=True)
+        self.fila = fila
+        self.gravar = gravar
+        self.ciclos_por_lote = max(1, int(ciclos_por_lote))
+        self.manutencao = manutencao
+        self.ciclos_manutencao = max(1, int(ciclos_manutencao))
+        self.registros_por_gravacao = max(1, int(registros_por_gravacao))
+        self._parar = threading.Event()
+        self._consumidos = 0
+
+    def run(self):
+        pendentes = []
+        ciclos_pendentes = 0
+        while True:
+            parando = self._parar.is_set()
+            lote = self.fila.retirar(self.ciclos_por_lote - ciclos_pendentes, 0 if parando else 1.0)
+            for instantaneo in lote:
+                pendentes.extend(instantaneo)
+            ciclos_pendentes += len(lote)
+
+            # Parando: grava o que sobrou mesmo sem completar o lote
+            if ciclos_pendentes >= self.ciclos_por_lote or (parando and not lote):
+                self._gravar(pendentes)
+                pendentes = []
+                ciclos_pendentes = 0
+
+            self._manutencao(len(lote))
+
+            if parando and not lote:
+                return
+
+    def _gravar(self, registros):
+        for i in range(0, len(registros), self.registros_por_gravacao):
+            try:
+                with ESTAGIOS.estagio(PERSISTENCIA):
+                    self.gravar(registros[i:i + self.registros_por_gravacao])
+            except Exception as e:
+                logger.error(f"Erro no estagio de persistencia: {e}")
+
+    def _manutencao(self, consumidos):
+        if self.manutencao is None or not consumidos:
+            return
+        antes = self._consumidos // self.ciclos_manutencao
+        self._consumidos += consumidos
+        if self._consumidos // self.ciclos_manutencao > antes:
+            try:
+                with ESTAGIOS.estagio(MANUTENCAO):
+                    self.manutencao()
+            except Exception as e:
+                logger.warning(f"Erro na manutencao periodica: {e}")
+
+    def parar(self, espera=60):
+        """Sinaliza o fim, aguarda a fila esvaziar (ate 'espera' segundos)."""
+        self._parar.set()
+        self.fila.acordar()
+        self.join(espera)
+        if self.is_alive():
+            logger.error(f"Persistencia nao terminou em {espera}s ({len(self.fila)} instantaneo(s) na fila)")
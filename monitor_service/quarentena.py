@@ -0,0 +1,194 @@
+"""
+QUARENTENA DE TAGS COM FALHA
+Uma tag que falha em varios ciclos seguidos (CLP parado, tag sem
+comunicacao) sai dos lotes de Read do ciclo: o Read das tags boas nao
+espera mais o timeout do CLP quebrado e o log nao repete o mesmo aviso a
+cada ciclo. A coluna continua no registro (valor NULL).
+
+As tags em quarentena sao lidas de novo por uma thread propria
+(RevisaoQuarentena), fora do ciclo, com espera dobrando a cada tentativa
+(30 s, 60 s, 120 s... ate o maximo). Quando a leitura volta a ser Good a
+tag volta para o ciclo no fim do ciclo seguinte da sua classe.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime
+from opcua import ua
+from opc_leitura import ler_valores_em_lote
+
+logger = logging.getLogger('SeedLossMonitor')
+
+FALHAS_PARA_QUARENTENA = 5  # Ciclos seguidos com erro (0 = desativada)
+ESPERA_INICIAL_SEGUNDOS = 30
+ESPERA_MAXIMA_SEGUNDOS = 1800
+
+# Falhas da sessao (nao da tag): nao contam para a quarentena
+STATUS_SESSAO = {
+    ua.StatusCodes.BadNotConnected,
+    ua.StatusCodes.BadConnectionClosed,
+    ua.StatusCodes.BadServerNotConnected,
+    ua.StatusCodes.BadSessionClosed,
+    ua.StatusCodes.BadSessionIdInvalid,
+    ua.StatusCodes.BadSecureChannelClosed,
+}
+
+
+class TagEmQuarentena:
+    """Estado de uma tag em quarentena."""
+
+    def __init__(self, status, espera):
+        self.status = status
+        self.desde = datetime.now()
+        self.tentativas = 0
+        self.proxima = time.monotonic() + espera
+
+
+class QuarentenaTags:
+    """
+    Contagem de falhas e quarentena das tags de um RegistroTags.
+
+    A aquisicao chama falhou() para cada tag com erro e fechar_ciclo() no
+    fim do ciclo; as mudancas no registro (entrada e volta de tags) so
+    acontecem em fechar_ciclo(), na thread de aquisicao.
+    """
+
+    def __init__(self, registro, falhas_limite=FALHAS_PARA_QUARENTENA,
+                 espera_inicial=ESPERA_INICIAL_SEGUNDOS, espera_maxima=ESPERA_MAXIMA_SEGUNDOS):
+        self.registro = registro
+        self.falhas_limite = int(falhas_limite)
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.tags = {}  # NodeId -> TagEmQuarentena
+        self.entradas = 0
+        self.saidas = 0
+        self._falhas = {}  # NodeId -> falhas seguidas (so tags falhando)
+        self._ciclo = {}  # NodeId -> StatusCode das falhas do ciclo atual
+        self._liberadas = []  # Leitura Good na revisao; voltam no fim do ciclo
+        self._versao = registro.versao
+        self._lock = threading.Lock()
+
+    def ativa(self):
+        return self.falhas_limite > 0
+
+    def falhou(self, node_id, status):
+        if status.value not in STATUS_SESSAO:
+            self._ciclo[node_id] = status
+
+    def fechar_ciclo(self):
+        """Aplica o ciclo no registro. Retorna True se o conjunto em quarentena mudou."""
+        if not self.ativa():
+            self._ciclo = {}
+            return False
+
+        # Tag que nao falhou neste ciclo zera a contagem
+        falhas = {}
+        novas = []
+        for node_id, status in self._ciclo.items():
+            contagem = self._falhas.get(node_id, 0) + 1
+            if contagem >= self.falhas_limite:
+                novas.append((node_id, status))
+            else:
+                falhas[node_id] = contagem
+        self._falhas = falhas
+        self._ciclo = {}
+
+        with self._lock:
+            liberadas, self._liberadas = self._liberadas, []
+            removidas = []
+            if self._versao != self.registro.versao:
+                # Tags saem do CSV na recarga: esquece as que nao existem mais
+                self._versao = self.registro.versao
+                atuais = set(self.registro.node_ids)
+                removidas = [n for n in self.tags if n not in atuais]
+                for node_id in removidas:
+                    del self.tags[node_id]
+            for node_id, status in novas:
+                self.tags[node_id] = TagEmQuarentena(status, self.espera_inicial)
+            quarentena = list(self.tags)
+
+        if not (novas or liberadas or removidas):
+            return False
+        self.entradas += len(novas)
+        self.saidas += len(liberadas)
+        self.registro.definir_quarentena(quarentena)
+        self._versao = self.registro.versao
+        for node_id, status in novas[:10]:
+            logger.warning(
+                f"Tag {node_id.Identifier} em quarentena apos {self.falhas_limite} falhas seguidas "
+                f"({status.name}); nova tentativa em {self.espera_inicial}s"
+            )
+        if len(novas) > 10:
+            logger.warning(f"{len(novas)} tags entraram em quarentena")
+        for node_id in liberadas:
+            logger.info(f"Tag {node_id.Identifier} voltou da quarentena")
+        return True
+
+    def vencidas(self, agora):
+        """Tags em quarentena com nova tentativa vencida."""
+        with self._lock:
+            return [n for n, tag in self.tags.items() if tag.proxima <= agora]
+
+    def revisar(self, node_ids, status):
+        """Resultado da nova tentativa: Good libera a tag, erro dobra a espera."""
+        agora = time.monotonic()
+        with self._lock:
+            for node_id, st in zip(node_ids, status):
+                tag = self.tags.get(node_id)
+                if tag is None:
+                    continue
+                if st.is_good():
+                    del self.tags[node_id]
+                    self._liberadas.append(node_id)
+                    continue
+                tag.tentativas += 1
+                tag.status = st
+                tag.proxima = agora + min(self.espera_maxima, self.espera_inicial * 2 ** tag.tentativas)
+
+    def estado(self):
+        """[(NodeId, status, desde, tentativas, segundos ate a proxima)] das tags em quarentena."""
+        agora = time.monotonic()
+        with self._lock:
+            return [
+                (n, tag.status, tag.desde, tag.tentativas, max(0.0, tag.proxima - agora))
+                for n, tag in self.tags.items()
+            ]
+
+    def resumo(self):
+        return (
+            f"Quarentena: {len(self.tags)} tag(s), {len(self._falhas)} falhando, "
+            f"{self.entradas} entrada(s), {self.saidas} volta(s)"
+        )
+
+
+class RevisaoQuarentena(threading.Thread):
+    """
+    Thread que le de novo, em lote, as tags em quarentena com tentativa
+    vencida. 'quarentenas()' retorna as QuarentenaTags atuais (classes
+    podem ser criadas na recarga). Com a sessao caida a tentativa e adiada.
+    """
+
+    def __init__(self, client, quarentenas, intervalo_segundos=1.0):
+        super().__init__(name="RevisaoQuarentena", daemon=True)
+        self.client = client
+        self.quarentenas = quarentenas
+        self.intervalo = intervalo_segundos
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            agora = time.monotonic()
+            for quarentena in self.quarentenas():
+                node_ids = quarentena.vencidas(agora)
+                if not node_ids:
+                    continue
+                try:
+                    _, status = ler_valores_em_lote(self.client, node_ids, quarentena.registro.tamanho_lote)
+                except Exception as e:
+                    logger.debug(f"Revisao da quarentena adiada: {e}")
+                    continue
+                quarentena.revisar(node_ids, status)
+
+    def parar(self):
+        self._parar.set()
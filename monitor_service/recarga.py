@@ -0,0 +1,71 @@
+"""
+RECARGA A QUENTE DA CONFIGURACAO
+Observa o tags_config.csv (e o config.ini) pela data de modificacao e
+tamanho, e calcula a diferenca entre o conjunto de tags antigo e o novo,
+para que o servico atualize so o que mudou (handles OPC, itens
+monitorados, colunas e instrucoes SQL) sem derrubar a sessao OPC nem os
+lotes que ainda estao na fila de gravacao.
+"""
+
+import os
+import time
+import logging
+
+logger = logging.getLogger('SeedLossMonitor')
+
+INTERVALO_VERIFICACAO_SEGUNDOS = 10
+
+
+def _assinatura_arquivo(caminho):
+    try:
+        st = os.stat(caminho)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+class ObservadorArquivos:
+    """
+    alterados() retorna os arquivos modificados desde a ultima recarga. A
+    mudanca so e informada quando o arquivo fica igual em duas verificacoes
+    seguidas, para nao recarregar um CSV pela metade enquanto e salvo.
+    """
+
+    def __init__(self, caminhos, intervalo_segundos=INTERVALO_VERIFICACAO_SEGUNDOS):
+        self.caminhos = list(caminhos)
+        self.intervalo = intervalo_segundos
+        self._confirmadas = {c: _assinatura_arquivo(c) for c in self.caminhos}
+        self._vistas = dict(self._confirmadas)
+        self._proxima = time.monotonic() + intervalo_segundos
+
+    def alterados(self):
+        """Verifica no maximo a cada 'intervalo' segundos; custo de um stat por arquivo."""
+        agora = time.monotonic()
+        if agora < self._proxima:
+            return []
+        self._proxima = agora + self.intervalo
+
+        alterados = []
+        for caminho in self.caminhos:
+            assinatura = _assinatura_arquivo(caminho)
+            if assinatura == self._confirmadas[caminho]:
+                self._vistas[caminho] = assinatura
+            elif assinatura == self._vistas[caminho]:
+                self._confirmadas[caminho] = assinatura
+                alterados.append(caminho)
+            else:
+                self._vistas[caminho] = assinatura
+        return alterados
+
+
+def diferenca_tags(antigas, novas):
+    """
+    Compara dois {linha: {coluna: tag_path}}.
+    Retorna (adicionadas, removidas) como {(linha, coluna): tag_path}; uma
+    coluna que mudou de tag aparece nas duas.
+    """
+    antes = {(linha, coluna): tag for linha, tags in antigas.items() for coluna, tag in tags.items()}
+    depois = {(linha, coluna): tag for linha, tags in novas.items() for coluna, tag in tags.items()}
+    adicionadas = {chave: tag for chave, tag in depois.items() if antes.get(chave) != tag}
+    removidas = {chave: tag for chave, tag in antes.items() if depois.get(chave) != tag}
+    return adicionadas, removidas
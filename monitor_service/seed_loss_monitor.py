@@ -2,25 +2,13 @@
 """
 SEED LOSS MONITOR - VERSAO CONFIGURAVEL
 Para implantacao em multiplas plantas industriais
-Configuracoes em config.ini
+Configuracoes em config.ini; o ciclo de coleta fica em coletor.py
 """
-import time
-import csv
 import os
 import sys
-import gc
-import logging
 import configparser
-from datetime import datetime
-from logging.handlers import RotatingFileHandler
-from opcua import Client
-# Tenta importar pyodbc
-try:
-    import pyodbc
-except ImportError:
-    print("ERRO CRITICO: A biblioteca 'pyodbc' nao esta instalada.")
-    print("Execute: pip install pyodbc")
-    sys.exit(1)
+from classes_varredura import interpretar_classe
+from coletor import ConfigColetor, configurar_logging, main
 # ================= CARREGAR CONFIGURACOES =================
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 os.chdir(BASE_DIR)
@@ -48,298 +36,111 @@ DB_PORT = CONFIG.getint('SQL_SERVER', 'porta', fallback=1600)
 # Remove aspas mas MANTEM espacos (para bancos como " FMA_Seed_Loss")
 DB_NAME = CONFIG.get('SQL_SERVER', 'database', fallback=' FMA_Seed_Loss').strip('"').strip("'")
 DB_TABLE = CONFIG.get('SQL_SERVER', 'tabela', fallback='seed_loss').strip('"').strip("'")
+TAMANHO_POOL_SQL = CONFIG.getint('SQL_SERVER', 'tamanho_pool', fallback=2)
+CICLOS_POR_LOTE_SQL = CONFIG.getint('SQL_SERVER', 'ciclos_por_lote', fallback=1)
+USAR_FAST_EXECUTEMANY = CONFIG.getboolean('SQL_SERVER', 'fast_executemany', fallback=True)
+MODO_ARMAZENAMENTO = CONFIG.get('SQL_SERVER', 'armazenamento', fallback='largo').strip().lower()
 # Monitor
-INTERVALO_SEGUNDOS = CONFIG.getint('MONITOR', 'intervalo_segundos', fallback=60)
+INTERVALO_SEGUNDOS = CONFIG.getfloat('MONITOR', 'intervalo_segundos', fallback=60)
+ALINHAR_CICLOS = CONFIG.getboolean('MONITOR', 'alinhar_ciclos', fallback=True)
+RECUPERAR_CICLOS_PERDIDOS = CONFIG.getboolean('MONITOR', 'recuperar_ciclos_perdidos', fallback=False)
+TAMANHO_LOTE_LEITURA = CONFIG.getint('OPC_UA', 'tamanho_lote_leitura', fallback=500)
+# Aquisicao: "leitura" (Read em lote a cada ciclo) ou "assinatura" (MonitoredItems)
+MODO_AQUISICAO = CONFIG.get('OPC_UA', 'modo_aquisicao', fallback='leitura').strip().lower()
+INTERVALO_PUBLICACAO_MS = CONFIG.getfloat('OPC_UA', 'intervalo_publicacao_ms', fallback=1000)
+INTERVALO_AMOSTRAGEM_MS = CONFIG.getfloat('OPC_UA', 'intervalo_amostragem_ms', fallback=500)
+TAMANHO_FILA_ASSINATURA = CONFIG.getint('OPC_UA', 'tamanho_fila', fallback=10)
+SESSOES_LEITURA = CONFIG.getint('OPC_UA', 'sessoes_leitura', fallback=1)
+INTERVALO_KEEPALIVE = CONFIG.getfloat('OPC_UA', 'intervalo_keepalive', fallback=5)
+ESPERA_RECONEXAO = CONFIG.getfloat('OPC_UA', 'espera_reconexao', fallback=1)
+ESPERA_MAXIMA_RECONEXAO = CONFIG.getfloat('OPC_UA', 'espera_maxima_reconexao', fallback=60)
 CICLOS_PARA_LIMPEZA = CONFIG.getint('MONITOR', 'ciclos_limpeza', fallback=60)
+INTERVALO_VERIFICACAO_CONFIG = CONFIG.getfloat('MONITOR', 'intervalo_verificacao_config', fallback=10)
+PROCESSOS_COLETA = CONFIG.getint('MONITOR', 'processos_coleta', fallback=1)
+INTERVALO_SAUDE_COLETORES = CONFIG.getfloat('MONITOR', 'intervalo_saude_coletores', fallback=60)
+PRAZO_AQUISICAO = CONFIG.getfloat('MONITOR', 'prazo_aquisicao', fallback=60)
+PRAZO_CONVERSAO = CONFIG.getfloat('MONITOR', 'prazo_conversao', fallback=30)
+PRAZO_PERSISTENCIA = CONFIG.getfloat('MONITOR', 'prazo_persistencia', fallback=300)
+PRAZO_MANUTENCAO = CONFIG.getfloat('MONITOR', 'prazo_manutencao', fallback=300)
+ORCAMENTO_TRAVAMENTO = CONFIG.getfloat('MONITOR', 'orcamento_travamento', fallback=600)
+FALHAS_PARA_QUARENTENA = CONFIG.getint('MONITOR', 'falhas_para_quarentena', fallback=5)
+ESPERA_QUARENTENA_SEGUNDOS = CONFIG.getfloat('MONITOR', 'espera_quarentena', fallback=30)
+ESPERA_MAXIMA_QUARENTENA_SEGUNDOS = CONFIG.getfloat('MONITOR', 'espera_maxima_quarentena', fallback=1800)
+TAMANHO_FILA_INSTANTANEOS = CONFIG.getint('MONITOR', 'tamanho_fila_gravacao', fallback=600)
+POLITICA_TRANSBORDO = CONFIG.get('MONITOR', 'politica_transbordo', fallback='spool').strip().lower()
 # Planta
 NOME_PLANTA = CONFIG.get('PLANTA', 'nome_planta', fallback='PLANTA')
 # Arquivos
 ARQUIVO_CONFIG = os.path.join(BASE_DIR, "tags_config.csv")
-ARQUIVO_BACKUP = os.path.join(BASE_DIR, "backup_seed_loss.csv")
+SPOOL_DIR = os.path.join(BASE_DIR, "spool")
+ARQUIVO_ESQUEMA = os.path.join(BASE_DIR, "esquema_aplicado.json")
+ARQUIVO_TAGS_INVALIDAS = os.path.join(BASE_DIR, "tags_invalidas.csv")
+ARQUIVO_QUARENTENA = os.path.join(BASE_DIR, "tags_quarentena.csv")
 LOG_DIR = os.path.join(BASE_DIR, "logs")
 LOG_FILE = os.path.join(LOG_DIR, "seed_loss_monitor.log")
 # Configuracoes de log
 MAX_LOG_SIZE_MB = 10
 MAX_LOG_FILES = 5
 DIAS_MANTER_BACKUP = 30
-# Mapeamento SRT -> Linha
+# Classes de varredura: [CLASSES_VARREDURA] nome = intervalo: padrao1, padrao2
+CLASSES_VARREDURA = {}
+if CONFIG.has_section('CLASSES_VARREDURA'):
+    for _nome, _texto in CONFIG.items('CLASSES_VARREDURA'):
+        CLASSES_VARREDURA[_nome] = interpretar_classe(_texto)
+# Compressao no coletor (mesma semantica do IP21)
+COMPRESSAO_PADRAO = CONFIG.get('COMPRESSAO', 'compressao', fallback='OFF').strip().upper()
+ALGORITMO_COMPRESSAO = CONFIG.get('COMPRESSAO', 'algoritmo', fallback='SWINGING_DOOR').strip().upper()
+SIGNIFICANCIA_PADRAO = CONFIG.get('COMPRESSAO', 'significancia', fallback='1.00').strip()
+TEMPO_MAX_COMPRESSAO = CONFIG.get('COMPRESSAO', 'tempo_max', fallback='+000:05:00.0').strip()
+# Contadores (totais crescentes): incremento e taxa por segundo entre registros
+CONTADORES = [c.strip() for c in CONFIG.get('CONTADORES', 'colunas', fallback='dTot*Sample, dTot*Batch, dSampleTime, dBatchTime').split(',') if c.strip()]
+MODO_CONTADORES = CONFIG.get('CONTADORES', 'modo', fallback='junto').strip().lower()
+CONTADOR_BITS = CONFIG.getint('CONTADORES', 'bits', fallback=32)
+CONTADOR_COM_SINAL = CONFIG.getboolean('CONTADORES', 'com_sinal', fallback=True)
+# Agregados por hora e por turno (tabelas <tabela>_hora e <tabela>_turno)
+AGREGADOS_ATIVOS = CONFIG.getboolean('AGREGADOS', 'ativo', fallback=True)
+TURNOS = [t.strip() for t in CONFIG.get('AGREGADOS', 'turnos', fallback='06:00, 14:00, 22:00').split(',') if t.strip()]
+AGREGADOS_INTERVALO_GRAVACAO = CONFIG.getfloat('AGREGADOS', 'intervalo_gravacao_segundos', fallback=60)
+# Spool local (substitui o backup CSV)
+SPOOL_FSYNC = CONFIG.get('SPOOL', 'fsync', fallback='segmento').strip().lower()
+SPOOL_TAMANHO_SEGMENTO_MB = CONFIG.getfloat('SPOOL', 'tamanho_segmento_mb', fallback=4)
+SPOOL_COTA_MB = CONFIG.getfloat('SPOOL', 'cota_mb', fallback=500)
+SPOOL_INTERVALO_DRENAGEM = CONFIG.getfloat('SPOOL', 'intervalo_drenagem_segundos', fallback=30)
+# Mapeamento SRT -> Linha: [LINHAS] chave = linha (chave = segmento(s) do caminho da tag)
 MAPA_LINHA = {
     "A": "A",
     "B": "B",
     "C": "C"
 }
-# =================================================
-# CONFIGURACAO DE LOGGING
-# =================================================
-def configurar_logging():
-    """Configura logging com rotacao de arquivos."""
-    if not os.path.exists(LOG_DIR):
-        os.makedirs(LOG_DIR)
-    
-    logger = logging.getLogger('SeedLossMonitor')
-    logger.setLevel(logging.INFO)
-    
-    # Limpar handlers existentes
-    logger.handlers = []
-    
-    file_handler = RotatingFileHandler(
-        LOG_FILE,
-        maxBytes=MAX_LOG_SIZE_MB * 1024 * 1024,
-        backupCount=MAX_LOG_FILES,
-        encoding='utf-8'
-    )
-    file_handler.setLevel(logging.INFO)
-    
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.INFO)
-    
-    formatter = logging.Formatter(
-        f'%(asctime)s | {NOME_PLANTA} | %(levelname)-8s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(formatter)
-    console_handler.setFormatter(formatter)
-    
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
-logger = configurar_logging()
-# =================================================
-# FUNCOES DE LIMPEZA
-# =================================================
-def limpar_cache_memoria():
-    """Forca coleta de lixo para liberar memoria."""
-    gc.collect()
-    logger.info("Cache de memoria limpo")
-def limpar_logs_antigos():
-    """Remove arquivos de log muito antigos."""
-    try:
-        if os.path.exists(LOG_DIR):
-            agora = datetime.now()
-            for arquivo in os.listdir(LOG_DIR):
-                caminho = os.path.join(LOG_DIR, arquivo)
-                if os.path.isfile(caminho):
-                    modificado = datetime.fromtimestamp(os.path.getmtime(caminho))
-                    if (agora - modificado).days > DIAS_MANTER_BACKUP:
-                        os.remove(caminho)
-                        logger.info(f"Log antigo removido: {arquivo}")
-    except Exception as e:
-        logger.warning(f"Erro ao limpar logs antigos: {e}")
-def gerenciar_backup_csv():
-    """Gerencia tamanho do arquivo de backup CSV."""
-    try:
-        if os.path.exists(ARQUIVO_BACKUP):
-            tamanho_mb = os.path.getsize(ARQUIVO_BACKUP) / (1024 * 1024)
-            if tamanho_mb > 50:
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                novo_nome = ARQUIVO_BACKUP.replace('.csv', f'_{timestamp}.csv')
-                os.rename(ARQUIVO_BACKUP, novo_nome)
-                logger.info(f"Backup CSV rotacionado: {novo_nome}")
-    except Exception as e:
-        logger.warning(f"Erro ao gerenciar backup CSV: {e}")
-# =================================================
-# FUNCOES PRINCIPAIS
-# =================================================
-def carregar_tags_do_csv():
-    """Carrega tags do CSV e agrupa por linha (SRT1, SRT2, etc)."""
-    tags_por_linha = {}
-    
-    if not os.path.exists(ARQUIVO_CONFIG):
-        logger.error(f"Arquivo {ARQUIVO_CONFIG} nao encontrado!")
-        return {}
-    
-    with open(ARQUIVO_CONFIG, 'r', newline='', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        next(reader, None)
-        
-        for row in reader:
-            if not row or not row[0].strip():
-                continue
-                
-            tag_path = row[0].strip()
-            
-            linha = None
-            for srt_key, linha_nome in MAPA_LINHA.items():
-                if srt_key in tag_path:
-                    linha = linha_nome
-                    break
-            
-            if not linha:
-                logger.warning(f"Tag ignorada (SRT nao identificado): {tag_path}")
-                continue
-            
-            coluna = tag_path.split('.')[-1]
-            
-            if linha not in tags_por_linha:
-                tags_por_linha[linha] = {}
-            
-            tags_por_linha[linha][coluna] = tag_path
-    
-    return tags_por_linha
-def conectar_sql():
-    """Cria e retorna uma conexao com o SQL Server."""
-    try:
-        conn_str = (
-            f"DRIVER={{SQL Server}};"
-            f"SERVER={DB_SERVER},{DB_PORT};"
-            f"DATABASE={DB_NAME};"
-            "Trusted_Connection=yes;"
-            "Network=DBMSSOCN;"
-        )
-        conn = pyodbc.connect(conn_str, timeout=10)
-        return conn
-    except Exception as e:
-        logger.warning(f"Falha ao conectar no SQL Server: {e}")
-        return None
-def salvar_csv_backup(linha, valores_dict):
-    """Salva em CSV local caso o SQL falhe."""
-    arquivo_existe = os.path.exists(ARQUIVO_BACKUP)
-    
-    header = ['DataHora', 'linha'] + list(valores_dict.keys())
-    row = [datetime.now().strftime("%Y-%m-%d %H:%M:%S"), linha] + list(valores_dict.values())
-    
-    try:
-        with open(ARQUIVO_BACKUP, 'a', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f, delimiter=';')
-            if not arquivo_existe:
-                writer.writerow(header)
-            writer.writerow(row)
-        logger.info(f"Backup local salvo para linha {linha}")
-    except Exception as e:
-        logger.error(f"Erro ao salvar backup: {e}")
-def inserir_no_sql(conn, linha, valores_dict):
-    """Insere um registro no SQL para uma linha especifica."""
-    try:
-        cursor = conn.cursor()
-        
-        colunas = ['linha'] + list(valores_dict.keys())
-        valores = [linha] + list(valores_dict.values())
-        
-        cols_str = ", ".join([f"[{c}]" for c in colunas])
-        params_str = ", ".join(["?"] * len(colunas))
-        
-        sql = f"INSERT INTO {DB_TABLE} ({cols_str}) VALUES ({params_str})"
-        
-        cursor.execute(sql, valores)
-        conn.commit()
-        cursor.close()
-        return True
-    except Exception as e:
-        logger.error(f"Erro SQL linha {linha}: {e}")
-        return False
-def main():
-    logger.info("=" * 60)
-    logger.info(f"SEED LOSS MONITOR - {NOME_PLANTA}")
-    logger.info("=" * 60)
-    logger.info(f"OPC UA: {OPC_URL}")
-    logger.info(f"SQL Server: {DB_SERVER}:{DB_PORT}/{DB_NAME}")
-    logger.info(f"Intervalo: {INTERVALO_SEGUNDOS}s")
-    logger.info(f"Diretorio: {BASE_DIR}")
-    logger.info("=" * 60)
-    
-    # Carregar tags
-    tags_por_linha = carregar_tags_do_csv()
-    
-    if not tags_por_linha:
-        logger.error("Nenhuma tag configurada!")
-        return
-    
-    logger.info(f"Linhas configuradas: {list(tags_por_linha.keys())}")
-    for linha, tags in tags_por_linha.items():
-        logger.info(f"Linha {linha}: {len(tags)} tags")
-    
-    ciclo_count = 0
-    client = Client(OPC_URL)
-    
-    while True:
-        try:
-            logger.info(f"Conectando ao OPC UA ({OPC_URL})...")
-            client.connect()
-            logger.info("Conectado ao OPC UA!")
-            
-            while True:
-                ciclo_count += 1
-                timestamp = datetime.now()
-                logger.info(f"Ciclo {ciclo_count}: {timestamp.strftime('%Y-%m-%d %H:%M:%S')}")
-                
-                # Limpeza periodica
-                if ciclo_count % CICLOS_PARA_LIMPEZA == 0:
-                    logger.info("Executando limpeza periodica...")
-                    limpar_cache_memoria()
-                    limpar_logs_antigos()
-                    gerenciar_backup_csv()
-                
-                conn = conectar_sql()
-                
-                for linha, tags in tags_por_linha.items():
-                    valores_lidos = {}
-                    erros = 0
-                    
-                    for coluna, tag_path in tags.items():
-                        try:
-                            node_id = f"ns={NAMESPACE_INDEX};s={tag_path}"
-                            node = client.get_node(node_id)
-                            val = node.get_value()
-                            
-                            if isinstance(val, (int, float)):
-                                valores_lidos[coluna] = val
-                            elif isinstance(val, bool):
-                                valores_lidos[coluna] = 1 if val else 0
-                            elif isinstance(val, str):
-                                valores_lidos[coluna] = val
-                            else:
-                                try:
-                                    valores_lidos[coluna] = float(val) if val is not None else None
-                                except:
-                                    valores_lidos[coluna] = str(val) if val is not None else None
-                                    
-                        except Exception as e:
-                            erros += 1
-                            valores_lidos[coluna] = None
-                            if erros <= 3:
-                                logger.warning(f"Erro tag {coluna}: {e}")
-                    
-                    logger.info(f"Linha {linha}: {len(valores_lidos) - erros}/{len(tags)} tags OK")
-                    
-                    sucesso = False
-                    if conn:
-                        sucesso = inserir_no_sql(conn, linha, valores_lidos)
-                        if sucesso:
-                            logger.info(f"SQL OK - Linha {linha}")
-                    
-                    if not sucesso:
-                        salvar_csv_backup(linha, valores_lidos)
-                
-                if conn:
-                    try:
-                        conn.close()
-                    except:
-                        pass
-                
-                del valores_lidos
-                if ciclo_count % 10 == 0:
-                    gc.collect()
-                
-                time.sleep(INTERVALO_SEGUNDOS)
-                
-        except KeyboardInterrupt:
-            logger.info("Parando monitor (KeyboardInterrupt)...")
-            break
-        except Exception as e:
-            logger.error(f"Erro na conexao OPC: {e}")
-            logger.info("Tentando reconectar em 30 segundos...")
-            try:
-                client.disconnect()
-            except:
-                pass
-            time.sleep(30)
-            continue
-    
-    try:
-        client.disconnect()
-        logger.info("Desconectado do OPC UA.")
-    except:
-        pass
+if CONFIG.has_section('LINHAS'):
+    MAPA_LINHA = {_chave: _linha.strip() for _chave, _linha in CONFIG.items('LINHAS')}
+def recarregar_config(config):
+    """
+    Rele o config.ini e aplica o mapa de linhas, as classes de varredura e a
+    compressao padrao.
+    Os demais parametros so valem apos reiniciar o servico.
+    """
+    global CONFIG
+    CONFIG = carregar_configuracoes()
+    if CONFIG.has_section('LINHAS'):
+        config.MAPA_LINHA = {chave: linha.strip() for chave, linha in CONFIG.items('LINHAS')}
+    classes = {}
+    if CONFIG.has_section('CLASSES_VARREDURA'):
+        for nome, texto in CONFIG.items('CLASSES_VARREDURA'):
+            classes[nome] = interpretar_classe(texto)
+    config.CLASSES_VARREDURA = classes
+    config.COMPRESSAO_PADRAO = CONFIG.get('COMPRESSAO', 'compressao', fallback='OFF').strip().upper()
+    config.ALGORITMO_COMPRESSAO = CONFIG.get('COMPRESSAO', 'algoritmo', fallback='SWINGING_DOOR').strip().upper()
+    config.SIGNIFICANCIA_PADRAO = CONFIG.get('COMPRESSAO', 'significancia', fallback='1.00').strip()
+    config.TEMPO_MAX_COMPRESSAO = CONFIG.get('COMPRESSAO', 'tempo_max', fallback='+000:05:00.0').strip()
+    logger.info("config.ini recarregado: linhas, classes de varredura e compressao aplicadas; demais parametros apos reiniciar")
+# Parametros do coletor (mesmos nomes das constantes acima)
+CONFIG_COLETOR = ConfigColetor.das_constantes(
+    globals(),
+    TITULO=f"SEED LOSS MONITOR - {NOME_PLANTA}",
+    ARQUIVO_INI=CONFIG_FILE,
+    RECARREGAR_INI=recarregar_config,
+)
+logger = configurar_logging(CONFIG_COLETOR)
 if __name__ == "__main__":
-    main()
+    main(CONFIG_COLETOR)
@@ -0,0 +1,108 @@
+"""
+SUPERVISAO DA SESSAO OPC UA
+O keepalive do python-opcua so renova o canal no timeout da sessao (muitos
+minutos) e nao avisa ninguem; a queda do KEPServer so aparecia no Read do
+ciclo seguinte e a reconexao esperava 30 s fixos.
+
+VigiaSessao le o ServerStatus.State a cada poucos segundos e sinaliza a
+queda na hora, acordando a espera do ciclo. A reconexao usa espera
+exponencial com jitter (1 s, 2 s, 4 s... ate o maximo), entao um
+KEPServer reiniciado volta a ser lido em segundos e varios coletores nao
+reconectam todos no mesmo instante.
+"""
+
+import random
+import logging
+import threading
+from opcua import ua
+
+logger = logging.getLogger('SeedLossMonitor')
+
+INTERVALO_KEEPALIVE_SEGUNDOS = 5
+ESPERA_INICIAL_SEGUNDOS = 1
+ESPERA_MAXIMA_SEGUNDOS = 60
+
+NO_ESTADO_SERVIDOR = ua.NodeId(ua.ObjectIds.Server_ServerStatus_State)
+ESTADO_RODANDO = ua.ServerState.Running
+
+
+class EsperaReconexao:
+    """Espera antes de cada tentativa: dobra a cada falha, sorteada entre metade e o valor cheio."""
+
+    def __init__(self, inicial=ESPERA_INICIAL_SEGUNDOS, maxima=ESPERA_MAXIMA_SEGUNDOS):
+        self.inicial = inicial
+        self.maxima = maxima
+        self.tentativas = 0
+
+    def proxima(self):
+        espera = min(self.maxima, self.inicial * 2 ** self.tentativas)
+        self.tentativas += 1
+        return random.uniform(espera / 2, espera)
+
+    def zerar(self):
+        self.tentativas = 0
+
+
+class VigiaSessao(threading.Thread):
+    """
+    Le o estado do servidor a cada 'intervalo' segundos. Falha na leitura ou
+    estado diferente de Running seta 'perdida' (e guarda o 'motivo'); a
+    thread termina na primeira queda. Uma vigia por sessao.
+    """
+
+    def __init__(self, client, intervalo_segundos=INTERVALO_KEEPALIVE_SEGUNDOS):
+        super().__init__(name="VigiaSessaoOPC", daemon=True)
+        self.client = client
+        self.intervalo = intervalo_segundos
+        self.perdida = threading.Event()
+        self.motivo = None
+        self._parar = threading.Event()
+
+    def _estado(self):
+        rv = ua.ReadValueId()
+        rv.NodeId = NO_ESTADO_SERVIDOR
+        rv.AttributeId = ua.AttributeIds.Value
+        params = ua.ReadParameters()
+        params.NodesToRead = [rv]
+        dv = self.client.uaclient.read(params)[0]
+        if not dv.StatusCode.is_good():
+            return f"ServerStatus {dv.StatusCode.name}"
+        estado = dv.Value.Value if dv.Value is not None else None
+        if estado != ESTADO_RODANDO:
+            return f"servidor no estado {estado}"
+        return None
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                motivo = self._estado()
+            except Exception as e:
+                motivo = f"keepalive sem resposta: {str(e) or type(e).__name__}"
+            if motivo is not None and not self._parar.is_set():
+                self.motivo = motivo
+                self.perdida.set()
+                logger.warning(f"Sessao OPC perdida ({motivo})")
+                return
+
+    def parar(self):
+        self._parar.set()
+
+
+def encerrar_sessao(client, perdida=False):
+    """
+    Fecha a sessao. Com a sessao ja perdida fecha so o socket: CloseSession
+    em um servidor que caiu esperaria o timeout de cada requisicao.
+    """
+    if not perdida:
+        try:
+            client.disconnect()
+            return
+        except Exception:
+            pass
+    keepalive = getattr(client, 'keepalive', None)
+    if keepalive is not None:
+        keepalive.stop()
+    try:
+        client.disconnect_socket()
+    except Exception:
+        pass
@@ -81,7 +81,64 @@ CREATE INDEX IX_seed_loss_Linha ON [dbo].[seed_loss] ([linha]);
 PRINT '✅ Índices criados.';
 GO
 
--- 5. Verificação da estrutura
+-- 5. Tabelas de agregados por hora e por turno (mantidas pelo monitor com MERGE;
+--    o monitor tambem as cria na partida se nao existirem)
+CREATE TABLE [dbo].[seed_loss_hora](
+    [linha] [nvarchar](10) NOT NULL,
+    [inicio] [datetime] NOT NULL,                   -- Inicio da hora / do turno
+    [coluna] [nvarchar](128) NOT NULL,              -- Coluna de seed_loss
+    [minimo] [float] NULL,
+    [maximo] [float] NULL,
+    [soma] [float] NULL,
+    [contagem] [int] NOT NULL,
+    [media] AS ([soma] / NULLIF([contagem], 0)),
+    [ultimo] [float] NULL,
+    [ultima_data] [datetime] NULL,
+    [delta] [float] NULL,                           -- Incremento dos contadores no periodo
+    PRIMARY KEY ([linha], [inicio], [coluna])
+);
+CREATE TABLE [dbo].[seed_loss_turno](
+    [linha] [nvarchar](10) NOT NULL,
+    [inicio] [datetime] NOT NULL,                   -- Inicio da hora / do turno
+    [coluna] [nvarchar](128) NOT NULL,              -- Coluna de seed_loss
+    [minimo] [float] NULL,
+    [maximo] [float] NULL,
+    [soma] [float] NULL,
+    [contagem] [int] NOT NULL,
+    [media] AS ([soma] / NULLIF([contagem], 0)),
+    [ultimo] [float] NULL,
+    [ultima_data] [datetime] NULL,
+    [delta] [float] NULL,                           -- Incremento dos contadores no periodo
+    PRIMARY KEY ([linha], [inicio], [coluna])
+);
+
+PRINT '✅ Tabelas de agregados criadas.';
+GO
+
+-- 6. Armazenamento estreito (opcional, [SQL_SERVER] armazenamento = estreito):
+--    dicionario de tags + valores com índice clusterizado (tag_id, DataHora).
+--    O monitor cria estas tabelas e a visão seed_loss_largo na partida.
+CREATE TABLE [dbo].[seed_loss_tags](
+    [tag_id] [int] IDENTITY(1,1) NOT NULL PRIMARY KEY,
+    [linha] [nvarchar](10) NOT NULL,
+    [coluna] [nvarchar](128) NOT NULL,              -- Nome da coluna no formato largo
+    [tag_path] [nvarchar](400) NULL,                -- Tag OPC (NULL para colunas calculadas)
+    [tipo] [nvarchar](30) NOT NULL,                 -- Tipo da coluna na visão larga
+    CONSTRAINT [UQ_seed_loss_tags] UNIQUE ([linha], [coluna])
+);
+CREATE TABLE [dbo].[seed_loss_valores](
+    [tag_id] [int] NOT NULL,
+    [DataHora] [datetime] NOT NULL,
+    [valor] [float] NULL,
+    [valor_texto] [nvarchar](100) NULL,             -- Tags de texto (scale_ticket, hibrido)
+    [qualidade] [bigint] NOT NULL,                  -- StatusCode OPC (0 = Good; severidade nos 2 bits altos)
+    CONSTRAINT [PK_seed_loss_valores] PRIMARY KEY CLUSTERED ([tag_id], [DataHora])
+);
+
+PRINT '✅ Tabelas do armazenamento estreito criadas.';
+GO
+
+-- 7. Verificação da estrutura
 SELECT 
     COLUMN_NAME,
     DATA_TYPE,
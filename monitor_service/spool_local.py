@@ -0,0 +1,330 @@
+"""
+SPOOL LOCAL (WRITE-AHEAD) - SUBSTITUI O BACKUP CSV
+Quando o SQL falha, os registros vao para segmentos binarios append-only
+no disco. Uma thread de drenagem reenvia esses registros em lote quando o
+SQL volta, sem duplicar amostras (chave linha + DataHora).
+
+Formato de cada registro no segmento:
+    [tamanho uint32][crc32 uint32][payload JSON utf-8]
+Um registro truncado (queda de energia no meio da escrita) ou com CRC
+invalido encerra a leitura daquele segmento.
+
+Registros gravados com mesclar=True (linha com colunas que ainda nao
+existiam na tabela) sao reenviados como MERGE na linha ja gravada com a
+mesma (linha, DataHora), e nao como uma segunda linha.
+"""
+
+import os
+import json
+import glob
+import zlib
+import struct
+import logging
+import threading
+from datetime import datetime
+from sql_conexao import conexao_viva
+from sql_escrita import truncar_data_hora_sql
+from vigia_estagios import ESTAGIOS, PERSISTENCIA
+
+logger = logging.getLogger('SeedLossMonitor')
+
+CABECALHO = struct.Struct('<II')  # tamanho, crc32
+
+# Politicas de fsync
+FSYNC_SEMPRE = "sempre"  # fsync a cada gravacao (mais seguro, mais lento)
+FSYNC_SEGMENTO = "segmento"  # fsync ao fechar cada segmento
+FSYNC_NUNCA = "nunca"  # deixa para o sistema operacional
+
+TAMANHO_SEGMENTO_PADRAO_MB = 4
+COTA_PADRAO_MB = 500
+REGISTROS_POR_LOTE_DRENAGEM = 1000
+
+PREFIXO_SEGMENTO = "spool_"
+EXTENSAO_SEGMENTO = ".seg"
+ARQUIVO_REJEITADOS = "rejeitados.seg"
+
+
+def codificar_registro(linha, data_hora, valores_dict, mesclar=False):
+    """Serializa um registro (linha, data_hora, valores_dict) com cabecalho e CRC."""
+    obj = {"linha": linha, "data_hora": data_hora.isoformat(), "valores": valores_dict}
+    if mesclar:
+        obj["mesclar"] = True
+    payload = json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=str).encode('utf-8')
+    return CABECALHO.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def ler_segmento(caminho):
+    """
+    Le todos os registros validos de um segmento, como (linha, data_hora,
+    valores_dict, mesclar).
+    Retorna (registros, integro) - integro=False se houve cauda truncada ou CRC invalido.
+    """
+    registros = []
+    with open(caminho, 'rb') as f:
+        dados = f.read()
+
+    pos = 0
+    while pos < len(dados):
+        if pos + CABECALHO.size > len(dados):
+            return registros, False
+        tamanho, crc = CABECALHO.unpack_from(dados, pos)
+        inicio = pos + CABECALHO.size
+        payload = dados[inicio:inicio + tamanho]
+        if len(payload) < tamanho or zlib.crc32(payload) != crc:
+            return registros, False
+        obj = json.loads(payload.decode('utf-8'))
+        registros.append((
+            obj["linha"], datetime.fromisoformat(obj["data_hora"]), obj["valores"], obj.get("mesclar", False)
+        ))
+        pos = inicio + tamanho
+
+    return registros, True
+
+
+class SpoolLocal:
+    """Spool segmentado em disco, com cota maxima e politica de fsync configuravel."""
+
+    def __init__(self, diretorio, fsync=FSYNC_SEGMENTO,
+                 tamanho_segmento_mb=TAMANHO_SEGMENTO_PADRAO_MB, cota_mb=COTA_PADRAO_MB):
+        self.diretorio = diretorio
+        self.fsync = fsync
+        self.tamanho_segmento = int(tamanho_segmento_mb * 1024 * 1024)
+        self.cota = int(cota_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._arquivo = None
+        self._caminho_atual = None
+
+        if not os.path.exists(diretorio):
+            os.makedirs(diretorio)
+
+        # Continua a numeracao dos segmentos que sobraram de uma execucao anterior
+        existentes = self._segmentos()
+        self._proximo_numero = self._numero(existentes[-1]) + 1 if existentes else 1
+        if existentes:
+            logger.warning(f"Spool com {len(existentes)} segmento(s) pendente(s) de envio ao SQL")
+
+    # ---------- segmentos ----------
+    def _segmentos(self):
+        padrao = os.path.join(self.diretorio, f"{PREFIXO_SEGMENTO}*{EXTENSAO_SEGMENTO}")
+        return sorted(glob.glob(padrao), key=self._numero)
+
+    @staticmethod
+    def _numero(caminho):
+        nome = os.path.basename(caminho)
+        return int(nome[len(PREFIXO_SEGMENTO):-len(EXTENSAO_SEGMENTO)])
+
+    def _abrir_novo_segmento(self):
+        nome = f"{PREFIXO_SEGMENTO}{self._proximo_numero:08d}{EXTENSAO_SEGMENTO}"
+        self._proximo_numero += 1
+        self._caminho_atual = os.path.join(self.diretorio, nome)
+        self._arquivo = open(self._caminho_atual, 'ab')
+
+    def _fechar_segmento_atual(self):
+        if self._arquivo is None:
+            return
+        try:
+            self._arquivo.flush()
+            if self.fsync != FSYNC_NUNCA:
+                os.fsync(self._arquivo.fileno())
+        finally:
+            self._arquivo.close()
+            self._arquivo = None
+            self._caminho_atual = None
+
+    def _aplicar_cota(self):
+        """Remove os segmentos mais antigos se o spool passar da cota de disco."""
+        segmentos = self._segmentos()
+        total = sum(os.path.getsize(s) for s in segmentos)
+        while total > self.cota and len(segmentos) > 1:
+            antigo = segmentos.pop(0)
+            if antigo == self._caminho_atual:
+                break
+            total -= os.path.getsize(antigo)
+            os.remove(antigo)
+            logger.error(f"Spool acima da cota ({self.cota // (1024 * 1024)} MB): segmento descartado {os.path.basename(antigo)}")
+
+    # ---------- escrita ----------
+    def gravar(self, registros, mesclar=False):
+        """
+        Anexa registros (linha, data_hora, valores_dict) ao segmento atual.
+        mesclar=True: no reenvio o registro completa a linha ja gravada.
+        """
+        if not registros:
+            return
+        dados = b''.join(codificar_registro(*r, mesclar=mesclar) for r in registros)
+        with self._lock:
+            if self._arquivo is None:
+                self._abrir_novo_segmento()
+            self._arquivo.write(dados)
+            self._arquivo.flush()
+            if self.fsync == FSYNC_SEMPRE:
+                os.fsync(self._arquivo.fileno())
+            if self._arquivo.tell() >= self.tamanho_segmento:
+                self._fechar_segmento_atual()
+                self._aplicar_cota()
+        logger.info(f"Spool local: {len(registros)} registro(s) salvos")
+
+    def fechar(self):
+        with self._lock:
+            self._fechar_segmento_atual()
+
+    def pendentes(self):
+        """Numero de segmentos aguardando envio (inclui o segmento aberto)."""
+        with self._lock:
+            return len(self._segmentos())
+
+    # ---------- drenagem ----------
+    def segmentos_para_drenar(self):
+        """Fecha o segmento atual e retorna todos os segmentos fechados, do mais antigo ao mais novo."""
+        with self._lock:
+            self._fechar_segmento_atual()
+            return self._segmentos()
+
+    def rejeitar(self, registros, mesclar=False):
+        """Guarda registros que o SQL recusou (ex: coluna inexistente) fora da fila de reenvio."""
+        if not registros:
+            return
+        caminho = os.path.join(self.diretorio, ARQUIVO_REJEITADOS)
+        with self._lock:
+            with open(caminho, 'ab') as f:
+                f.write(b''.join(codificar_registro(*r, mesclar=mesclar) for r in registros))
+                f.flush()
+                os.fsync(f.fileno())
+        logger.error(f"Spool: {len(registros)} registro(s) recusados pelo SQL movidos para {ARQUIVO_REJEITADOS}")
+
+
+def filtrar_ja_gravados(conn, tabela, registros):
+    """
+    Remove registros cuja chave (linha, DataHora) ja existe na tabela.
+    Usa uma consulta por conjunto de colunas no intervalo de DataHora do lote
+    (indice IX_seed_loss_DataHora). Classes de varredura diferentes podem
+    gravar a mesma (linha, DataHora) com colunas diferentes, entao so conta
+    como gravada a linha que tem alguma coluna do proprio conjunto preenchida.
+    """
+    if not registros:
+        return registros
+    inicio = truncar_data_hora_sql(min(r[1] for r in registros))
+    fim = truncar_data_hora_sql(max(r[1] for r in registros))
+
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(tuple(registro[2].keys()), []).append(registro)
+
+    restantes = []
+    cursor = conn.cursor()
+    try:
+        for colunas, grupo in grupos.items():
+            sql = f"SELECT [linha], [DataHora] FROM {tabela} WHERE [DataHora] BETWEEN ? AND ?"
+            if colunas:
+                sql += " AND (" + " OR ".join(f"[{c}] IS NOT NULL" for c in colunas) + ")"
+            cursor.execute(sql, [inicio, fim])
+            existentes = {(str(l), d) for l, d in cursor.fetchall()}
+            restantes.extend(r for r in grupo if (str(r[0]), truncar_data_hora_sql(r[1])) not in existentes)
+    finally:
+        cursor.close()
+    return restantes
+
+
+def _drenar_lote(conn, spool, tabela, parte, gravar, filtrar, mesclar):
+    """Grava um lote lido do segmento. Retorna quantos foram gravados; conexao perdida propaga."""
+    enviados = 0
+    simples = [r[:3] for r in parte if mesclar is None or not r[3]]
+    marcados = [r[:3] for r in parte if mesclar is not None and r[3]]
+    if filtrar is not None:
+        simples = filtrar(conn, tabela, simples)
+    # MERGE e idempotente: os marcados nao passam pelo filtro
+    for funcao, grupo, mescla in ((gravar, simples, False), (mesclar, marcados, True)):
+        if not grupo:
+            continue
+        falhas = funcao(conn, grupo)
+        if falhas and not conexao_viva(conn):
+            raise ConnectionError("conexao SQL perdida durante a drenagem")
+        # Conexao ok: o SQL recusou estes registros, nao adianta reenviar
+        spool.rejeitar(falhas, mesclar=mescla)
+        enviados += len(grupo) - len(falhas)
+    return enviados
+
+
+def drenar_spool(spool, pool_sql, tabela, gravar, lote=REGISTROS_POR_LOTE_DRENAGEM, filtrar=filtrar_ja_gravados,
+                 mesclar=None):
+    """
+    Reenvia ao SQL todos os segmentos pendentes. 'gravar(conn, registros)'
+    grava e retorna os registros que falharam (ex: inserir_no_sql do script).
+    'filtrar' remove o que ja esta gravado (None quando 'gravar' ja ignora
+    chaves repetidas). 'mesclar(conn, registros)' grava os registros
+    marcados com mesclar na linha existente (ex: mesclar_no_sql do script);
+    sem ela vao para 'gravar' como os outros.
+
+    Um segmento so e apagado depois de todos os seus registros serem gravados
+    (ou rejeitados). Se o SQL cair no meio, o segmento fica para a proxima
+    drenagem e a deduplicacao evita linhas repetidas.
+    Retorna o numero de registros reenviados.
+    """
+    enviados = 0
+    for caminho in spool.segmentos_para_drenar():
+        try:
+            registros, integro = ler_segmento(caminho)
+        except Exception as e:
+            logger.error(f"Spool: segmento ilegivel {os.path.basename(caminho)}: {e}")
+            continue
+        if not integro:
+            logger.warning(f"Spool: segmento {os.path.basename(caminho)} com final truncado, recuperados {len(registros)} registro(s)")
+
+        with ESTAGIOS.estagio(PERSISTENCIA):
+            conn = pool_sql.obter()
+        if conn is None:
+            return enviados
+
+        try:
+            for i in range(0, len(registros), lote):
+                # Prazo do vigia por lote (uma ida ao SQL), nao pela drenagem inteira
+                with ESTAGIOS.estagio(PERSISTENCIA):
+                    enviados += _drenar_lote(conn, spool, tabela, registros[i:i + lote], gravar, filtrar, mesclar)
+        except Exception as e:
+            logger.warning(f"Spool: drenagem interrompida ({e}), nova tentativa depois")
+            pool_sql.devolver(conn, com_erro=True)
+            return enviados
+
+        pool_sql.devolver(conn)
+        os.remove(caminho)
+
+    if enviados:
+        logger.info(f"Spool: {enviados} registro(s) reenviados ao SQL")
+    return enviados
+
+
+class DrenadorSpool(threading.Thread):
+    """
+    Thread que tenta drenar o spool periodicamente enquanto houver segmentos
+    pendentes. 'pode_drenar()' opcional adia a drenagem (ex: colunas novas
+    ainda sem DDL, que o SQL recusaria).
+    """
+
+    def __init__(self, spool, pool_sql, tabela, gravar, intervalo_segundos=30, pode_drenar=None,
+                 filtrar=filtrar_ja_gravados, mesclar=None):
+        super().__init__(name="DrenadorSpool", daemon=True)
+        self.spool = spool
+        self.pool_sql = pool_sql
+        self.tabela = tabela
+        self.gravar = gravar
+        self.intervalo = intervalo_segundos
+        self.pode_drenar = pode_drenar
+        self.filtrar = filtrar
+        self.mesclar = mesclar
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            if not self.spool.pendentes():
+                continue
+            if self.pode_drenar is not None and not self.pode_drenar():
+                continue
+            try:
+                drenar_spool(
+                    self.spool, self.pool_sql, self.tabela, self.gravar, filtrar=self.filtrar, mesclar=self.mesclar
+                )
+            except Exception as e:
+                logger.error(f"Erro na drenagem do spool: {e}")
+
+    def parar(self):
+        self._parar.set()
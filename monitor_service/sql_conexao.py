@@ -0,0 +1,175 @@
+"""
+CONEXAO PERSISTENTE - SQL SERVER
+Pool pequeno de conexoes pyodbc de longa duracao, com teste de vida e
+reconexao com backoff. Evita o handshake TCP + autenticacao a cada ciclo.
+"""
+
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('SeedLossMonitor')
+
+TAMANHO_POOL_PADRAO = 2
+INTERVALO_VERIFICACAO_SEGUNDOS = 30  # Conexao parada ha mais tempo que isso e testada antes do uso
+BACKOFF_INICIAL_SEGUNDOS = 5
+BACKOFF_MAXIMO_SEGUNDOS = 300
+
+
+def conexao_viva(conn):
+    """Teste de vida barato (SELECT 1). Retorna False se a conexao caiu."""
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+def _fechar(conn):
+    try:
+        conn.close()
+    except:
+        pass
+
+
+class PoolConexoesSQL:
+    """
+    Pool de conexoes SQL persistentes.
+
+    'conectar' e a funcao que abre uma conexao nova (ex: conectar_sql() do
+    script), retornando a conexao ou None em caso de falha.
+
+    Depois de uma falha de conexao o pool entra em backoff exponencial: ate a
+    proxima tentativa, obter() retorna None imediatamente, sem esperar o
+    timeout do login, e o ciclo segue para o backup local.
+    """
+
+    def __init__(self, conectar, tamanho=TAMANHO_POOL_PADRAO,
+                 intervalo_verificacao=INTERVALO_VERIFICACAO_SEGUNDOS,
+                 backoff_inicial=BACKOFF_INICIAL_SEGUNDOS,
+                 backoff_maximo=BACKOFF_MAXIMO_SEGUNDOS, ao_fechar=None):
+        self._conectar = conectar
+        self._ao_fechar = ao_fechar  # Ex: CACHE_INSTRUCOES.esquecer (cursores da conexao)
+        self.tamanho = max(1, int(tamanho))
+        self.intervalo_verificacao = intervalo_verificacao
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+
+        self._cond = threading.Condition()
+        self._livres = []  # [(conn, ultimo_uso monotonic)]
+        self._abertas = 0
+        self._backoff = 0
+        self._proxima_tentativa = 0.0
+
+        # Contadores para log/diagnostico
+        self.conexoes_criadas = 0
+        self.falhas_conexao = 0
+        self.reconexoes = 0
+
+    def obter(self, espera=None):
+        """
+        Retorna uma conexao pronta para uso ou None (SQL indisponivel ou em
+        backoff). Aguarda ate 'espera' segundos se todas estiverem em uso.
+        """
+        limite = None if espera is None else time.monotonic() + espera
+        with self._cond:
+            while True:
+                if self._livres:
+                    conn, ultimo_uso = self._livres.pop()
+                    break
+                if self._abertas < self.tamanho:
+                    if time.monotonic() < self._proxima_tentativa:
+                        return None
+                    self._abertas += 1
+                    conn, ultimo_uso = None, None
+                    break
+                restante = None if limite is None else limite - time.monotonic()
+                if restante is not None and restante <= 0:
+                    return None
+                self._cond.wait(restante)
+
+        if conn is not None:
+            if time.monotonic() - ultimo_uso < self.intervalo_verificacao or conexao_viva(conn):
+                return conn
+            logger.warning("Conexao SQL perdida, reconectando...")
+            self._fechar_conexao(conn)
+            self.reconexoes += 1
+
+        # Abre conexao nova fora do lock (o login pode ser lento)
+        conn = self._conectar()
+        with self._cond:
+            if conn is None:
+                self._abertas -= 1
+                self.falhas_conexao += 1
+                self._backoff = min(self._backoff * 2 or self.backoff_inicial, self.backoff_maximo)
+                self._proxima_tentativa = time.monotonic() + self._backoff
+                logger.warning(f"SQL indisponivel, nova tentativa em {self._backoff}s")
+                self._cond.notify()
+                return None
+            self._backoff = 0
+            self._proxima_tentativa = 0.0
+            self.conexoes_criadas += 1
+        return conn
+
+    def devolver(self, conn, com_erro=False):
+        """
+        Devolve a conexao ao pool. Com 'com_erro' a transacao pendente e
+        desfeita e a conexao sera testada antes do proximo uso.
+        """
+        if conn is None:
+            return
+        ultimo_uso = time.monotonic()
+        if com_erro:
+            try:
+                conn.rollback()
+                ultimo_uso = float('-inf')  # Forca o teste de vida no proximo obter()
+            except Exception:
+                self.descartar(conn)
+                return
+        with self._cond:
+            self._livres.append((conn, ultimo_uso))
+            self._cond.notify()
+
+    def descartar(self, conn):
+        """Fecha uma conexao com problema e libera a vaga no pool."""
+        self._fechar_conexao(conn)
+        with self._cond:
+            self._abertas -= 1
+            self._cond.notify()
+
+    @contextmanager
+    def conexao(self, espera=None):
+        """
+        Uso:
+            with pool.conexao() as conn:
+                if conn: ...
+        Uma excecao dentro do bloco devolve a conexao marcada com erro.
+        """
+        conn = self.obter(espera)
+        try:
+            yield conn
+        except Exception:
+            self.devolver(conn, com_erro=True)
+            raise
+        else:
+            self.devolver(conn)
+
+    def fechar_todas(self):
+        """Fecha as conexoes livres (usar no encerramento do servico)."""
+        with self._cond:
+            livres, self._livres = self._livres, []
+            self._abertas -= len(livres)
+        for conn, _ in livres:
+            self._fechar_conexao(conn)
+
+    def _fechar_conexao(self, conn):
+        if self._ao_fechar is not None:
+            try:
+                self._ao_fechar(conn)
+            except Exception:
+                pass
+        _fechar(conn)
@@ -0,0 +1,250 @@
+"""
+ESCRITA EM LOTE - SQL SERVER
+Grava varios registros (de varias linhas e, opcionalmente, de varios ciclos)
+com executemany em uma unica transacao, levando a DataHora real da amostra.
+"""
+
+import logging
+import threading
+
+logger = logging.getLogger('SeedLossMonitor')
+
+COLUNA_DATA_HORA = "DataHora"
+# Modo estreito: {coluna: StatusCode} das tags lidas com erro, junto dos valores
+# do registro (nao e coluna da tabela)
+COLUNA_QUALIDADE = "__qualidade__"
+
+
+def truncar_data_hora_sql(data_hora):
+    """
+    Trunca para centesimos de segundo. A coluna DataHora e DATETIME
+    (resolucao de 1/300 s), que representa multiplos de 10 ms sem
+    arredondar, e com fast_executemany o driver recusa microssegundos alem
+    da escala do parametro. Assim o valor gravado e igual ao da memoria
+    (usado na deduplicacao do spool).
+    """
+    return data_hora.replace(microsecond=data_hora.microsecond // 10000 * 10000)
+
+
+def agrupar_por_colunas(registros):
+    """
+    Agrupa registros (linha, data_hora, valores_dict) pela assinatura de
+    colunas. Linhas com o mesmo conjunto de tags vao no mesmo executemany.
+
+    Retorna {(coluna, ...): [[linha, data_hora, v1, v2, ...], ...]}
+    """
+    grupos = {}
+    for linha, data_hora, valores_dict in registros:
+        colunas = tuple(valores_dict.keys())
+        grupos.setdefault(colunas, []).append(
+            [linha, truncar_data_hora_sql(data_hora)] + list(valores_dict.values())
+        )
+    return grupos
+
+
+class CacheInstrucoesSQL:
+    """
+    Cache de INSERTs preparados por assinatura (tabela, colunas).
+
+    O texto do INSERT e montado uma unica vez por assinatura, e cada conexao
+    mantem um cursor por assinatura: como o pyodbc so prepara de novo quando
+    o SQL do cursor muda, o statement preparado (e a descricao dos
+    parametros usada pelo fast_executemany) e reaproveitado entre ciclos.
+
+    Na recarga do tags_config.csv, esquecer_colunas() descarta so as
+    assinaturas que tinham colunas removidas; invalidar() esquece tudo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._instrucoes = {}  # (tabela, colunas) -> sql
+        self._cursores = {}  # (id(conn), tabela, colunas) -> (conn, cursor)
+
+    def instrucao(self, tabela, colunas):
+        chave = (tabela, colunas)
+        sql = self._instrucoes.get(chave)
+        if sql is None:
+            todas = ['linha', COLUNA_DATA_HORA] + list(colunas)
+            cols_str = ", ".join([f"[{c}]" for c in todas])
+            params_str = ", ".join(["?"] * len(todas))
+            sql = f"INSERT INTO {tabela} ({cols_str}) VALUES ({params_str})"
+            with self._lock:
+                self._instrucoes[chave] = sql
+        return sql
+
+    def cursor(self, conn, tabela, colunas, fast_executemany=True):
+        chave = (id(conn), tabela, colunas)
+        item = self._cursores.get(chave)
+        if item is None or item[0] is not conn:
+            cursor = conn.cursor()
+            cursor.fast_executemany = fast_executemany
+            item = (conn, cursor)
+            with self._lock:
+                self._cursores[chave] = item
+        return item[1]
+
+    def esquecer(self, conn):
+        """Descarta os cursores de uma conexao (apos erro ou reconexao)."""
+        with self._lock:
+            chaves = [c for c, item in self._cursores.items() if item[0] is conn]
+            cursores = [self._cursores.pop(c)[1] for c in chaves]
+        for cursor in cursores:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+
+    def esquecer_colunas(self, colunas):
+        """
+        Descarta instrucoes e cursores das assinaturas com alguma das colunas.
+        Os cursores nao sao fechados aqui (podem estar em uso por um lote em
+        andamento em outra thread); sao liberados quando esse uso termina.
+        """
+        colunas = set(colunas)
+        with self._lock:
+            for chave in [c for c in self._instrucoes if colunas.intersection(c[1])]:
+                del self._instrucoes[chave]
+            for chave in [c for c in self._cursores if colunas.intersection(c[2])]:
+                del self._cursores[chave]
+
+    def invalidar(self):
+        """Esquece todas as instrucoes e cursores (mudanca de configuracao)."""
+        with self._lock:
+            conexoes = {id(item[0]): item[0] for item in self._cursores.values()}
+        for conn in conexoes.values():
+            self.esquecer(conn)
+        with self._lock:
+            self._instrucoes.clear()
+
+    def __len__(self):
+        return len(self._instrucoes)
+
+
+# Cache padrao compartilhado pelos escritores do processo
+CACHE_INSTRUCOES = CacheInstrucoesSQL()
+
+
+def inserir_lote_sql(conn, tabela, registros, fast_executemany=True, cache=CACHE_INSTRUCOES):
+    """
+    Insere todos os registros em uma transacao (um commit).
+    Em caso de erro faz rollback e propaga a excecao: nenhum registro fica
+    gravado pela metade.
+    """
+    if not registros:
+        return 0
+
+    try:
+        for colunas, linhas in agrupar_por_colunas(registros).items():
+            cursor = cache.cursor(conn, tabela, colunas, fast_executemany)
+            cursor.executemany(cache.instrucao(tabela, colunas), linhas)
+        conn.commit()
+        return len(registros)
+    except Exception:
+        cache.esquecer(conn)
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+
+
+def gravar_registros(conn, tabela, registros, fast_executemany=True, cache=CACHE_INSTRUCOES):
+    """
+    Tenta gravar tudo em uma transacao. Se falhar, tenta cada grupo de
+    colunas separadamente, para que um problema em uma linha (ex: coluna
+    inexistente) nao desvie as outras para o backup.
+
+    Retorna a lista de registros que NAO foram gravados.
+    """
+    try:
+        inserir_lote_sql(conn, tabela, registros, fast_executemany, cache)
+        return []
+    except Exception as e:
+        logger.error(f"Erro SQL no lote ({len(registros)} registros): {e}")
+
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(tuple(registro[2].keys()), []).append(registro)
+    if len(grupos) < 2:
+        return list(registros)
+
+    falhas = []
+    for grupo in grupos.values():
+        try:
+            inserir_lote_sql(conn, tabela, grupo, fast_executemany, cache)
+        except Exception as e:
+            linhas = sorted({r[0] for r in grupo})
+            logger.error(f"Erro SQL linha(s) {linhas}: {e}")
+            falhas.extend(grupo)
+    return falhas
+
+
+def sql_mesclar(tabela, colunas):
+    """
+    MERGE de um registro na linha com a mesma (linha, DataHora); sem essa
+    linha, insere. A chave e so (linha, DataHora): o coletor grava no maximo
+    uma linha por linha de producao e DataHora, e a linha ja gravada pode ter
+    todas as colunas NULL (leitura com erro).
+    """
+    todas = ['linha', COLUNA_DATA_HORA] + list(colunas)
+    cols_str = ", ".join(f"[{c}]" for c in todas)
+    params_str = ", ".join(["?"] * len(todas))
+    atualizar = ", ".join(f"[{c}] = novo.[{c}]" for c in colunas)
+    return f"""
+MERGE {tabela} WITH (HOLDLOCK) AS alvo
+USING (VALUES ({params_str})) AS novo ({cols_str})
+ON alvo.[linha] = novo.[linha] AND alvo.[{COLUNA_DATA_HORA}] = novo.[{COLUNA_DATA_HORA}]
+WHEN MATCHED THEN UPDATE SET {atualizar}
+WHEN NOT MATCHED THEN INSERT ({cols_str}) VALUES ({", ".join(f"novo.[{c}]" for c in todas)});
+"""
+
+
+def mesclar_lote_sql(conn, tabela, registros):
+    """MERGE de todos os registros em uma transacao; em erro faz rollback e propaga."""
+    cursor = conn.cursor()
+    try:
+        for colunas, linhas in agrupar_por_colunas(registros).items():
+            cursor.executemany(sql_mesclar(tabela, colunas), linhas)
+        conn.commit()
+    except Exception:
+        try:
+            conn.rollback()
+        except Exception:
+            pass
+        raise
+    finally:
+        cursor.close()
+
+
+def mesclar_registros(conn, tabela, registros):
+    """
+    Como gravar_registros, mas completa a linha ja gravada com a mesma
+    (linha, DataHora) em vez de inserir outra: registros do spool com
+    colunas que so existiam depois do DDL. Sem fast_executemany: o driver
+    nem sempre descreve os parametros do USING (VALUES ...).
+
+    Retorna a lista de registros que NAO foram gravados.
+    """
+    if not registros:
+        return []
+    try:
+        mesclar_lote_sql(conn, tabela, registros)
+        return []
+    except Exception as e:
+        logger.error(f"Erro SQL ao mesclar lote ({len(registros)} registros): {e}")
+
+    grupos = {}
+    for registro in registros:
+        grupos.setdefault(tuple(registro[2].keys()), []).append(registro)
+    if len(grupos) < 2:
+        return list(registros)
+
+    falhas = []
+    for grupo in grupos.values():
+        try:
+            mesclar_lote_sql(conn, tabela, grupo)
+        except Exception as e:
+            linhas = sorted({r[0] for r in grupo})
+            logger.error(f"Erro SQL ao mesclar linha(s) {linhas}: {e}")
+            falhas.extend(grupo)
+    return falhas
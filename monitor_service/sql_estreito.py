@@ -0,0 +1,301 @@
+"""
+ARMAZENAMENTO ESTREITO (TAG, DATAHORA, VALOR, QUALIDADE)
+Alternativa a tabela larga (uma coluna por tag): cada valor e uma linha de
+<tabela>_valores, com indice clusterizado (tag_id, DataHora), e o
+dicionario <tabela>_tags traduz (linha, coluna) em tag_id. Tag nova vira
+uma linha do dicionario, sem DDL na tabela de valores. A visao
+<tabela>_largo remonta o formato largo (uma linha por linha de producao e
+DataHora) para as consultas e paineis existentes.
+
+A qualidade e o StatusCode OPC da leitura (BIGINT: o codigo e uint32). Os
+dois bits altos sao a severidade (0 Good, 1 Uncertain, 2 Bad); a visao so
+mostra valores Good e conta as tags incertas e ruins de cada linha.
+
+A gravacao carrega o lote em uma tabela temporaria com fast_executemany
+(matriz de parametros, o caminho de carga em bloco do pyodbc) e copia para
+a tabela final com um unico INSERT ... SELECT que ignora chaves ja
+gravadas, entao reenviar o spool nao duplica amostras.
+"""
+
+import logging
+import threading
+from sql_escrita import truncar_data_hora_sql, COLUNA_QUALIDADE
+from esquema_sql import inferir_tipo_sql, TIPOS_TEXTO
+
+logger = logging.getLogger('SeedLossMonitor')
+
+SUFIXO_TAGS = "_tags"
+SUFIXO_VALORES = "_valores"
+SUFIXO_VISAO = "_largo"
+
+TABELA_CARGA = "#carga_valores"
+TAMANHO_LOTE_CARGA = 10000  # Linhas por executemany na tabela temporaria
+MAX_COLUNAS_VISAO = 4000  # Limite do SQL Server e 4096 colunas por SELECT
+
+# Qualidade gravada junto com o valor (StatusCode OPC)
+QUALIDADE_BOA = 0  # Good
+QUALIDADE_SEM_VALOR = 0x809B0000  # BadNoData: valor nulo sem StatusCode de erro (ex: conversao)
+SEVERIDADE = 0x40000000  # qualidade // SEVERIDADE: 0 Good, 1 Uncertain, 2 Bad
+
+
+def _valor_e_qualidade(valor, status=None):
+    """(valor_numerico, valor_texto, qualidade) de um valor lido; 'status' e o StatusCode da leitura com erro."""
+    if status is not None:
+        qualidade = status
+    else:
+        qualidade = QUALIDADE_SEM_VALOR if valor is None else QUALIDADE_BOA
+    if valor is None:
+        return None, None, qualidade
+    if isinstance(valor, (bool, int, float)):
+        return float(valor), None, qualidade
+    return None, str(valor)[:100], qualidade
+
+
+class ArmazenamentoEstreito:
+    """
+    Tabelas do modo estreito e cache do dicionario de tags.
+
+    gravar(conn, registros) tem a mesma interface de inserir_no_sql: recebe
+    [(linha, data_hora, valores_dict)] e retorna os registros que falharam.
+    """
+
+    def __init__(self, tabela_base, tags_por_linha=None, fast_executemany=True, tipos=None):
+        self.tabela_tags = tabela_base + SUFIXO_TAGS
+        self.tabela_valores = tabela_base + SUFIXO_VALORES
+        self.visao = tabela_base + SUFIXO_VISAO
+        self.fast_executemany = fast_executemany
+        self.tipos_colunas = dict(tipos or {})  # coluna -> tipo SQL; demais pelo prefixo
+        self._caminhos = {}  # (linha, coluna) -> tag_path (para o dicionario)
+        for linha, tags in (tags_por_linha or {}).items():
+            for coluna, tag_path in tags.items():
+                self._caminhos[(linha, coluna)] = tag_path
+        self._lock = threading.Lock()
+        self._ids = {}  # (linha, coluna) -> tag_id
+        self._tipos = {}  # (linha, coluna) -> tipo SQL (colunas da visao)
+        self._preparado = False
+
+    def sql_criar_tabelas(self):
+        return [
+            f"""
+IF OBJECT_ID('{self.tabela_tags}', 'U') IS NULL
+CREATE TABLE {self.tabela_tags} (
+    [tag_id] INT IDENTITY(1,1) NOT NULL PRIMARY KEY,
+    [linha] NVARCHAR(10) NOT NULL,
+    [coluna] NVARCHAR(128) NOT NULL,
+    [tag_path] NVARCHAR(400) NULL,
+    [tipo] NVARCHAR(30) NOT NULL,
+    CONSTRAINT [UQ_{self.tabela_tags}] UNIQUE ([linha], [coluna])
+)""",
+            f"""
+IF OBJECT_ID('{self.tabela_valores}', 'U') IS NULL
+CREATE TABLE {self.tabela_valores} (
+    [tag_id] INT NOT NULL,
+    [DataHora] DATETIME NOT NULL,
+    [valor] FLOAT NULL,
+    [valor_texto] NVARCHAR(100) NULL,
+    [qualidade] BIGINT NOT NULL,
+    CONSTRAINT [PK_{self.tabela_valores}] PRIMARY KEY CLUSTERED ([tag_id], [DataHora])
+)""",
+            # Tabela criada com qualidade 0/1 (TINYINT): passa a StatusCode, 1 vira Bad
+            f"""
+IF COLUMNPROPERTY(OBJECT_ID('{self.tabela_valores}'), 'qualidade', 'Precision') = 3
+BEGIN
+    ALTER TABLE {self.tabela_valores} ALTER COLUMN [qualidade] BIGINT NOT NULL;
+    EXEC('UPDATE {self.tabela_valores} SET [qualidade] = {QUALIDADE_SEM_VALOR} WHERE [qualidade] = 1');
+END""",
+        ]
+
+    def sql_visao(self):
+        """CREATE VIEW com uma coluna por (coluna do dicionario), tipada como na tabela larga."""
+        colunas = {}
+        for (_, coluna), tipo in sorted(self._tipos.items()):
+            colunas.setdefault(coluna, tipo)
+        if len(colunas) > MAX_COLUNAS_VISAO:
+            logger.warning(f"Visao {self.visao} limitada a {MAX_COLUNAS_VISAO} de {len(colunas)} colunas")
+        boa = f"v.[qualidade] / {SEVERIDADE} = 0"
+        selecao = []
+        for coluna, tipo in list(colunas.items())[:MAX_COLUNAS_VISAO]:
+            nome_literal = coluna.replace("'", "''")
+            if tipo.lower().partition('(')[0] in TIPOS_TEXTO:
+                selecao.append(
+                    f"    MAX(CASE WHEN t.[coluna] = N'{nome_literal}' AND {boa} THEN v.[valor_texto] END) AS [{coluna}]"
+                )
+            else:
+                selecao.append(
+                    f"    CAST(MAX(CASE WHEN t.[coluna] = N'{nome_literal}' AND {boa} THEN v.[valor] END) AS {tipo}) "
+                    f"AS [{coluna}]"
+                )
+        selecao.append(f"    SUM(CASE WHEN v.[qualidade] / {SEVERIDADE} = 1 THEN 1 ELSE 0 END) AS [tags_incertas]")
+        selecao.append(f"    SUM(CASE WHEN v.[qualidade] / {SEVERIDADE} >= 2 THEN 1 ELSE 0 END) AS [tags_ruins]")
+        return (
+            f"CREATE VIEW {self.visao} AS\n"
+            f"SELECT t.[linha], v.[DataHora]" + "".join(",\n" + s for s in selecao) + "\n"
+            f"FROM {self.tabela_valores} v\n"
+            f"JOIN {self.tabela_tags} t ON t.[tag_id] = v.[tag_id]\n"
+            f"GROUP BY t.[linha], v.[DataHora]"
+        )
+
+    def _carregar_dicionario(self, cursor):
+        cursor.execute(f"SELECT [tag_id], [linha], [coluna], [tipo] FROM {self.tabela_tags}")
+        ids = {}
+        tipos = {}
+        for tag_id, linha, coluna, tipo in cursor.fetchall():
+            ids[(linha, coluna)] = tag_id
+            tipos[(linha, coluna)] = tipo
+        with self._lock:
+            self._ids = ids
+            self._tipos = tipos
+
+    def atualizar(self, tags_por_linha, tipos=None):
+        """Troca as tags conhecidas (recarga do CSV); as novas entram no dicionario na proxima gravacao."""
+        caminhos = {}
+        for linha, tags in tags_por_linha.items():
+            for coluna, tag_path in tags.items():
+                caminhos[(linha, coluna)] = tag_path
+        self._caminhos = caminhos
+        if tipos:
+            self.tipos_colunas.update(tipos)
+
+    def _tipo(self, coluna):
+        return self.tipos_colunas.get(coluna) or inferir_tipo_sql(coluna)
+
+    def _registrar(self, cursor, chaves):
+        """
+        Acrescenta (linha, coluna) ao dicionario e recarrega os ids. Faz commit
+        antes de gravar valores, para que um rollback da carga nao deixe ids
+        no cache que nao existem no banco.
+        """
+        cursor.executemany(
+            f"INSERT INTO {self.tabela_tags} ([linha], [coluna], [tag_path], [tipo]) "
+            f"SELECT ?, ?, ?, ? WHERE NOT EXISTS "
+            f"(SELECT 1 FROM {self.tabela_tags} WHERE [linha] = ? AND [coluna] = ?)",
+            [
+                [linha, coluna, self._caminhos.get((linha, coluna)), self._tipo(coluna), linha, coluna]
+                for linha, coluna in chaves
+            ],
+        )
+        cursor.commit()
+        self._carregar_dicionario(cursor)
+        logger.info(f"Armazenamento estreito: {len(chaves)} tag(s) nova(s) no dicionario {self.tabela_tags}")
+
+    def recriar_visao(self, conn):
+        """Recria a visao larga a partir do dicionario atual. Retorna True se deu certo."""
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"IF OBJECT_ID('{self.visao}', 'V') IS NOT NULL DROP VIEW {self.visao}")
+            cursor.execute(self.sql_visao())
+            conn.commit()
+            return True
+        except Exception as e:
+            logger.error(f"Erro ao recriar a visao {self.visao}: {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return False
+        finally:
+            cursor.close()
+
+    def preparar(self, conn):
+        """Cria as tabelas que faltam, registra as tags do CSV e recria a visao."""
+        cursor = conn.cursor()
+        try:
+            for sql in self.sql_criar_tabelas():
+                cursor.execute(sql)
+            self._carregar_dicionario(cursor)
+            novas = [chave for chave in self._caminhos if chave not in self._ids]
+            if novas:
+                self._registrar(cursor, novas)
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            cursor.close()
+        self._preparado = True
+        if novas or not self._visao_existe(conn):
+            self.recriar_visao(conn)
+
+    def _visao_existe(self, conn):
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"SELECT OBJECT_ID('{self.visao}', 'V')")
+            return cursor.fetchone()[0] is not None
+        finally:
+            cursor.close()
+
+    def _linhas_carga(self, registros):
+        linhas = []
+        for linha, data_hora, valores in registros:
+            data_hora = truncar_data_hora_sql(data_hora)
+            qualidades = valores.get(COLUNA_QUALIDADE) or {}
+            for coluna, valor in valores.items():
+                if coluna == COLUNA_QUALIDADE:
+                    continue
+                linhas.append(
+                    [self._ids[(linha, coluna)], data_hora] + list(_valor_e_qualidade(valor, qualidades.get(coluna)))
+                )
+        return linhas
+
+    def gravar(self, conn, registros):
+        """
+        Carga em bloco dos registros em uma transacao. Retorna a lista de
+        registros que nao puderam ser gravados (todos, em caso de erro).
+        """
+        if not registros:
+            return []
+        try:
+            if not self._preparado:
+                self.preparar(conn)
+
+            cursor = conn.cursor()
+            try:
+                novas = list({
+                    (linha, coluna) for linha, _, valores in registros for coluna in valores
+                    if coluna != COLUNA_QUALIDADE and (linha, coluna) not in self._ids
+                })
+                if novas:
+                    self._registrar(cursor, novas)
+
+                cursor.execute(
+                    f"IF OBJECT_ID('tempdb..{TABELA_CARGA}') IS NOT NULL TRUNCATE TABLE {TABELA_CARGA} "
+                    f"ELSE CREATE TABLE {TABELA_CARGA} ([tag_id] INT NOT NULL, [DataHora] DATETIME NOT NULL, "
+                    f"[valor] FLOAT NULL, [valor_texto] NVARCHAR(100) NULL, [qualidade] BIGINT NOT NULL)"
+                )
+                linhas = self._linhas_carga(registros)
+                cursor.fast_executemany = self.fast_executemany
+                sql_carga = (
+                    f"INSERT INTO {TABELA_CARGA} ([tag_id], [DataHora], [valor], [valor_texto], [qualidade]) "
+                    f"VALUES (?, ?, ?, ?, ?)"
+                )
+                for inicio in range(0, len(linhas), TAMANHO_LOTE_CARGA):
+                    cursor.executemany(sql_carga, linhas[inicio:inicio + TAMANHO_LOTE_CARGA])
+
+                # Copia so chaves novas (spool reenviado, classes repetindo a DataHora)
+                cursor.execute(f"""
+INSERT INTO {self.tabela_valores} ([tag_id], [DataHora], [valor], [valor_texto], [qualidade])
+SELECT c.[tag_id], c.[DataHora], c.[valor], c.[valor_texto], c.[qualidade]
+FROM (
+    SELECT *, ROW_NUMBER() OVER (PARTITION BY [tag_id], [DataHora] ORDER BY [qualidade] / {SEVERIDADE}) AS n
+    FROM {TABELA_CARGA}
+) c
+WHERE c.n = 1 AND NOT EXISTS (
+    SELECT 1 FROM {self.tabela_valores} v WHERE v.[tag_id] = c.[tag_id] AND v.[DataHora] = c.[DataHora]
+)""")
+                conn.commit()
+            finally:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Erro SQL na carga estreita ({len(registros)} registros): {e}")
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            return list(registros)
+
+        if novas:
+            self.recriar_visao(conn)
+        return []
@@ -0,0 +1,75 @@
+from classificador_linhas import ClassificadorLinhas
+
+
+def test_chave_casa_segmento_inteiro():
+    classificador = ClassificadorLinhas({"A": "A", "B": "B", "C": "C"})
+    assert classificador.classificar("SRO1.SRT.A.bER") == "A"
+    # 'A' de 'Alarm' e 'C' de 'SRO1C' nao sao segmentos inteiros
+    assert classificador.classificar("SRO1.SRT.B.dTotAlarm") == "B"
+    assert classificador.classificar("SRO1C.SRT.B.dTotAlarm") == "B"
+    assert classificador.ambiguos == {}
+
+
+def test_parte_de_segmento_nao_casa():
+    classificador = ClassificadorLinhas({"SRT1": "A"})
+    assert classificador.classificar("Canal.SRT10.dTotEars") is None
+    assert classificador.classificar("Canal.XSRT1.dTotEars") is None
+    assert classificador.classificar("Canal.SRT1.dTotEars") == "A"
+
+
+def test_ultimo_segmento_nao_e_considerado():
+    classificador = ClassificadorLinhas({"bER": "X"})
+    assert classificador.classificar("SRO1.SRT.A.bER") is None
+    assert classificador.classificar("bER") is None
+
+
+def test_chave_com_varios_segmentos():
+    classificador = ClassificadorLinhas({"SRT.A": "A", "SRT.B": "B"})
+    assert classificador.classificar("SRO1.SRT.A.dTotEars") == "A"
+    assert classificador.classificar("SRO1.SRT.B.dTotEars") == "B"
+    # Segmentos fora de ordem ou separados nao casam
+    assert classificador.classificar("SRO1.A.SRT.dTotEars") is None
+    assert classificador.classificar("SRT.X.A.dTotEars") is None
+
+
+def test_maiusculas_e_minusculas():
+    # configparser entrega as chaves do config.ini em minusculas
+    classificador = ClassificadorLinhas({"srt1": "A"})
+    assert classificador.classificar("Canal.SRT1.dTotEars") == "A"
+
+
+def test_ambiguidade_vence_a_primeira_chave_do_mapa():
+    caminho = "SRO1.SRT.A.bER"
+    classificador = ClassificadorLinhas({"A": "A", "SRO1": "S"})
+    assert classificador.classificar(caminho) == "A"
+    assert classificador.ambiguos == {"SRO1.SRT.A": ["A", "S"]}
+
+    classificador = ClassificadorLinhas({"SRO1": "S", "A": "A"})
+    assert classificador.classificar(caminho) == "S"
+    assert classificador.ambiguos == {"SRO1.SRT.A": ["S", "A"]}
+
+
+def test_chaves_da_mesma_linha_nao_sao_ambiguas():
+    classificador = ClassificadorLinhas({"SRT1": "A", "Canal1": "A"})
+    assert classificador.classificar("Canal1.SRT1.dTotEars") == "A"
+    assert classificador.ambiguos == {}
+
+
+def test_chave_repetida_mantem_a_primeira():
+    classificador = ClassificadorLinhas({"SRT1": "A", "srt1": "B"})
+    assert classificador.classificar("Canal.SRT1.dTotEars") == "A"
+
+
+def test_chave_invalida_e_ignorada():
+    classificador = ClassificadorLinhas({"SRT..A": "X", "": "Y", "B": "B"})
+    assert classificador.classificar("SRT..A.dTotEars") is None
+    assert classificador.classificar("SRT.B.dTotEars") == "B"
+
+
+def test_resultado_guardado_por_prefixo():
+    classificador = ClassificadorLinhas({"A": "A", "SRO1": "S"})
+    classificador.classificar("SRO1.SRT.A.bER")
+    classificador.ambiguos.clear()
+    # Mesmo grupo: resposta do cache, sem reavaliar nem relatar de novo
+    assert classificador.classificar("SRO1.SRT.A.dTotEars") == "A"
+    assert classificador.ambiguos == {}
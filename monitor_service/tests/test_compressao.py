@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+from compressao import (
+    ConfigCompressao, CompressorLinha, CompressorRegistros, COMPRESSAO_OFF, DEADBAND, SWINGING_DOOR,
+)
+from sql_escrita import COLUNA_QUALIDADE
+
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+
+
+def instante(segundos):
+    return T0 + timedelta(seconds=segundos)
+
+
+def processar(compressor, amostras):
+    """[(segundos, valor)] -> lista de saidas de processar() por amostra."""
+    return [compressor.processar(instante(s), {"v": v}) for s, v in amostras]
+
+
+def test_swinging_door_rampa_dentro_do_corredor_fica_retida():
+    compressor = CompressorLinha({"v": ConfigCompressao(SWINGING_DOOR, "1.0", "0")})
+    saidas = processar(compressor, [(0, 0.0), (1, 1.0), (2, 2.0), (3, 3.0)])
+    assert saidas == [[(instante(0), {"v": 0.0})], [], [], []]
+    assert compressor.descarregar() == [(instante(3), {"v": 3.0})]
+
+
+def test_swinging_door_corredor_fechado_grava_o_ponto_retido():
+    compressor = CompressorLinha({"v": ConfigCompressao(SWINGING_DOOR, "1.0", "0")})
+    saidas = processar(compressor, [(0, 0.0), (1, 1.0), (2, 2.0), (3, 3.0), (4, 0.0)])
+    # A queda em t=4 fecha a porta aberta em t=0: grava t=3 e reabre a partir dele
+    assert saidas[4] == [(instante(3), {"v": 3.0})]
+    assert compressor.descarregar() == [(instante(4), {"v": 0.0})]
+
+
+def test_swinging_door_corredor_estreita_a_cada_amostra():
+    compressor = CompressorLinha({"v": ConfigCompressao(SWINGING_DOOR, "1.0", "0")})
+    # Inclinacoes aceitas: t=1 -> [0, 2]; t=2 -> [0.5, 1.5]; 0.0 em t=3 pede inclinacao <= 1/3
+    saidas = processar(compressor, [(0, 0.0), (1, 1.0), (2, 2.0), (3, 0.0)])
+    assert saidas[3] == [(instante(2), {"v": 2.0})]
+
+
+def test_swinging_door_desvio_percentual():
+    config = ConfigCompressao(SWINGING_DOOR, "10%", "0")
+    assert config.desvio_permitido(200.0) == 20.0
+    compressor = CompressorLinha({"v": config})
+    # Desvio de 10 (10% do ponto gravado): t=1 -> [-5, 15]; 141 em t=2 pede inclinacao >= 15.5
+    saidas = processar(compressor, [(0, 100.0), (1, 105.0), (2, 141.0)])
+    assert saidas[1] == []
+    assert saidas[2] == [(instante(1), {"v": 105.0})]
+
+
+def test_deadband_grava_so_fora_da_banda():
+    compressor = CompressorLinha({"v": ConfigCompressao(DEADBAND, "1.0", "0")})
+    saidas = processar(compressor, [(0, 0.0), (1, 0.5), (2, 1.0), (3, 1.5), (4, -0.1)])
+    assert saidas == [
+        [(instante(0), {"v": 0.0})], [], [(instante(2), {"v": 1.0})], [], [(instante(4), {"v": -0.1})],
+    ]
+
+
+def test_tempo_max_forca_gravacao():
+    compressor = CompressorLinha({"v": ConfigCompressao(DEADBAND, "1.0", "+000:00:10.0")})
+    saidas = processar(compressor, [(0, 5.0), (5, 5.0), (10, 5.0), (15, 5.0)])
+    assert saidas == [[(instante(0), {"v": 5.0})], [], [(instante(10), {"v": 5.0})], []]
+
+
+def test_tag_sem_compressao_grava_toda_amostra():
+    compressor = CompressorLinha({
+        "v": ConfigCompressao(DEADBAND, "100"), "w": ConfigCompressao(COMPRESSAO_OFF),
+    })
+    saidas = [compressor.processar(instante(s), {"v": 1.0, "w": 1.0}) for s in range(3)]
+    assert all(len(saida) == 1 for saida in saidas)
+
+
+def test_mudanca_nao_numerica_e_significativa():
+    compressor = CompressorLinha({"v": ConfigCompressao(DEADBAND, "100", "0")})
+    saidas = processar(compressor, [(0, 1.0), (1, None), (2, None), (3, 1.0)])
+    assert [len(saida) for saida in saidas] == [1, 1, 0, 1]
+
+
+def test_qualidade_fora_das_configs_e_mudanca_significativa():
+    compressor = CompressorRegistros({}, {"A": {"v": "SRT.A.v"}}, ConfigCompressao(DEADBAND, "100", "0"))
+    instantaneos = [
+        [("A", instante(0), {"v": 1.0, COLUNA_QUALIDADE: {}})],
+        [("A", instante(1), {"v": 1.0, COLUNA_QUALIDADE: {}})],
+        [("A", instante(2), {"v": 1.0, COLUNA_QUALIDADE: {"v": 0x80000000}})],
+    ]
+    assert [len(compressor.filtrar(i)) for i in instantaneos] == [1, 0, 1]
+    assert set(compressor._linhas[("A", ("v", COLUNA_QUALIDADE))].configs) == {"v"}
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta
+from contadores import (
+    calcular_incremento, CalculadoraContadores, FRACAO_ROLLOVER, EVENTO_ROLLOVER, EVENTO_RESET,
+    MODO_JUNTO, MODO_SUBSTITUIR,
+)
+from sql_escrita import COLUNA_QUALIDADE
+
+FAIXA_DINT = 2 ** 32
+MAXIMO_DINT = 2 ** 31 - 1
+MINIMO_DINT = -2 ** 31
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+
+
+def test_incremento_normal():
+    assert calcular_incremento(10, 15, FAIXA_DINT) == (5, None)
+    assert calcular_incremento(15, 15, FAIXA_DINT) == (0, None)
+
+
+def test_rollover_do_dint():
+    assert calcular_incremento(MAXIMO_DINT - 2, MINIMO_DINT + 2, FAIXA_DINT) == (5, EVENTO_ROLLOVER)
+
+
+def test_reset_conta_a_partir_de_zero():
+    assert calcular_incremento(1000, 10, FAIXA_DINT) == (10, EVENTO_RESET)
+    # Reset para valor negativo nao gera incremento negativo
+    assert calcular_incremento(1000, -3, FAIXA_DINT) == (0, EVENTO_RESET)
+
+
+def test_limite_entre_rollover_e_reset():
+    faixa = 100
+    limite = int(faixa * FRACAO_ROLLOVER)
+    # Volta exatamente no limite ainda e rollover; um passo alem e reset
+    assert calcular_incremento(faixa - limite, 0, faixa) == (limite, EVENTO_ROLLOVER)
+    assert calcular_incremento(faixa - limite - 1, 0, faixa) == (0, EVENTO_RESET)
+
+
+def test_normalizar_dint_entregue_como_udint():
+    calculadora = CalculadoraContadores(["dTot*"], bits=32, com_sinal=True)
+    assert calculadora.normalizar(FAIXA_DINT - 5) == -5
+    assert calculadora.normalizar(MAXIMO_DINT + 1) == MINIMO_DINT
+    assert calculadora.normalizar(MINIMO_DINT) == MINIMO_DINT
+    assert calculadora.normalizar(123) == 123
+
+
+def test_normalizar_registrador_sem_sinal():
+    calculadora = CalculadoraContadores(["dTot*"], bits=16, com_sinal=False)
+    assert calculadora.normalizar(-1) == 2 ** 16 - 1
+    assert calculadora.normalizar(2 ** 16) == 0
+
+
+def test_processar_modo_junto_com_rollover_em_udint():
+    calculadora = CalculadoraContadores(["dTot*"], MODO_JUNTO)
+    registros = [
+        ("A", T0, {"dTotEars": MAXIMO_DINT - 1, "rInst": 1.5, COLUNA_QUALIDADE: {}}),
+        # Mesmo registrador lido como UDINT apos o estouro
+        ("A", T0 + timedelta(seconds=10), {"dTotEars": MAXIMO_DINT + 4, "rInst": 1.5, COLUNA_QUALIDADE: {}}),
+    ]
+    primeiro, segundo = calculadora.processar(registros)
+
+    assert primeiro[2]["dTotEars_delta"] is None and primeiro[2]["dTotEars_taxa"] is None
+    assert segundo[2]["dTotEars_delta"] == 5
+    assert segundo[2]["dTotEars_taxa"] == 0.5
+    assert "rInst_delta" not in segundo[2]
+    assert COLUNA_QUALIDADE + "_delta" not in segundo[2]
+    assert calculadora.rollovers == 1 and calculadora.resets == 0
+
+
+def test_processar_modo_substituir_e_leitura_com_falha():
+    calculadora = CalculadoraContadores(["dTot*"], MODO_SUBSTITUIR)
+    registros = [
+        ("A", T0, {"dTotEars": 100}),
+        ("A", T0 + timedelta(seconds=60), {"dTotEars": None}),
+        ("A", T0 + timedelta(seconds=120), {"dTotEars": 20}),
+    ]
+    saida = [valores["dTotEars"] for _, _, valores in calculadora.processar(registros)]
+    # Falha de leitura mantem o ultimo valor bom; a queda 100 -> 20 e reset
+    assert saida == [None, None, 20]
+    assert calculadora.resets == 1
+
+
+def test_estado_separado_por_linha():
+    calculadora = CalculadoraContadores(["dTot*"], MODO_SUBSTITUIR)
+    registros = [
+        ("A", T0, {"dTotEars": 100}),
+        ("B", T0, {"dTotEars": 5}),
+        ("A", T0 + timedelta(seconds=60), {"dTotEars": 110}),
+        ("B", T0 + timedelta(seconds=60), {"dTotEars": 7}),
+    ]
+    saida = [valores["dTotEars"] for _, _, valores in calculadora.processar(registros)]
+    assert saida == [None, None, 10, 2]
@@ -0,0 +1,118 @@
+import pytest
+from opcua import ua
+import quarentena as modulo
+from quarentena import QuarentenaTags
+
+BAD = ua.StatusCode(ua.StatusCodes.BadCommunicationError)
+BAD_SESSAO = ua.StatusCode(ua.StatusCodes.BadNotConnected)
+GOOD = ua.StatusCode(ua.StatusCodes.Good)
+
+
+class RegistroFalso:
+    """O que a QuarentenaTags usa de um RegistroTags."""
+
+    def __init__(self, node_ids):
+        self.node_ids = list(node_ids)
+        self.versao = 0
+        self.quarentena = []
+
+    def definir_quarentena(self, node_ids):
+        self.quarentena = list(node_ids)
+        self.versao += 1
+
+
+@pytest.fixture
+def relogio(monkeypatch):
+    agora = [1000.0]
+    monkeypatch.setattr(modulo.time, "monotonic", lambda: agora[0])
+    return agora
+
+
+def falhar_ciclos(quarentena, node_id, ciclos, status=BAD):
+    mudou = []
+    for _ in range(ciclos):
+        quarentena.falhou(node_id, status)
+        mudou.append(quarentena.fechar_ciclo())
+    return mudou
+
+
+def test_entra_em_quarentena_apos_falhas_seguidas(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    registro = RegistroFalso([tag])
+    quarentena = QuarentenaTags(registro, falhas_limite=3, espera_inicial=30)
+
+    assert falhar_ciclos(quarentena, tag, 3) == [False, False, True]
+    assert registro.quarentena == [tag]
+    assert quarentena.entradas == 1
+    assert quarentena.vencidas(relogio[0] + 29) == []
+    assert quarentena.vencidas(relogio[0] + 30) == [tag]
+
+
+def test_ciclo_sem_falha_zera_a_contagem(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    registro = RegistroFalso([tag])
+    quarentena = QuarentenaTags(registro, falhas_limite=3)
+
+    falhar_ciclos(quarentena, tag, 2)
+    assert quarentena.fechar_ciclo() is False
+    assert falhar_ciclos(quarentena, tag, 2) == [False, False]
+    assert registro.quarentena == []
+
+
+def test_falha_da_sessao_nao_conta(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    registro = RegistroFalso([tag])
+    quarentena = QuarentenaTags(registro, falhas_limite=2)
+
+    assert falhar_ciclos(quarentena, tag, 5, BAD_SESSAO) == [False] * 5
+    assert quarentena.tags == {}
+
+
+def test_desativada_com_limite_zero(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    quarentena = QuarentenaTags(RegistroFalso([tag]), falhas_limite=0)
+    assert not quarentena.ativa()
+    assert falhar_ciclos(quarentena, tag, 10) == [False] * 10
+
+
+def test_espera_dobra_ate_o_maximo(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    quarentena = QuarentenaTags(RegistroFalso([tag]), falhas_limite=1, espera_inicial=30, espera_maxima=100)
+    falhar_ciclos(quarentena, tag, 1)
+
+    esperas = []
+    for _ in range(4):
+        quarentena.revisar([tag], [BAD])
+        esperas.append(quarentena.tags[tag].proxima - relogio[0])
+    assert esperas == [60, 100, 100, 100]
+    assert quarentena.tags[tag].tentativas == 4
+
+
+def test_leitura_boa_devolve_a_tag_no_fim_do_ciclo(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    outra = ua.NodeId("SRT.A.dTotBatch", 2)
+    registro = RegistroFalso([tag, outra])
+    quarentena = QuarentenaTags(registro, falhas_limite=1)
+    quarentena.falhou(tag, BAD)
+    quarentena.falhou(outra, BAD)
+    quarentena.fechar_ciclo()
+
+    quarentena.revisar([tag, outra], [GOOD, BAD])
+    assert registro.quarentena == [tag, outra]
+    assert quarentena.fechar_ciclo() is True
+    assert registro.quarentena == [outra]
+    assert quarentena.saidas == 1
+
+
+def test_tag_removida_na_recarga_sai_da_quarentena(relogio):
+    tag = ua.NodeId("SRT.A.dTotEars", 2)
+    registro = RegistroFalso([tag])
+    quarentena = QuarentenaTags(registro, falhas_limite=1)
+    falhar_ciclos(quarentena, tag, 1)
+
+    # Recarga do tags_config.csv sem a tag
+    registro.node_ids = []
+    registro.versao += 1
+    assert quarentena.fechar_ciclo() is True
+    assert quarentena.tags == {}
+    assert registro.quarentena == []
@@ -0,0 +1,128 @@
+import os
+import zlib
+from datetime import datetime
+from spool_local import SpoolLocal, codificar_registro, ler_segmento, filtrar_ja_gravados, CABECALHO, FSYNC_NUNCA
+
+T0 = datetime(2024, 1, 1, 8, 0, 0)
+T1 = datetime(2024, 1, 1, 8, 1, 0)
+
+
+def gravar_segmento(caminho, dados):
+    with open(caminho, 'wb') as f:
+        f.write(dados)
+    return str(caminho)
+
+
+def test_segmento_ida_e_volta_com_flag_mesclar(tmp_path):
+    spool = SpoolLocal(str(tmp_path), FSYNC_NUNCA)
+    spool.gravar([("A", T0, {"x": 1, "y": "texto"})])
+    spool.gravar([("B", T1, {"z": 2.5})], mesclar=True)
+    segmentos = spool.segmentos_para_drenar()
+    assert len(segmentos) == 1
+
+    registros, integro = ler_segmento(segmentos[0])
+    assert integro
+    assert registros == [("A", T0, {"x": 1, "y": "texto"}, False), ("B", T1, {"z": 2.5}, True)]
+
+
+def test_cauda_truncada_recupera_os_registros_inteiros(tmp_path):
+    dados = codificar_registro("A", T0, {"x": 1}) + codificar_registro("A", T1, {"x": 2})
+    caminho = gravar_segmento(tmp_path / "spool_00000001.seg", dados[:-1])
+
+    registros, integro = ler_segmento(caminho)
+    assert not integro
+    assert registros == [("A", T0, {"x": 1}, False)]
+
+
+def test_cabecalho_truncado(tmp_path):
+    dados = codificar_registro("A", T0, {"x": 1})
+    caminho = gravar_segmento(tmp_path / "spool_00000001.seg", dados + dados[:CABECALHO.size - 1])
+
+    registros, integro = ler_segmento(caminho)
+    assert not integro
+    assert len(registros) == 1
+
+
+def test_crc_invalido_encerra_a_leitura(tmp_path):
+    primeiro = codificar_registro("A", T0, {"x": 1})
+    segundo = bytearray(codificar_registro("A", T1, {"x": 2}))
+    segundo[-2] ^= 0xFF
+    terceiro = codificar_registro("A", T1, {"x": 3})
+    caminho = gravar_segmento(tmp_path / "spool_00000001.seg", primeiro + bytes(segundo) + terceiro)
+
+    registros, integro = ler_segmento(caminho)
+    assert not integro
+    assert registros == [("A", T0, {"x": 1}, False)]
+
+
+def test_cabecalho_guarda_tamanho_e_crc():
+    dados = codificar_registro("A", T0, {"x": 1})
+    tamanho, crc = CABECALHO.unpack_from(dados, 0)
+    payload = dados[CABECALHO.size:]
+    assert tamanho == len(payload)
+    assert crc == zlib.crc32(payload)
+
+
+def test_numeracao_continua_apos_reinicio(tmp_path):
+    spool = SpoolLocal(str(tmp_path), FSYNC_NUNCA)
+    spool.gravar([("A", T0, {"x": 1})])
+    spool.fechar()
+
+    spool = SpoolLocal(str(tmp_path), FSYNC_NUNCA)
+    spool.gravar([("A", T1, {"x": 2})])
+    nomes = [os.path.basename(s) for s in spool.segmentos_para_drenar()]
+    assert nomes == ["spool_00000001.seg", "spool_00000002.seg"]
+
+
+class CursorFalso:
+    """Responde a consulta de filtrar_ja_gravados com as chaves de 'existentes' por coluna."""
+
+    def __init__(self, existentes):
+        self.existentes = existentes  # coluna -> [(linha, DataHora)]
+        self.consultas = []
+        self._linhas = []
+        self.fechado = False
+
+    def execute(self, sql, parametros):
+        self.consultas.append((sql, parametros))
+        self._linhas = [chave for coluna, chaves in self.existentes.items() if f"[{coluna}]" in sql for chave in chaves]
+
+    def fetchall(self):
+        return self._linhas
+
+    def close(self):
+        self.fechado = True
+
+
+class ConexaoFalsa:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_filtrar_ja_gravados_compara_data_hora_truncada():
+    # DATETIME no SQL guarda centesimos: 08:00:00.123456 volta como 08:00:00.120000
+    lido = datetime(2024, 1, 1, 8, 0, 0, 123456)
+    cursor = CursorFalso({"x": [("A", datetime(2024, 1, 1, 8, 0, 0, 120000))]})
+    registros = [("A", lido, {"x": 1}), ("A", T1, {"x": 2})]
+
+    assert filtrar_ja_gravados(ConexaoFalsa(cursor), "seed_loss", registros) == [("A", T1, {"x": 2})]
+    sql, parametros = cursor.consultas[0]
+    assert parametros == [datetime(2024, 1, 1, 8, 0, 0, 120000), T1]
+    assert "[x] IS NOT NULL" in sql
+    assert cursor.fechado
+
+
+def test_filtrar_ja_gravados_por_conjunto_de_colunas():
+    # Outra classe de varredura ja gravou (A, T0) com a coluna y: x ainda falta
+    cursor = CursorFalso({"y": [("A", T0)]})
+    registros = [("A", T0, {"x": 1}), ("A", T0, {"y": 2})]
+
+    assert filtrar_ja_gravados(ConexaoFalsa(cursor), "seed_loss", registros) == [("A", T0, {"x": 1})]
+    assert len(cursor.consultas) == 2
+
+
+def test_filtrar_ja_gravados_sem_registros_nao_consulta():
+    assert filtrar_ja_gravados(None, "seed_loss", []) == []
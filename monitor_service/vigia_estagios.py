@@ -0,0 +1,146 @@
+"""
+VIGIA DOS ESTAGIOS (WATCHDOG)
+Um Read que nao volta, um pyodbc.connect bloqueado ou um rename preso no
+spool travavam o servico em silencio: o processo continua vivo e o NSSM
+so reinicia quando ele termina.
+
+Cada estagio (aquisicao, conversao, persistencia, manutencao) marca inicio
+e fim em ESTAGIOS (custo: uma atribuicao em dict por estagio). Uma thread
+confere os prazos a cada segundo; no estagio que passou do prazo ela grava
+as pilhas de todas as threads no log, conta o travamento e executa a acao
+do estagio (ex: fechar o socket OPC, o que faz o Read travado falhar e a
+aquisicao reconectar). Se o estagio continuar travado ate o orcamento, o
+servico reinicia de forma controlada: as filas vao para o spool e o
+processo termina com CODIGO_REINICIO (o NSSM, ou o supervisor no modo
+multiprocesso, inicia de novo).
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+from contextlib import contextmanager
+
+logger = logging.getLogger('SeedLossMonitor')
+
+AQUISICAO = "aquisicao"
+CONVERSAO = "conversao"
+PERSISTENCIA = "persistencia"
+MANUTENCAO = "manutencao"
+
+PRAZOS_PADRAO = {AQUISICAO: 60, CONVERSAO: 30, PERSISTENCIA: 300, MANUTENCAO: 300}
+ORCAMENTO_SEGUNDOS = 600  # Estagio travado por mais que isso reinicia o servico
+CODIGO_REINICIO = 3
+ESPERA_DESCARGA_SEGUNDOS = 10
+
+
+class RegistroEstagios:
+    """Estagio em andamento de cada thread (uma thread, um estagio por vez)."""
+
+    def __init__(self):
+        self._ativos = {}  # ident da thread -> [estagio, inicio, ja alertado]
+
+    def entrar(self, estagio):
+        self._ativos[threading.get_ident()] = [estagio, time.monotonic(), False]
+
+    def sair(self):
+        self._ativos.pop(threading.get_ident(), None)
+
+    @contextmanager
+    def estagio(self, nome):
+        self.entrar(nome)
+        try:
+            yield
+        finally:
+            self.sair()
+
+    def ativos(self):
+        return dict(self._ativos)
+
+
+ESTAGIOS = RegistroEstagios()
+
+
+def pilhas_das_threads(destaque=None):
+    """Pilha de todas as threads do processo (a 'destaque' marcada como travada)."""
+    nomes = {t.ident: t.name for t in threading.enumerate()}
+    partes = []
+    for ident, frame in sys._current_frames().items():
+        marca = " (TRAVADA)" if ident == destaque else ""
+        partes.append(f"--- Thread {nomes.get(ident, ident)}{marca}\n" + "".join(traceback.format_stack(frame)))
+    return "\n".join(partes)
+
+
+class VigiaEstagios(threading.Thread):
+    """
+    'acoes' = {estagio: funcao()} executada uma vez por travamento (fora da
+    thread travada). 'ao_reiniciar()' roda antes do reinicio controlado,
+    com no maximo ESPERA_DESCARGA_SEGUNDOS.
+    """
+
+    def __init__(self, prazos=None, orcamento=ORCAMENTO_SEGUNDOS, acoes=None, ao_reiniciar=None,
+                 registro=ESTAGIOS, intervalo_segundos=1.0):
+        super().__init__(name="VigiaEstagios", daemon=True)
+        self.prazos = dict(PRAZOS_PADRAO if prazos is None else prazos)
+        self.orcamento = orcamento
+        self.acoes = acoes or {}
+        self.ao_reiniciar = ao_reiniciar
+        self.registro = registro
+        self.intervalo = intervalo_segundos
+        self.travamentos = {estagio: 0 for estagio in self.prazos}
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            agora = time.monotonic()
+            for ident, item in self.registro.ativos().items():
+                estagio, inicio, alertado = item
+                prazo = self.prazos.get(estagio)
+                duracao = agora - inicio
+                if prazo is None or duracao < prazo:
+                    continue
+                if not alertado:
+                    item[2] = True
+                    self._travado(estagio, ident, duracao, prazo)
+                if duracao >= max(prazo, self.orcamento):
+                    self._reiniciar(estagio, duracao)
+
+    def _travado(self, estagio, ident, duracao, prazo):
+        self.travamentos[estagio] = self.travamentos.get(estagio, 0) + 1
+        logger.error(
+            f"Estagio '{estagio}' travado ha {duracao:.0f}s (prazo {prazo}s); "
+            f"pilhas das threads:\n{pilhas_das_threads(ident)}"
+        )
+        acao = self.acoes.get(estagio)
+        if acao is None:
+            return
+        try:
+            acao()
+            logger.warning(f"Estagio '{estagio}': acao de recuperacao executada")
+        except Exception as e:
+            logger.error(f"Estagio '{estagio}': acao de recuperacao falhou: {e}")
+
+    def _reiniciar(self, estagio, duracao):
+        logger.critical(
+            f"Estagio '{estagio}' travado ha {duracao:.0f}s (orcamento {self.orcamento}s): "
+            f"reinicio controlado do servico"
+        )
+        if self.ao_reiniciar is not None:
+            # Em thread propria: se o que travou foi o disco, o reinicio nao espera
+            descarga = threading.Thread(target=self.ao_reiniciar, name="DescargaReinicio", daemon=True)
+            descarga.start()
+            descarga.join(ESPERA_DESCARGA_SEGUNDOS)
+        for handler in logger.handlers:
+            try:
+                handler.flush()
+            except Exception:
+                pass
+        os._exit(CODIGO_REINICIO)
+
+    def resumo(self):
+        return "Travamentos: " + ", ".join(f"{estagio} {n}" for estagio, n in self.travamentos.items())
+
+    def parar(self):
+        self._parar.set()
@@ -42,20 +42,17 @@ def adicionar_colunas():
         cursor = conn.cursor()
         print(f"Verificando/Adicionando colunas na tabela '{DB_TABLE}'...")
         
+        # Le as colunas existentes uma unica vez
+        cursor.execute(
+            "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?",
+            DB_TABLE,
+        )
+        existentes = {row[0].lower() for row in cursor.fetchall()}
+        
         for col_nome, col_tipo in novas_colunas:
             print(f"   Processando coluna [{col_nome}] ({col_tipo})...")
             
-            # Verifica se a coluna ja existe
-            check_sql = f"""
-                SELECT COUNT(*) 
-                FROM INFORMATION_SCHEMA.COLUMNS 
-                WHERE TABLE_NAME = '{DB_TABLE}' 
-                AND COLUMN_NAME = '{col_nome}'
-            """
-            cursor.execute(check_sql)
-            exists = cursor.fetchone()[0]
-            
-            if exists:
+            if col_nome.lower() in existentes:
                 print(f"      A coluna [{col_nome}] JA EXISTE. Pulando.")
             else:
                 try:
@@ -20,6 +20,10 @@ NAMESPACE_INDEX = 2  # ns=2 padrão do KEPServer
 NOME_CSV = "Lista_Tags_hibridos.csv"
 # =================================================
 
+# Cache de nos OPC por endereco (valido apenas para o client atual)
+_cache_nodes = {}
+_cache_client = None
+
 
 def encontrar_csv():
     """
@@ -203,6 +207,24 @@ def obter_variant_type(tipo):
         return ua.VariantType.String
 
 
+def obter_node(client, address):
+    """
+    Retorna o no OPC de um endereco, resolvendo o NodeId apenas uma vez.
+    O cache e descartado quando o client muda (nova conexao).
+    """
+    global _cache_client
+    
+    if client is not _cache_client:
+        _cache_nodes.clear()
+        _cache_client = client
+    
+    node = _cache_nodes.get(address)
+    if node is None:
+        node = client.get_node(ua.NodeId(address, NAMESPACE_INDEX))
+        _cache_nodes[address] = node
+    return node
+
+
 def escrever_tag(client, address, valor, tipo):
     """
     Escreve um valor em uma tag específica.
@@ -217,8 +239,7 @@ def escrever_tag(client, address, valor, tipo):
         bool: True se sucesso, False se falha
     """
     try:
-        node_id = f"ns={NAMESPACE_INDEX};s={address}"
-        node = client.get_node(node_id)
+        node = obter_node(client, address)
         
         # Converter valor para o tipo correto
         valor_convertido = converter_valor(valor, tipo)
@@ -242,9 +263,7 @@ def ler_tag(client, address):
     Lê o valor atual de uma tag.
     """
     try:
-        node_id = f"ns={NAMESPACE_INDEX};s={address}"
-        node = client.get_node(node_id)
-        return node.get_value()
+        return obter_node(client, address).get_value()
     except Exception as e:
         return f"ERRO: {e}"
 